@@ -0,0 +1,5 @@
+"""
+End-to-end benchmarks of mkdocs-deploy's actions against synthetic sites.
+
+These are not tests and are not run by pytest.  Run ``python -m benchmarks --help`` from the repository root.
+"""
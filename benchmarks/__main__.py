@@ -0,0 +1,76 @@
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from .runner import TARGETS, run_benchmarks
+from .sites import SOURCE_FORMATS
+
+
+@click.command()
+@click.option(
+    "--files", "file_counts", type=int, multiple=True, default=(1000, 10000), show_default=True,
+    help="Number of files in each synthetic site.  May be repeated, eg: --files 1000 --files 50000",
+)
+@click.option("--target", "target_names", type=click.Choice(list(TARGETS)), multiple=True, help="Default all")
+@click.option("--source-format", "source_formats", type=click.Choice(SOURCE_FORMATS), multiple=True, help="Default all")
+@click.option("--concurrency", type=int, default=8, show_default=True, help="Upload concurrency")
+@click.option("--repeat", type=int, default=1, show_default=True, help="Number of times to run each benchmark")
+@click.option("--seed", type=int, default=0, show_default=True, help="Seed for generating sites")
+@click.option(
+    "--work-dir", type=click.Path(file_okay=False, path_type=Path),
+    default=Path(tempfile.gettempdir()) / "mkdocs-deploy-benchmarks", show_default=True,
+    help="Where to keep generated sites.  They are reused by later runs",
+)
+@click.option("--output", type=click.Path(dir_okay=False, path_type=Path), help="Write json results here, not stdout")
+@click.option("--log-level", default="ERROR", show_default=True)
+def main(
+    file_counts: tuple[int],
+    target_names: tuple[str],
+    source_formats: tuple[str],
+    concurrency: int,
+    repeat: int,
+    seed: int,
+    work_dir: Path,
+    output: Optional[Path],
+    log_level: str,
+):
+    """
+    Benchmark deploying synthetic mkdocs sites.
+
+    Progress is written to stderr.  Json results are written to stdout or --output.
+    """
+    logging.basicConfig(stream=sys.stderr, level=log_level, format="%(levelname)s: %(name)s:  %(message)s")
+    work_dir.mkdir(parents=True, exist_ok=True)
+    results = run_benchmarks(
+        work_dir=work_dir,
+        file_counts=file_counts,
+        target_names=target_names or TARGETS,
+        source_formats=source_formats or SOURCE_FORMATS,
+        concurrency=concurrency,
+        repeat=repeat,
+        seed=seed,
+        progress=_print_progress,
+    )
+    if output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+def _print_progress(result: dict) -> None:
+    click.echo(
+        f"{result['site_files']:>6} files  {result['target']:<5}  {result['benchmark']:<14} "
+        f"{result['source_format'] or '':<9} {result['seconds']:8.2f}s {result['files_per_second']:10.0f} files/s "
+        f"{sum(result['api_calls'].values()):>7} api calls",
+        err=True,
+    )
+
+
+main()
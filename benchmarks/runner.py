@@ -0,0 +1,206 @@
+"""
+Time deployment actions against real targets.
+
+Each run starts with an empty target and goes through the life of one version: ``upload``, ``create_alias`` with the
+``html`` mechanism, ``refresh_alias``, then ``delete_version``.  Every action is timed from the start of its session
+until the session has closed, so writing metadata is included.  S3 runs against moto in this process, so its times
+measure this tool's overhead not the network; the count of S3 API calls is what carries over to real deployments.
+"""
+import contextlib
+import datetime
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, ContextManager, Iterable, Iterator, Optional
+
+import boto3
+import moto
+
+from mkdocs_deploy import abstract, actions
+from mkdocs_deploy.plugins import aws_s3, html_redirect, local_filesystem
+
+from .sites import SiteStats, archive_site, cached_site
+
+_BUCKET = "mkdocs-deploy-benchmark"
+_VERSION = "1.0"
+_ALIAS = "latest"
+
+
+class ApiCallCounter:
+    """Counts calls made by every boto3 client created from the default session, by operation name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Counter[str] = Counter()
+
+    def attach(self) -> None:
+        """Start counting calls from clients created after now.  moto replaces the default session when it starts."""
+        boto3.setup_default_session()
+        boto3.DEFAULT_SESSION.events.register("before-call", self._count)
+
+    def _count(self, model, **_) -> None:
+        with self._lock:
+            self.counts[model.name] += 1
+
+    def take(self) -> dict[str, int]:
+        """:return: The counts since the last call"""
+        with self._lock:
+            counts, self.counts = dict(self.counts), Counter()
+        return counts
+
+
+@contextlib.contextmanager
+def local_target(work_dir: Path) -> Iterator[abstract.Target]:
+    directory = Path(tempfile.mkdtemp(dir=work_dir))
+    try:
+        yield local_filesystem.LocalFileTreeTarget(str(directory))
+    finally:
+        # Deleted versions are removed by background threads which may still be running after their session closed.
+        for thread in threading.enumerate():
+            if thread.name.startswith("delete-"):
+                thread.join()
+        shutil.rmtree(directory)
+        # Staged and deleted versions are kept beside the site
+        shutil.rmtree(directory.with_name(f".{directory.name}.mkdocs-deploy"), ignore_errors=True)
+
+
+@contextlib.contextmanager
+def s3_target(work_dir: Path) -> Iterator[abstract.Target]:
+    region = os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_s3():
+        client = boto3.client("s3")
+        if region == "us-east-1":
+            client.create_bucket(Bucket=_BUCKET)
+        else:
+            client.create_bucket(Bucket=_BUCKET, CreateBucketConfiguration={"LocationConstraint": region})
+        yield aws_s3.S3Target(_BUCKET, "site/")
+
+
+TARGETS: dict[str, Callable[[Path], ContextManager[abstract.Target]]] = {
+    "local": local_target,
+    "s3": s3_target,
+}
+
+
+def run_benchmarks(
+    work_dir: Path,
+    file_counts: Iterable[int],
+    target_names: Iterable[str],
+    source_formats: Iterable[str],
+    concurrency: int = 8,
+    repeat: int = 1,
+    seed: int = 0,
+    progress: Callable[[dict], None] = lambda result: None,
+) -> dict:
+    """
+    Run every combination of site size, target and source format.
+
+    The alias and delete benchmarks do not read the source so only run with the first source format.
+
+    :param work_dir: Where to keep generated sites between runs, and local targets while they run.
+    :param progress: Called with each result as soon as it is measured.
+    :return: Machine-readable results, described in the README
+    """
+    local_filesystem.enable_plugin()
+    aws_s3.enable_plugin()
+    html_redirect.enable_plugin()
+    source_formats = list(source_formats)
+    counter = ApiCallCounter()
+    results = []
+    for file_count in file_counts:
+        site = cached_site(work_dir, file_count, seed)
+        for target_name in target_names:
+            for run in range(repeat):
+                for source_format in source_formats:
+                    labels = {"target": target_name, "site_files": site.file_count, "run": run}
+                    with TARGETS[target_name](work_dir) as target:
+                        counter.attach()
+                        for result in _run_lifecycle(
+                            target, site, source_format, source_format == source_formats[0], concurrency, counter
+                        ):
+                            result.update(labels)
+                            progress(result)
+                            results.append(result)
+    return {"metadata": _metadata(concurrency, seed), "results": results}
+
+
+def _run_lifecycle(
+    target: abstract.Target,
+    site: SiteStats,
+    source_format: str,
+    include_aliases: bool,
+    concurrency: int,
+    counter: ApiCallCounter,
+) -> Iterator[dict]:
+    source_site = archive_site(site, source_format)
+
+    def upload(session: abstract.TargetSession) -> None:
+        with abstract.source_for_url(str(source_site.path)) as source:
+            actions.upload(source, session, _VERSION, None, concurrency=concurrency)
+
+    yield dict(
+        benchmark="upload", source_format=source_format,
+        **_measure(target, upload, counter, site.file_count, site.total_bytes),
+    )
+    if not include_aliases:
+        return
+    # Deleting the version deletes the alias' redirects too
+    deleted_files = site.file_count + site.html_count
+    for benchmark, operation, files in (
+        ("create_alias", lambda session: actions.create_alias(session, _ALIAS, _VERSION, ["html"]), site.html_count),
+        ("refresh_alias", lambda session: actions.refresh_alias(session, _ALIAS, ["html"]), site.html_count),
+        ("delete_version", lambda session: actions.delete_version(session, _VERSION), deleted_files),
+    ):
+        yield dict(benchmark=benchmark, source_format=None, **_measure(target, operation, counter, files, None))
+
+
+def _measure(
+    target: abstract.Target,
+    operation: Callable[[abstract.TargetSession], None],
+    counter: ApiCallCounter,
+    files: int,
+    total_bytes: Optional[int],
+) -> dict:
+    """
+    :param files: How many files the operation writes or deletes.
+    :param total_bytes: How many bytes the operation writes, if it is meaningful.
+    """
+    start = time.perf_counter()
+    with target.start_session() as session:
+        operation(session)
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "files": files,
+        "bytes": total_bytes,
+        "files_per_second": files / seconds,
+        "bytes_per_second": None if total_bytes is None else total_bytes / seconds,
+        "api_calls": counter.take(),
+    }
+
+
+def _metadata(concurrency: int, seed: int) -> dict:
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "concurrency": concurrency,
+        "seed": seed,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,160 @@
+"""
+Synthetic mkdocs sites.
+
+Sites are shaped like the output of mkdocs-material with ``use_directory_urls``: most files are pages, each its own
+``index.html`` in a directory a few levels deep, beside a handful of large theme assets, images, and one search index
+which grows with the site.  Sizes are drawn from log-normal distributions so most files are small with a long tail of
+large ones.  The same seed always generates the same site.
+"""
+import random
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import NamedTuple
+
+SOURCE_FORMATS = ("directory", "zip", "tar.gz")
+
+_WORDS = (
+    "the site version deploy alias mkdocs page section nav search theme material python install configure example "
+    "function class parameter return value default target source upload redirect index document markdown heading"
+).split()
+
+_TEXT_BLOCK_SIZE = 1024 * 1024
+
+# (share of files, directory, suffix, median size, sigma).  Pages have no directory, they each get their own.
+_FILE_KINDS = (
+    (0.70, None, ".html", 18 * 1024, 0.7),
+    (0.18, "assets/images", ".png", 24 * 1024, 1.3),
+    (0.05, "assets/images", ".svg", 4 * 1024, 0.8),
+    (0.04, "assets/javascripts", ".js", 30 * 1024, 1.2),
+    (0.02, "assets/stylesheets", ".css", 20 * 1024, 1.0),
+    (0.01, "assets/fonts", ".woff2", 60 * 1024, 0.4),
+)
+
+_MAX_DEPTH = 4
+_SECTIONS_PER_LEVEL = 8
+
+
+class SiteStats(NamedTuple):
+    """What was generated"""
+    path: Path
+    """The directory, zip or tar.gz containing the site"""
+    file_count: int
+    total_bytes: int
+    html_count: int
+
+
+def generate_site(directory: Path, file_count: int, seed: int = 0) -> SiteStats:
+    """
+    Write a synthetic site as a directory tree.
+
+    :param directory: Where to write the site.  It must not exist.
+    :param file_count: How many files the site has.
+    :param seed: Seed for the random sizes and layout.
+    """
+    rng = random.Random(seed)
+    text = _text_block(rng)
+    directory.mkdir(parents=True)
+    total_bytes = 0
+    html_count = 0
+    files = {
+        "index.html": _size(rng, 18 * 1024, 0.5),
+        "404.html": _size(rng, 12 * 1024, 0.2),
+        "sitemap.xml": file_count * 120,
+        "sitemap.xml.gz": file_count * 12,
+        # mkdocs' search index holds the text of every page.
+        "search/search_index.json": min(file_count * 1024, 64 * 1024 * 1024),
+    }
+    while len(files) < file_count:
+        share = rng.random()
+        for probability, kind_directory, suffix, median, sigma in _FILE_KINDS:
+            share -= probability
+            if share < 0:
+                break
+        if kind_directory is None:
+            filename = f"{_page_directory(rng)}/index.html"
+        else:
+            filename = f"{kind_directory}/{rng.getrandbits(48):012x}{suffix}"
+        files[filename] = _size(rng, median, sigma)
+
+    for filename, size in files.items():
+        file_path = directory / filename
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if filename.endswith((".png", ".woff2", ".gz")):
+            file_path.write_bytes(rng.randbytes(size))
+        else:
+            file_path.write_bytes(_text(rng, text, size))
+        total_bytes += size
+        html_count += filename.endswith(".html")
+    return SiteStats(directory, len(files), total_bytes, html_count)
+
+
+def archive_site(site: SiteStats, source_format: str) -> SiteStats:
+    """
+    Make a copy of a generated site in the given format, beside the directory.
+
+    Archives hold the site in a ``site/`` directory, as they would if made from the root of an mkdocs project.
+
+    :param source_format: One of ``SOURCE_FORMATS``
+    """
+    if source_format == "directory":
+        return site
+    archive_path = site.path.with_name(f"{site.path.name}.{source_format}")
+    if not archive_path.exists():
+        if source_format == "zip":
+            with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for file_path in sorted(site.path.rglob("*")):
+                    if file_path.is_file():
+                        archive.write(file_path, f"site/{file_path.relative_to(site.path).as_posix()}")
+        elif source_format == "tar.gz":
+            with tarfile.open(archive_path, "w:gz") as archive:
+                archive.add(site.path, "site")
+        else:
+            raise ValueError(f"Unknown source format {source_format}, expected one of {', '.join(SOURCE_FORMATS)}")
+    return site._replace(path=archive_path)
+
+
+def cached_site(work_dir: Path, file_count: int, seed: int = 0) -> SiteStats:
+    """
+    Generate a site in work_dir, or reuse the one generated by an earlier run with the same parameters.
+    """
+    directory = work_dir / f"site-{file_count}-{seed}"
+    partial = directory.with_name(directory.name + ".partial")
+    if not directory.exists():
+        shutil.rmtree(partial, ignore_errors=True)
+        generate_site(partial, file_count, seed)
+        partial.rename(directory)
+    files = [file_path for file_path in directory.rglob("*") if file_path.is_file()]
+    return SiteStats(
+        directory,
+        len(files),
+        sum(file_path.stat().st_size for file_path in files),
+        sum(file_path.name.endswith(".html") for file_path in files),
+    )
+
+
+def _page_directory(rng: random.Random) -> str:
+    depth = rng.randint(1, _MAX_DEPTH)
+    sections = [f"section-{rng.randrange(_SECTIONS_PER_LEVEL)}" for _ in range(depth - 1)]
+    return "/".join([*sections, f"page-{rng.getrandbits(32):08x}"])
+
+
+def _size(rng: random.Random, median: int, sigma: float) -> int:
+    return max(1, int(rng.lognormvariate(0, sigma) * median))
+
+
+def _text(rng: random.Random, block: bytes, size: int) -> bytes:
+    offset = rng.randrange(len(block))
+    return (block * ((offset + size) // len(block) + 1))[offset:offset + size]
+
+
+def _text_block(rng: random.Random) -> bytes:
+    """Text which compresses about as well as real pages do"""
+    words = []
+    length = 0
+    while length < _TEXT_BLOCK_SIZE:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words).encode("ascii")[:_TEXT_BLOCK_SIZE]
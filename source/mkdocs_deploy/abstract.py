@@ -1,9 +1,10 @@
 import urllib.parse
 from abc import abstractmethod
 from enum import Enum
-from typing import Callable, IO, Iterable, Optional, Protocol
+from typing import Callable, IO, Iterable, NamedTuple, Optional, Protocol
 
-from .versions import DeploymentAlias, DeploymentSpec
+from .shared_implementations import CachePolicy, file_md5
+from .versions import DeploymentAlias, DeploymentSpec, VersionManifest
 
 
 class VersionNotFound(Exception):
@@ -27,6 +28,18 @@ DEFAULT_VERSION = _DefaultVersionType.DEFAULT_VERSION
 Version = str | _DefaultVersionType
 
 
+class FileDetails(NamedTuple):
+    """
+    Details of a file already on a target, used to skip uploading files which have not changed.
+    """
+    filename: str
+    """The filename (relative file path) within the version"""
+    size: int
+    """The size of the file in bytes"""
+    md5: Optional[str]
+    """The hex md5 digest of the file content, or None if it is not known"""
+
+
 class Source(Protocol):
     """
     Source is where a site is loaded from.
@@ -49,6 +62,32 @@ class Source(Protocol):
         :return: An open file handle to read from.  The calling method is responsible for closing it.
         """
 
+    def get_file_size(self, filename: str) -> Optional[int]:
+        """
+        Get the size of a file without reading it.
+
+        :param filename: The file name (relative file path) of the file
+        :return: The size in bytes, or None if the source cannot tell without reading the file.
+        """
+        return None
+
+    @property
+    def supports_concurrent_read(self) -> bool:
+        """
+        Indicates if ``open_file_for_read`` may be called from multiple threads at once, with the returned handles
+        read concurrently.  Sources which share a single underlying file handle (eg: archives) must return False.
+        """
+        return False
+
+    @property
+    def requires_sequential_read(self) -> bool:
+        """
+        Indicates the source is a stream which can only be read once from start to finish (eg: a compressed tar being
+        downloaded).  ``open_file_for_read`` may then only be called once for each file, for the file most recently
+        yielded by ``iter_files`` and before the iterator is advanced.  Such sources must not support concurrent read.
+        """
+        return False
+
     def close(self) -> None:
         """
         Close any underlying resource handles
@@ -74,14 +113,16 @@ class TargetSession(Protocol):
     """
 
     @abstractmethod
-    def start_version(self, version_id: str, title: str) -> None:
+    def start_version(self, version_id: str, title: str, keep_existing_files: bool = False) -> None:
         """
         Prepare to write a new site version.
 
-        This MUST have the ultimate effect of deleting any files in the version if it already existed and they are not
-        replaced with ``TargetSession.upload_file()``.
+        Unless ``keep_existing_files`` is set, this MUST have the ultimate effect of deleting any files in the version
+        if it already existed and they are not replaced with ``TargetSession.upload_file()``.
         :param version_id: The id of the new version
         :param title: The version title.
+        :param keep_existing_files: If True, files already in the version are left in place.  The caller takes
+            responsibility for replacing or deleting them.  This is used for incremental uploads.
         """
 
     @abstractmethod
@@ -93,7 +134,7 @@ class TargetSession(Protocol):
         """
 
     @abstractmethod
-    def upload_file(self, version_id: Version, filename: str, file_obj: IO[bytes]) -> None:
+    def upload_file(self, version_id: Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None) -> None:
         """
         Upload a file to the target
 
@@ -101,7 +142,25 @@ class TargetSession(Protocol):
             not the site.  In that case filename must NOT contain ``/``
         :param filename: The filename of the file within the site version.
         :param file_obj: An open file handle to read data from.
+        :param md5: Hex md5 of the content if the caller already worked it out.  Targets may record this instead of
+            hashing the content themselves.
+        """
+
+    def copy_file(self, src_version: Version, src_name: str, dst_version: Version, dst_name: str) -> None:
         """
+        Copy a file from one place in the target to another, replacing the destination if it exists.
+
+        The default implementation downloads the file and uploads it again.  Targets should override this if they can
+        copy files without the content passing through this process.
+        :param src_version: The version to copy from.
+        :param src_name: The filename within src_version to copy.
+        :param dst_version: The version to copy to.
+        :param dst_name: The filename within dst_version to write.
+        :raises FileNotFoundError: If the source file does not exist
+        :raises VersionNotFound: if either version does not exist
+        """
+        with self.download_file(src_version, src_name) as file_obj:
+            self.upload_file(dst_version, dst_name, file_obj)
 
     @abstractmethod
     def download_file(self, version_id: Version, filename: str) -> IO[bytes]:
@@ -129,6 +188,19 @@ class TargetSession(Protocol):
         deleted from the root of the site, not a version. In that case filename must NOT contain ``/``
         """
 
+    def delete_files(self, version_id: Version, filenames: Iterable[str]) -> None:
+        """
+        Delete many files, or mark them for deletion on close.
+
+        This does NOT raise an exception if any of the files don't exist.  The default implementation calls
+        ``delete_file`` for each file.  Targets should override it if they can delete files in bulk.
+        :param version_id: The version to delete from
+        :param filenames: The filenames to delete within the version.  If version_id is ``DEFAULT_VERSION`` then the
+            files are deleted from the root of the site, not a version.
+        """
+        for filename in filenames:
+            self.delete_file(version_id, filename)
+
     @abstractmethod
     def iter_files(self, version_id: Version) -> Iterable[str]:
         """
@@ -140,6 +212,32 @@ class TargetSession(Protocol):
         :raises VersionNotFound: If version_id does not exist
         """
 
+    def iter_file_details(self, version_id: Version) -> Iterable[FileDetails]:
+        """
+        Get details of every file in a version prefix.
+
+        The default implementation downloads every file to hash it.  Targets should override this if they can discover
+        file details more cheaply.
+        :param version_id: The version_id to fetch.
+        :return: An iterator of FileDetails for every file, the same files as returned by ``iter_files``.
+        :raises VersionNotFound: If version_id does not exist
+        """
+        for filename in self.iter_files(version_id):
+            with self.download_file(version_id, filename) as file_obj:
+                size, md5 = file_md5(file_obj)
+            yield FileDetails(filename=filename, size=size, md5=md5)
+
+    def get_manifest(self, version_id: str) -> Optional[VersionManifest]:
+        """
+        Get the manifest of every file in a version, if the target keeps them.
+
+        Targets keeping manifests update them with every change and write them when the session closes successfully.
+        :param version_id: The version (or alias) to get the manifest for.
+        :return: The manifest, or None if this target does not keep manifests or there is no manifest for this version.
+            The returned manifest MUST NOT be modified.
+        """
+        return None
+
     @abstractmethod
     def close(self, success: bool = False) -> None:
         """
@@ -161,6 +259,33 @@ class TargetSession(Protocol):
         :param alias: The specification of the alias. If None is passed then the alias is deleted (if it existed).
         """
 
+    def set_cache_policy(self, cache_policy: CachePolicy) -> None:
+        """
+        Set the Cache-Control headers to store with files written from now on.
+
+        Targets which cannot store headers with files ignore this.
+        """
+
+    @property
+    def supports_concurrent_upload(self) -> bool:
+        """
+        Indicates if ``upload_file`` and ``copy_file`` may be called from multiple threads at once.
+
+        Other methods are never called concurrently, and never while an upload is in progress.
+        """
+        return False
+
+    @property
+    def changed_paths(self) -> Optional[set[str]]:
+        """
+        Paths written or deleted by this session, relative to the root of the site, eg: ``1.0/index.html``.
+
+        A path ending ``*`` stands for everything beginning with it.  None if the target does not record changes, in
+        which case anything may have changed.  Targets which know nothing changed should return an empty set even if
+        they do not record paths.
+        """
+        return None
+
     @property
     @abstractmethod
     def available_redirect_mechanisms(self) -> dict[str, "RedirectMechanism"]:
@@ -174,6 +299,9 @@ class TargetSession(Protocol):
     def deployment_spec(self) -> DeploymentSpec:
         """
         The deployments spec for this target having applied any operations.
+
+        The returned spec MUST NOT be modified; ``.copy()`` it to make changes.  Targets may return the same read only
+        snapshot (see ``DeploymentSpec.snapshot``) to every caller until the next change.
         """
 
     def __enter__(self):
@@ -232,10 +360,35 @@ class RedirectMechanism(Protocol):
         self.delete_redirect(session, alias)
         self.create_redirect(session, alias, version_id)
 
+    @property
+    def used_by_default(self) -> bool:
+        """
+        Whether ``create_alias`` uses this mechanism when no mechanisms are named.
+
+        Mechanisms which only work if the target has been set up for them, or which cannot redirect every alias, should
+        return False so they are only used when asked for by name.
+        """
+        return True
+
+class Invalidator(Protocol):
+    """
+    A cache in front of a target, such as a CDN, which must be told when files on the target change.
+    """
+
+    @abstractmethod
+    def invalidate(self, paths: Optional[Iterable[str]]) -> None:
+        """
+        Invalidate changed files in the cache.
+
+        :param paths: Paths which changed, as given by ``TargetSession.changed_paths``.  None to invalidate everything.
+        """
+
 _SOURCES = {}
 
 _TARGETS = {}
 
+_INVALIDATORS = {}
+
 
 def register_source(source_scheme: str, source_class: Callable[[str], Source]) -> None:
     """
@@ -257,6 +410,16 @@ def register_target(target_scheme: str, target_class: Callable[[str], Target]) -
     _TARGETS[target_scheme] = target_class
 
 
+def register_invalidator(invalidator_scheme: str, invalidator_class: Callable[[str], Invalidator]) -> None:
+    """
+    Register an invalidator type.
+
+    :param invalidator_scheme: The url scheme to associate this class with
+    :param invalidator_class: The class to register
+    """
+    _INVALIDATORS[invalidator_scheme] = invalidator_class
+
+
 def source_for_url(source_url: str) -> Source:
     """
     Get a Source for a given URL
@@ -277,6 +440,16 @@ def target_for_url(target_url: str) -> Target:
     return handler(target_url)
 
 
+def invalidator_for_url(invalidator_url: str) -> Invalidator:
+    """
+    Get an Invalidator for a given URL
+    :param invalidator_url:
+    :return:
+    """
+    handler = _INVALIDATORS[urllib.parse.urlparse(invalidator_url).scheme]
+    return handler(invalidator_url)
+
+
 _SHARED_REDIRECT_MECHANISMS: dict[str, RedirectMechanism] = {}
 
 
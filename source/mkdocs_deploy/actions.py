@@ -8,9 +8,12 @@ TargetSession.
 """
 import importlib.metadata
 import logging
-from typing import Collection
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import IO, Collection, Optional
 
-from .abstract import DEFAULT_VERSION, Source, TargetSession, Version, VersionNotFound, get_redirect_mechanisms
+from .abstract import (DEFAULT_VERSION, FileDetails, Source, TargetSession, Version, VersionNotFound,
+                       get_redirect_mechanisms)
+from .shared_implementations import file_md5, read_into_buffer
 from .versions import DeploymentAlias
 
 _logger = logging.getLogger(__name__)
@@ -33,7 +36,15 @@ def load_plugins() -> None:
 
 
 
-def upload(source: Source, target: TargetSession, version_id: str, title: str | None) -> None:
+def upload(
+    source: Source,
+    target: TargetSession,
+    version_id: str,
+    title: str | None,
+    concurrency: int = 1,
+    incremental: bool = True,
+    deduplicate: bool = False,
+) -> None:
     """
     Upload a file (to s3)
     :param source: The site to upload.  This may be a directory, or it may be zipped
@@ -41,6 +52,14 @@ def upload(source: Source, target: TargetSession, version_id: str, title: str |
     :param version_id: The version to upload as
     :param title: The tile of this version. If None will be defaulted to either the version number or whatever the
         title was already if the version is being overwritten.
+    :param concurrency: The maximum number of files to upload at once.  This is ignored (treated as 1) if the target
+        does not support concurrent uploads.
+    :param incremental: If the version already exists, only upload files which have changed and delete files which
+        are no longer in the source.  If False every file is uploaded.
+    :param deduplicate: Copy files which are identical to a file in another version on the target instead of uploading
+        them.  Targets copy without the content passing through this process, eg: local targets hard link the file
+        and S3 copies it server side.  Only versions with a manifest are searched.  Files of a matching size must be
+        read an extra time to check their md5.
     """
     refreshing = version_id in target.deployment_spec.versions
     _logger.info("%s version %s", "refreshing" if refreshing else "Adding", version_id)
@@ -50,20 +69,209 @@ def upload(source: Source, target: TargetSession, version_id: str, title: str |
         except KeyError:
             title = version_id
 
-    target.start_version(version_id, title)
-    for filename in source.iter_files():
-        with source.open_file_for_read(filename=filename) as file_obj:
-            target.upload_file(
-                version_id=version_id,
-                filename=filename,
-                file_obj=file_obj,
-            )
+    target.start_version(version_id, title, keep_existing_files=incremental and refreshing)
+    existing_files: dict[str, FileDetails] = {}
+    if incremental and refreshing:
+        existing_files = {file.filename: file for file in target.iter_file_details(version_id)}
+    duplicates = _DuplicateIndex(target, version_id) if deduplicate else None
+
+    if concurrency > 1 and target.supports_concurrent_upload:
+        uploaded = _upload_concurrently(source, target, version_id, existing_files, concurrency, duplicates)
+    else:
+        if concurrency > 1:
+            _logger.debug("%s does not support concurrent uploads, uploading serially", type(target).__name__)
+        uploaded = {
+            filename: _upload_file(source, target, version_id, filename, existing_files.get(filename), duplicates)
+            for filename in source.iter_files()
+        }
+
+    to_delete = sorted(existing_files.keys() - uploaded.keys())
+    if to_delete:
+        target.delete_files(version_id, to_delete)
+    if incremental and refreshing:
+        _logger.info(
+            "Uploaded %d changed files, skipped %d unchanged files, deleted %d files",
+            sum(uploaded.values()), len(uploaded) - sum(uploaded.values()), len(to_delete),
+        )
 
     if refreshing:
         for alias_id in target.deployment_spec.aliases_for_version(version_id):
             refresh_alias(target, alias_id)
 
 
+class _DuplicateIndex:
+    """
+    Index of files in other versions on the target by size and md5, so identical files can be copied, not uploaded.
+    """
+
+    def __init__(self, target: TargetSession, version_id: str):
+        self._files: dict[tuple[int, str], tuple[str, str]] = {}
+        for other_version in target.deployment_spec.versions:
+            if other_version == version_id:
+                continue
+            manifest = target.get_manifest(other_version)
+            if manifest is None:
+                _logger.debug("Version %s has no manifest, not searching it for duplicates", other_version)
+                continue
+            for filename, entry in manifest.files.items():
+                if entry.md5 is not None:
+                    self._files.setdefault((entry.size, entry.md5), (other_version, filename))
+        self._sizes = {size for size, _ in self._files}
+
+    def might_contain(self, size: Optional[int]) -> bool:
+        """Check if it's worth hashing a file of this size.  None indicates the size is not known."""
+        return size in self._sizes or (size is None and bool(self._sizes))
+
+    def find(self, size: int, md5: str) -> Optional[tuple[str, str]]:
+        """
+        :return: The version and filename of an identical file, or None if there isn't one.
+        """
+        return self._files.get((size, md5))
+
+    def copy_duplicate(self, target: TargetSession, version_id: str, filename: str, size: int, md5: str) -> bool:
+        """
+        Copy an identical file from another version if there is one.
+
+        :return: True if the file was copied, False if it must be uploaded.
+        """
+        duplicate = self.find(size, md5)
+        if duplicate is None:
+            return False
+        src_version, src_name = duplicate
+        _logger.debug("Copying %s from identical file %s in version %s", filename, src_name, src_version)
+        try:
+            target.copy_file(src_version, src_name, version_id, filename)
+        except FileNotFoundError:
+            _logger.warning("%s in version %s is missing but was in its manifest", src_name, src_version)
+            return False
+        return True
+
+
+def _upload_file(
+    source: Source,
+    target: TargetSession,
+    version_id: str,
+    filename: str,
+    existing: FileDetails | None,
+    duplicates: _DuplicateIndex | None = None,
+) -> bool:
+    if source.requires_sequential_read:
+        # The file can only be opened once, so it must be buffered to both compare and upload it.
+        file_obj, size, md5 = _read_into_buffer(source, filename)
+        if existing is not None and (existing.size, existing.md5) == (size, md5):
+            _logger.debug("Skipping unchanged file %s", filename)
+            file_obj.close()
+            return False
+        return _copy_or_upload_buffered_file(target, version_id, filename, file_obj, size, md5, duplicates)
+    size = source.get_file_size(filename)
+    content_md5: tuple[int, str] | None = None
+    if existing is not None and existing.md5 is not None and size in (None, existing.size):
+        # Only files of the same size need to be read to check if they changed
+        with source.open_file_for_read(filename=filename) as file_obj:
+            content_md5 = file_md5(file_obj)
+        if content_md5 == (existing.size, existing.md5):
+            _logger.debug("Skipping unchanged file %s", filename)
+            return False
+    if duplicates is not None and duplicates.might_contain(size):
+        if content_md5 is None:
+            with source.open_file_for_read(filename=filename) as file_obj:
+                content_md5 = file_md5(file_obj)
+        if duplicates.copy_duplicate(target, version_id, filename, *content_md5):
+            return True
+    with source.open_file_for_read(filename=filename) as file_obj:
+        target.upload_file(
+            version_id=version_id,
+            filename=filename,
+            file_obj=file_obj,
+            md5=content_md5[1] if content_md5 is not None else None,
+        )
+    return True
+
+
+def _copy_or_upload_buffered_file(
+    target: TargetSession,
+    version_id: str,
+    filename: str,
+    file_obj: IO[bytes],
+    size: int,
+    md5: str,
+    duplicates: _DuplicateIndex | None,
+) -> bool:
+    if duplicates is not None and duplicates.copy_duplicate(target, version_id, filename, size, md5):
+        file_obj.close()
+        return True
+    with file_obj:
+        target.upload_file(
+            version_id=version_id,
+            filename=filename,
+            file_obj=file_obj,
+            md5=md5,
+        )
+    return True
+
+
+def _read_into_buffer(source: Source, filename: str) -> tuple[IO[bytes], int, str]:
+    return read_into_buffer(source.open_file_for_read(filename=filename))
+
+
+def _upload_concurrently(
+    source: Source,
+    target: TargetSession,
+    version_id: str,
+    existing_files: dict[str, FileDetails],
+    concurrency: int,
+    duplicates: _DuplicateIndex | None = None,
+) -> dict[str, bool]:
+    """
+    Upload all files from source using a bounded pool of worker threads.
+
+    Sources which cannot be read concurrently are read on the calling thread into a buffer, so reading the next file
+    overlaps with uploading previous ones.  At most ``concurrency * 2`` files are queued or in flight at any time.
+    The first failure stops any further files being queued and is raised once all in-flight uploads have finished.
+    :return: A dictionary of every filename in the source, True if it was uploaded or False if it was unchanged
+    """
+    results: dict[str, bool] = {}
+    pending: dict[Future, str] = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mkdocs-deploy-upload") as executor:
+        try:
+            for filename in source.iter_files():
+                if len(pending) >= concurrency * 2:
+                    _wait_for_uploads(pending, results, FIRST_COMPLETED)
+                existing = existing_files.get(filename)
+                if source.supports_concurrent_read and not source.requires_sequential_read:
+                    future = executor.submit(
+                        _upload_file, source, target, version_id, filename, existing, duplicates
+                    )
+                else:
+                    file_obj, size, md5 = _read_into_buffer(source, filename)
+                    if existing is not None and (existing.size, existing.md5) == (size, md5):
+                        _logger.debug("Skipping unchanged file %s", filename)
+                        file_obj.close()
+                        results[filename] = False
+                        continue
+                    future = executor.submit(
+                        _copy_or_upload_buffered_file, target, version_id, filename, file_obj, size, md5, duplicates
+                    )
+                pending[future] = filename
+            _wait_for_uploads(pending, results, ALL_COMPLETED)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return results
+
+
+def _wait_for_uploads(pending: dict[Future, str], results: dict[str, bool], return_when: str) -> None:
+    done, _ = wait(pending, return_when=return_when)
+    for future in done:
+        filename = pending.pop(future)
+        try:
+            results[filename] = future.result()
+        except Exception:
+            _logger.error("Failed to upload %s", filename)
+            raise
+
+
 def delete_version(target: TargetSession, version_id: str) -> None:
     """
     Delete a version from the target
@@ -95,7 +303,8 @@ def create_alias(
     :param target: The target session to create the alias on
     :param alias_id: The new alias id
     :param version: The version_id to point to
-    :param mechanisms: The named mechanisms to use.  If None then all available mechanisms will be used.
+    :param mechanisms: The named mechanisms to use.  If None then all available mechanisms which are
+        ``used_by_default`` will be used.
     """
     # Check if the given mechanisms can be implemented by this target
     available_redirect_mechanisms = get_redirect_mechanisms(target)
@@ -112,16 +321,16 @@ def create_alias(
                          f"Delete the version first! Alias name: {alias_id}")
     if alias_id is DEFAULT_VERSION and deployment_spec.default_version is not None:
         # This is the "default" alias
-        alias = deployment_spec.default_version
+        alias = deployment_spec.default_version.copy(deep=True)
     elif alias_id in deployment_spec.aliases:
-        alias = deployment_spec.aliases[alias_id]
+        alias = deployment_spec.aliases[alias_id].copy(deep=True)
     else:
         # No existing alias was found. Make a new one.
         alias = DeploymentAlias(version_id=version, redirect_mechanisms=set())
         target.set_alias(alias_id, alias)
 
     if mechanisms is None:
-        mechanisms = available_redirect_mechanisms.keys()
+        mechanisms = [name for name, mechanism in available_redirect_mechanisms.items() if mechanism.used_by_default]
 
     _logger.info("Creating %s alias redirect %s to %s", ", ".join(mechanisms), alias_id, version)
     # Remove any redirect mechanisms to a different version that we are not going to replace
@@ -179,6 +388,8 @@ def delete_alias(target: TargetSession, alias_id: Version, mechanisms: Collectio
         except KeyError:
             _logger.warning("Cannot delete alias %s not set, it has not been set", alias_id)
             return
+    # The deployment spec is read only
+    alias = alias.copy(deep=True)
 
     if mechanisms is not None:
         to_delete: list | set = [mechanism for mechanism in mechanisms if mechanism in alias.redirect_mechanisms]
@@ -193,6 +404,9 @@ def delete_alias(target: TargetSession, alias_id: Version, mechanisms: Collectio
             raise ValueError("Mechanism %s not supported by target", mechanism)
     if alias.redirect_mechanisms:
         target.set_alias(alias_id, alias)
+    elif alias_id is DEFAULT_VERSION:
+        # Deleting DEFAULT_VERSION would delete the whole site, so only the setting is removed
+        target.set_alias(alias_id, None)
     else:
         target.delete_version_or_alias(alias_id)
 
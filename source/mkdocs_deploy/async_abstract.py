@@ -0,0 +1,224 @@
+"""
+Asyncio variants of the protocols in mkdocs_deploy.abstract.
+
+These let a target keep many requests in flight on a single thread.  An AsyncTargetSession always works through a
+synchronous TargetSession, which still owns the site's metadata and is still what commits it on ``close()``.  Only the
+operations made once per file, where waiting on requests adds up, are asynchronous.  The rest are made on the
+synchronous session on a worker thread, as are redirect mechanisms.
+
+Every Source can be used through ``AsyncSourceAdapter``.  Every TargetSession can be used through
+``async_session_for()``, which gives the natively asynchronous session registered for its type if there is one.
+"""
+import asyncio
+from abc import abstractmethod
+from typing import IO, AsyncIterator, Callable, Iterable, Iterator, NamedTuple, Optional, Protocol
+
+from .abstract import FileDetails, Source, TargetSession, Version
+from .shared_implementations import read_into_buffer
+
+
+class SourceFile(NamedTuple):
+    file_obj: IO[bytes]
+    """The content, positioned at the start.  Already read from the source so reading it does not wait on the network"""
+    size: int
+    md5: str
+    """Hex md5 of the content"""
+
+
+class AsyncSource(Protocol):
+    """
+    Asyncio equivalent of ``Source``.
+    """
+
+    @abstractmethod
+    def iter_files(self) -> AsyncIterator[str]:
+        """
+        Iterate over all files in the source
+        :return: An async iterator of file names (relative file paths) in the source.
+        """
+
+    @abstractmethod
+    async def read_file(self, filename: str) -> SourceFile:
+        """
+        Read a whole file ahead of uploading it.  Only call this once for each file.
+
+        :param filename:  The file name (relative file path) of the file to read
+        :return: The file's content, which the caller must close, with its size and md5.
+        """
+
+    async def close(self) -> None:
+        """
+        Close any underlying resource handles
+        """
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class AsyncTargetSession(Protocol):
+    """
+    Asyncio equivalent of ``TargetSession``.  Methods have the same meaning as their synchronous counterparts.
+
+    The default implementations call the synchronous session on a worker thread.  ``upload_file``, ``copy_file`` and
+    ``delete_files`` may always be awaited concurrently, even if the synchronous session does not support concurrent
+    uploads.
+
+    Closing an AsyncTargetSession only releases its own resources.  Changes are saved by closing the synchronous
+    session as usual.
+    """
+
+    @property
+    @abstractmethod
+    def session(self) -> TargetSession:
+        """
+        The synchronous session this works through.  Use it for anything without an asynchronous method here, on a
+        worker thread.
+        """
+
+    async def start_version(self, version_id: str, title: str, keep_existing_files: bool = False) -> None:
+        """See ``TargetSession.start_version``"""
+        await asyncio.to_thread(self.session.start_version, version_id, title, keep_existing_files)
+
+    async def delete_version_or_alias(self, version_id: Version) -> None:
+        """See ``TargetSession.delete_version_or_alias``"""
+        await asyncio.to_thread(self.session.delete_version_or_alias, version_id)
+
+    async def upload_file(
+        self, version_id: Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None
+    ) -> None:
+        """
+        See ``TargetSession.upload_file``.  The file must not need to wait on the network to be read, eg: a
+        ``SourceFile``.
+        """
+        await asyncio.to_thread(self.session.upload_file, version_id, filename, file_obj, md5)
+
+    async def copy_file(self, src_version: Version, src_name: str, dst_version: Version, dst_name: str) -> None:
+        """See ``TargetSession.copy_file``"""
+        await asyncio.to_thread(self.session.copy_file, src_version, src_name, dst_version, dst_name)
+
+    async def delete_files(self, version_id: Version, filenames: Iterable[str]) -> None:
+        """See ``TargetSession.delete_files``"""
+        await asyncio.to_thread(self.session.delete_files, version_id, list(filenames))
+
+    async def iter_file_details(self, version_id: Version) -> list[FileDetails]:
+        """See ``TargetSession.iter_file_details``"""
+        return await asyncio.to_thread(lambda: list(self.session.iter_file_details(version_id)))
+
+    async def close(self) -> None:
+        """
+        Release resources held by this session, but not the synchronous session.
+        """
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class AsyncSourceAdapter(AsyncSource):
+    """
+    Use a synchronous Source as an AsyncSource.  Files are read on worker threads into a buffer which is only held in
+    memory for small files.
+
+    The source is not closed with the adapter: it is still owned by whoever opened it.
+    """
+
+    def __init__(self, source: Source):
+        self.source = source
+        # Sources which cannot be read concurrently are read one file at a time
+        self._read_lock = None if source.supports_concurrent_read else asyncio.Lock()
+        # Streaming sources must be read as they are iterated, holding each file until read_file() is called.
+        self._read_ahead: dict[str, SourceFile] = {}
+
+    async def iter_files(self) -> AsyncIterator[str]:
+        if not self.source.requires_sequential_read:
+            for filename in await asyncio.to_thread(lambda: list(self.source.iter_files())):
+                yield filename
+            return
+        files = iter(self.source.iter_files())
+        while (filename := await asyncio.to_thread(self._read_next, files)) is not None:
+            yield filename
+
+    def _read_next(self, files: Iterator[str]) -> Optional[str]:
+        filename = next(files, None)
+        if filename is not None:
+            self._read_ahead[filename] = self._read_file(filename)
+        return filename
+
+    async def read_file(self, filename: str) -> SourceFile:
+        if filename in self._read_ahead:
+            return self._read_ahead.pop(filename)
+        if self._read_lock is None:
+            return await asyncio.to_thread(self._read_file, filename)
+        async with self._read_lock:
+            return await asyncio.to_thread(self._read_file, filename)
+
+    def _read_file(self, filename: str) -> SourceFile:
+        return SourceFile(*read_into_buffer(self.source.open_file_for_read(filename)))
+
+
+class AsyncTargetSessionAdapter(AsyncTargetSession):
+    """
+    Use any synchronous TargetSession as an AsyncTargetSession.  Every call is made on a worker thread.
+    """
+
+    def __init__(self, session: TargetSession):
+        self._session = session
+        # Sessions which cannot upload concurrently get one upload, copy or delete at a time
+        self._lock = None if session.supports_concurrent_upload else asyncio.Lock()
+
+    @property
+    def session(self) -> TargetSession:
+        return self._session
+
+    async def _call(self, function: Callable, *args):
+        if self._lock is None:
+            return await asyncio.to_thread(function, *args)
+        async with self._lock:
+            return await asyncio.to_thread(function, *args)
+
+    async def upload_file(
+        self, version_id: Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None
+    ) -> None:
+        await self._call(self._session.upload_file, version_id, filename, file_obj, md5)
+
+    async def copy_file(self, src_version: Version, src_name: str, dst_version: Version, dst_name: str) -> None:
+        await self._call(self._session.copy_file, src_version, src_name, dst_version, dst_name)
+
+    async def delete_files(self, version_id: Version, filenames: Iterable[str]) -> None:
+        await self._call(self._session.delete_files, version_id, list(filenames))
+
+
+_ASYNC_SESSIONS: dict[type, Callable[[TargetSession], AsyncTargetSession]] = {}
+
+
+def register_async_session(
+    session_class: type, async_session_class: Callable[[TargetSession], AsyncTargetSession]
+) -> None:
+    """
+    Register a natively asynchronous session for a type of TargetSession.
+
+    :param session_class: The synchronous session class
+    :param async_session_class: Called with a synchronous session to create its asynchronous session
+    """
+    _ASYNC_SESSIONS[session_class] = async_session_class
+
+
+def async_session_for(session: TargetSession) -> AsyncTargetSession:
+    """
+    Get an AsyncTargetSession working through a TargetSession.
+
+    Sessions without a natively asynchronous session registered for their type, including wrapped sessions, are
+    adapted with ``AsyncTargetSessionAdapter``.
+    """
+    try:
+        async_session_class = _ASYNC_SESSIONS[type(session)]
+    except KeyError:
+        return AsyncTargetSessionAdapter(session)
+    return async_session_class(session)
@@ -0,0 +1,185 @@
+"""
+Asyncio equivalents of the higher level actions in mkdocs_deploy.actions.
+
+Files are uploaded, copied and deleted by awaiting the AsyncTargetSession, so a natively asynchronous session keeps
+many requests in flight on one thread.  Everything else, including redirect mechanisms, is done by the actions in
+mkdocs_deploy.actions on the synchronous session on a worker thread.
+"""
+import asyncio
+import logging
+from typing import Collection, Optional
+
+from . import actions
+from .abstract import DEFAULT_VERSION, FileDetails, Version, VersionNotFound
+from .async_abstract import AsyncSource, AsyncTargetSession
+
+_logger = logging.getLogger(__name__)
+
+
+async def upload(
+    source: AsyncSource,
+    target: AsyncTargetSession,
+    version_id: str,
+    title: Optional[str],
+    concurrency: int = 100,
+    incremental: bool = True,
+    deduplicate: bool = False,
+) -> None:
+    """
+    Upload a site.  See ``actions.upload``.
+
+    :param concurrency: The maximum number of files to read or upload at once.  Each file being uploaded is held in a
+        buffer, in memory for small files.
+    """
+    deployment_spec = target.session.deployment_spec
+    refreshing = version_id in deployment_spec.versions
+    _logger.info("%s version %s", "Refreshing" if refreshing else "Adding", version_id)
+    if title is None:
+        try:
+            title = deployment_spec.versions[version_id].title
+        except KeyError:
+            title = version_id
+
+    await target.start_version(version_id, title, keep_existing_files=incremental and refreshing)
+    existing_files: dict[str, FileDetails] = {}
+    if incremental and refreshing:
+        existing_files = {file.filename: file for file in await target.iter_file_details(version_id)}
+    duplicates = None
+    if deduplicate:
+        duplicates = await asyncio.to_thread(actions._DuplicateIndex, target.session, version_id)
+
+    uploaded = await _upload_concurrently(source, target, version_id, existing_files, concurrency, duplicates)
+
+    to_delete = sorted(existing_files.keys() - uploaded.keys())
+    if to_delete:
+        await target.delete_files(version_id, to_delete)
+    if incremental and refreshing:
+        _logger.info(
+            "Uploaded %d changed files, skipped %d unchanged files, deleted %d files",
+            sum(uploaded.values()), len(uploaded) - sum(uploaded.values()), len(to_delete),
+        )
+
+    if refreshing:
+        for alias_id in target.session.deployment_spec.aliases_for_version(version_id):
+            await refresh_alias(target, alias_id)
+
+
+async def _upload_concurrently(
+    source: AsyncSource,
+    target: AsyncTargetSession,
+    version_id: str,
+    existing_files: dict[str, FileDetails],
+    concurrency: int,
+    duplicates: Optional[actions._DuplicateIndex],
+) -> dict[str, bool]:
+    """
+    Upload every file in source with at most ``concurrency`` files being read or uploaded at any one time.
+
+    The first failure stops any further files being queued and is raised once all in-flight uploads have finished.
+    :return: A dictionary of every filename in the source, True if it was uploaded or False if it was unchanged
+    """
+    results: dict[str, bool] = {}
+    slots = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task] = set()
+    failures: list[Exception] = []
+
+    async def upload_file(filename: str) -> None:
+        try:
+            results[filename] = await _upload_file(
+                source, target, version_id, filename, existing_files.get(filename), duplicates
+            )
+        except Exception as exc:
+            _logger.error("Failed to upload %s", filename)
+            failures.append(exc)
+        finally:
+            slots.release()
+
+    try:
+        async for filename in source.iter_files():
+            await slots.acquire()
+            # Stop queueing files as soon as anything fails
+            if failures:
+                slots.release()
+                break
+            task = asyncio.create_task(upload_file(filename))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        if failures:
+            raise failures[0]
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return results
+
+
+async def _upload_file(
+    source: AsyncSource,
+    target: AsyncTargetSession,
+    version_id: str,
+    filename: str,
+    existing: Optional[FileDetails],
+    duplicates: Optional[actions._DuplicateIndex],
+) -> bool:
+    source_file = await source.read_file(filename)
+    with source_file.file_obj:
+        if existing is not None and (existing.size, existing.md5) == (source_file.size, source_file.md5):
+            _logger.debug("Skipping unchanged file %s", filename)
+            return False
+        duplicate = duplicates.find(source_file.size, source_file.md5) if duplicates is not None else None
+        if duplicate is not None:
+            src_version, src_name = duplicate
+            _logger.debug("Copying %s from identical file %s in version %s", filename, src_name, src_version)
+            try:
+                await target.copy_file(src_version, src_name, version_id, filename)
+                return True
+            except FileNotFoundError:
+                _logger.warning("%s in version %s is missing but was in its manifest", src_name, src_version)
+        await target.upload_file(version_id, filename, source_file.file_obj, source_file.md5)
+    return True
+
+
+async def delete_version(target: AsyncTargetSession, version_id: str) -> None:
+    """
+    Delete a version from the target.  See ``actions.delete_version``.
+    """
+    deployment_spec = target.session.deployment_spec
+    if deployment_spec.default_version is not None and deployment_spec.default_version.version_id == version_id:
+        await delete_alias(target, DEFAULT_VERSION)
+    for alias_id in deployment_spec.aliases_for_version(version_id):
+        await delete_alias(target, alias_id)
+    _logger.info("Deleting version %s", version_id)
+    try:
+        await target.delete_version_or_alias(version_id)
+    except VersionNotFound:
+        _logger.warning("Not deleting version %s: does not exist", version_id)
+
+
+async def create_alias(
+    target: AsyncTargetSession, alias_id: Version, version: str, mechanisms: Optional[Collection[str]] = None
+) -> None:
+    """
+    Create a new alias for a version.  See ``actions.create_alias``.
+    """
+    await asyncio.to_thread(actions.create_alias, target.session, alias_id, version, mechanisms)
+
+
+async def delete_alias(
+    target: AsyncTargetSession, alias_id: Version, mechanisms: Optional[Collection[str]] = None
+) -> None:
+    """
+    Delete an alias.  See ``actions.delete_alias``.
+    """
+    await asyncio.to_thread(actions.delete_alias, target.session, alias_id, mechanisms)
+
+
+async def refresh_alias(
+    target: AsyncTargetSession, alias_id: Version, mechanisms: Optional[Collection[str]] = None
+) -> None:
+    """
+    Refresh redirects.  See ``actions.refresh_alias``.
+    """
+    await asyncio.to_thread(actions.refresh_alias, target.session, alias_id, mechanisms)
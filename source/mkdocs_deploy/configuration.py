@@ -32,13 +32,40 @@ class MkdocsDeployConfig(pydantic.BaseModel):
     deploy_url: Optional[str] = None
     """URL to deploy to"""
 
+    invalidate_url: Optional[str] = None
+    """URL of a CDN in front of deploy_url to invalidate changed files in, eg: ``cloudfront://DISTRIBUTION_ID``"""
+
     default_aliases: list[str] = ["latest"]
     """List of aliases to add if none specified"""
 
     redirect_mechanisms: list[str] = ["html"]
     """List of alias types to use if not otherwise specified"""
 
-    _effective_built_site: Optional[str] = None
+    upload_concurrency: int = 8
+    """Maximum number of files to upload at once.
+    
+    Only used if the target supports concurrent uploads.  Set to 1 to upload one file at a time."""
+
+    deduplicate_files: bool = False
+    """Copy files which are identical to a file in another deployed version instead of uploading them again.
+    
+    Local targets hard link the files so they share storage."""
+
+    use_asyncio: bool = False
+    """Upload and delete files from an asyncio event loop instead of a pool of threads.
+    
+    Only worthwhile for targets with a natively asynchronous session (S3 with aiobotocore installed), where
+    ``upload_concurrency`` can then be in the hundreds."""
+
+    cache_control: dict[str, str] = {}
+    """Cache-Control header values by glob pattern of the filename within the version.
+    
+    The first matching pattern wins.  Only used by targets which can store headers (S3)."""
+
+    redirect_cache_control: Optional[str] = "no-cache"
+    """Cache-Control header value for redirects and version lists, which change whenever an alias moves"""
+
+    _effective_built_site: Optional[str] = pydantic.PrivateAttr(None)
 
     @property
     def effective_built_site(self) -> Optional[str]:
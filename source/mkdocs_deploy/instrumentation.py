@@ -0,0 +1,348 @@
+"""
+Instrumentation to find out where the time goes in a deployment.
+
+Wrap a source, target session, and the session's redirect mechanisms to record every call in a ``PerformanceReport``.
+Calls are grouped into phases:
+
+- ``source``: listing and opening files in the source.  Reading happens as files are uploaded so is part of ``target``.
+- ``target``: operations on the target session, including those made by redirect mechanisms.
+- ``redirect``: creating, refreshing and deleting redirects.
+- ``close``: closing the target session, which writes the site's metadata.
+
+Phases may overlap, eg: uploads run concurrently with reading the source and redirects upload files.  So each phase
+reports both its wall time, how long any of its calls were in progress, and busy time, the sum of each call's time.
+
+Starting the session and opening the source happen before there is anything to wrap, so callers measure those
+themselves with ``PerformanceReport.measure``; the command line records them as ``target.start_session`` and
+``source.open``.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+
+from . import abstract
+from .shared_implementations import CachePolicy, remaining_size
+from .versions import DeploymentAlias, DeploymentSpec, VersionManifest
+
+_SLOWEST_COUNT = 10
+
+
+class _OperationTotals:
+    """Running totals for one operation or phase"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+
+class _SlowOperation(NamedTuple):
+    seconds: float
+    sequence: int
+    """Breaks ties so heapq never compares details"""
+    phase: str
+    operation: str
+    detail: Optional[str]
+
+
+class PerformanceReport:
+    """
+    Records calls made during a command.  Thread safe.
+    """
+
+    def __init__(self, slowest_count: int = _SLOWEST_COUNT):
+        """
+        :param slowest_count: How many of the slowest individual calls to keep.
+        """
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._phases: dict[str, list[tuple[float, float]]] = {}
+        self._phase_totals: dict[str, _OperationTotals] = {}
+        self._operations: dict[tuple[str, str], _OperationTotals] = {}
+        self._slowest: list[_SlowOperation] = []
+        self._slowest_count = slowest_count
+        self._sequence = itertools.count()
+        self.api_calls: Counter[str] = Counter()
+
+    @contextmanager
+    def measure(
+        self, phase: str, operation: str, detail: Optional[str] = None, transferred: int = 0
+    ) -> Iterator[None]:
+        """
+        Time a call.  Calls which raise are recorded too.
+
+        :param detail: Describes this particular call, eg: the file name, for the list of slowest calls.
+        :param transferred: Bytes the call reads or writes.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, operation, start, time.perf_counter(), detail, transferred)
+
+    def record(
+        self, phase: str, operation: str, start: float, end: float, detail: Optional[str] = None, transferred: int = 0
+    ) -> None:
+        """
+        Record a call which has finished.
+
+        :param start: ``time.perf_counter()`` when the call started
+        :param end: ``time.perf_counter()`` when the call finished
+        """
+        seconds = end - start
+        with self._lock:
+            self._phases.setdefault(phase, []).append((start, end))
+            for totals in (
+                self._phase_totals.setdefault(phase, _OperationTotals()),
+                self._operations.setdefault((phase, operation), _OperationTotals()),
+            ):
+                totals.calls += 1
+                totals.seconds += seconds
+                totals.bytes += transferred
+            slow_operation = _SlowOperation(seconds, next(self._sequence), phase, operation, detail)
+            if len(self._slowest) < self._slowest_count:
+                heapq.heappush(self._slowest, slow_operation)
+            elif self._slowest and slow_operation > self._slowest[0]:
+                heapq.heapreplace(self._slowest, slow_operation)
+
+    def count_api_call(self, event_name: str, **_) -> None:
+        """
+        A botocore ``before-call`` event handler counting requests by service and operation, eg: ``s3.PutObject``.
+        """
+        with self._lock:
+            self.api_calls[event_name.split(".", 1)[-1]] += 1
+
+    def count_boto3_calls(self) -> None:
+        """Count API calls made by boto3 clients created after this from the default session."""
+        try:
+            import boto3
+        except ImportError:
+            return
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        boto3.DEFAULT_SESSION.events.register("before-call", self.count_api_call)
+
+    def to_dict(self) -> dict:
+        """
+        :return: The report so far as json compatible dict.
+        """
+        with self._lock:
+            return {
+                "wall_seconds": time.perf_counter() - self._start,
+                "phases": {
+                    phase: {
+                        "wall_seconds": _wall_seconds(self._phases[phase]),
+                        "busy_seconds": totals.seconds,
+                        "calls": totals.calls,
+                        "bytes": totals.bytes,
+                    }
+                    for phase, totals in self._phase_totals.items()
+                },
+                "operations": {
+                    f"{phase}.{operation}": {"calls": totals.calls, "seconds": totals.seconds, "bytes": totals.bytes}
+                    for (phase, operation), totals in sorted(self._operations.items())
+                },
+                "slowest": [
+                    {
+                        "phase": slow.phase,
+                        "operation": slow.operation,
+                        "detail": slow.detail,
+                        "seconds": slow.seconds,
+                    }
+                    for slow in sorted(self._slowest, reverse=True)
+                ],
+                "api_calls": dict(sorted(self.api_calls.items())),
+            }
+
+
+def _wall_seconds(intervals: list[tuple[float, float]]) -> float:
+    """Time during which any of the intervals was in progress"""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def _describe(version_id: abstract.Version, filename: Optional[str] = None) -> str:
+    version = "DEFAULT_VERSION" if version_id is abstract.DEFAULT_VERSION else version_id
+    return version if filename is None else f"{version}/{filename}"
+
+
+class InstrumentedSource(abstract.Source):
+    """
+    Records calls to a source in the ``source`` phase.
+    """
+
+    def __init__(self, source: abstract.Source, report: PerformanceReport):
+        self._source = source
+        self._report = report
+
+    def iter_files(self) -> Iterable[str]:
+        # Time each step separately: streaming sources download as they iterate, interleaved with uploads.
+        files = iter(self._source.iter_files())
+        while True:
+            start = time.perf_counter()
+            try:
+                filename = next(files)
+            except StopIteration:
+                self._report.record("source", "iter_files", start, time.perf_counter())
+                return
+            self._report.record("source", "iter_files", start, time.perf_counter(), filename)
+            yield filename
+
+    def open_file_for_read(self, filename: str) -> IO[bytes]:
+        with self._report.measure("source", "open_file_for_read", filename, self._source.get_file_size(filename) or 0):
+            return self._source.open_file_for_read(filename)
+
+    def get_file_size(self, filename: str) -> Optional[int]:
+        return self._source.get_file_size(filename)
+
+    @property
+    def supports_concurrent_read(self) -> bool:
+        return self._source.supports_concurrent_read
+
+    @property
+    def requires_sequential_read(self) -> bool:
+        return self._source.requires_sequential_read
+
+    def close(self) -> None:
+        with self._report.measure("source", "close"):
+            self._source.close()
+
+    def __getattr__(self, item):
+        return getattr(self._source, item)
+
+
+class InstrumentedRedirectMechanism(abstract.RedirectMechanism):
+    """
+    Records calls to a redirect mechanism in the ``redirect`` phase.
+    """
+
+    def __init__(self, mechanism: abstract.RedirectMechanism, report: PerformanceReport, name: str):
+        self._mechanism = mechanism
+        self._report = report
+        self._name = name
+
+    def create_redirect(self, session: abstract.TargetSession, alias: abstract.Version, version_id: str) -> None:
+        with self._report.measure("redirect", f"{self._name}.create_redirect", _describe(alias)):
+            self._mechanism.create_redirect(session, alias, version_id)
+
+    def delete_redirect(self, session: abstract.TargetSession, alias: abstract.Version) -> None:
+        with self._report.measure("redirect", f"{self._name}.delete_redirect", _describe(alias)):
+            self._mechanism.delete_redirect(session, alias)
+
+    def refresh_redirect(self, session: abstract.TargetSession, alias: abstract.Version, version_id: str) -> None:
+        with self._report.measure("redirect", f"{self._name}.refresh_redirect", _describe(alias)):
+            self._mechanism.refresh_redirect(session, alias, version_id)
+
+    @property
+    def used_by_default(self) -> bool:
+        return self._mechanism.used_by_default
+
+
+class InstrumentedTargetSession(abstract.TargetSession):
+    """
+    Records calls to a target session in the ``target`` phase, except ``close`` which is its own phase.
+
+    Redirect mechanisms are wrapped too, including shared ones such as ``html``.  Attributes which are not part of
+    ``TargetSession`` are passed through, so target specific redirect mechanisms still work.
+    """
+
+    def __init__(self, session: abstract.TargetSession, report: PerformanceReport):
+        self._session = session
+        self._report = report
+
+    def start_version(self, version_id: str, title: str, keep_existing_files: bool = False) -> None:
+        with self._report.measure("target", "start_version", version_id):
+            self._session.start_version(version_id, title, keep_existing_files)
+
+    def delete_version_or_alias(self, version_id: abstract.Version) -> None:
+        with self._report.measure("target", "delete_version_or_alias", _describe(version_id)):
+            self._session.delete_version_or_alias(version_id)
+
+    def upload_file(
+        self, version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None
+    ) -> None:
+        size = remaining_size(file_obj)
+        with self._report.measure("target", "upload_file", _describe(version_id, filename), size or 0):
+            self._session.upload_file(version_id, filename, file_obj, md5)
+
+    def copy_file(
+        self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str
+    ) -> None:
+        with self._report.measure("target", "copy_file", _describe(dst_version, dst_name)):
+            self._session.copy_file(src_version, src_name, dst_version, dst_name)
+
+    def download_file(self, version_id: abstract.Version, filename: str) -> IO[bytes]:
+        with self._report.measure("target", "download_file", _describe(version_id, filename)):
+            return self._session.download_file(version_id, filename)
+
+    def delete_file(self, version_id: abstract.Version, filename: str) -> None:
+        with self._report.measure("target", "delete_file", _describe(version_id, filename)):
+            self._session.delete_file(version_id, filename)
+
+    def delete_files(self, version_id: abstract.Version, filenames: Iterable[str]) -> None:
+        filenames = list(filenames)
+        with self._report.measure("target", "delete_files", f"{_describe(version_id)} ({len(filenames)} files)"):
+            self._session.delete_files(version_id, filenames)
+
+    def iter_files(self, version_id: abstract.Version) -> Iterable[str]:
+        # Listed in full so the time spent listing is measured, not just starting to.
+        with self._report.measure("target", "iter_files", _describe(version_id)):
+            return list(self._session.iter_files(version_id))
+
+    def iter_file_details(self, version_id: abstract.Version) -> Iterable[abstract.FileDetails]:
+        with self._report.measure("target", "iter_file_details", _describe(version_id)):
+            return list(self._session.iter_file_details(version_id))
+
+    def get_manifest(self, version_id: str) -> Optional[VersionManifest]:
+        with self._report.measure("target", "get_manifest", version_id):
+            return self._session.get_manifest(version_id)
+
+    def close(self, success: bool = False) -> None:
+        with self._report.measure("close", "close"):
+            self._session.close(success)
+
+    def set_alias(self, alias_id: abstract.Version, alias: Optional[DeploymentAlias]) -> None:
+        with self._report.measure("target", "set_alias", _describe(alias_id)):
+            self._session.set_alias(alias_id, alias)
+
+    def set_cache_policy(self, cache_policy: CachePolicy) -> None:
+        with self._report.measure("target", "set_cache_policy"):
+            self._session.set_cache_policy(cache_policy)
+
+    @property
+    def supports_concurrent_upload(self) -> bool:
+        return self._session.supports_concurrent_upload
+
+    @property
+    def changed_paths(self) -> Optional[set[str]]:
+        with self._report.measure("target", "changed_paths"):
+            return self._session.changed_paths
+
+    @property
+    def available_redirect_mechanisms(self) -> dict[str, abstract.RedirectMechanism]:
+        # Shared mechanisms are included so they override the unwrapped ones in get_redirect_mechanisms()
+        return {
+            name: InstrumentedRedirectMechanism(mechanism, self._report, name)
+            for name, mechanism in abstract.get_redirect_mechanisms(self._session).items()
+        }
+
+    @property
+    def deployment_spec(self) -> DeploymentSpec:
+        return self._session.deployment_spec
+
+    def __getattr__(self, item):
+        return getattr(self._session, item)
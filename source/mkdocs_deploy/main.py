@@ -1,15 +1,19 @@
+import asyncio
 import click
+import json
 import logging
 import pydantic.json
 import sys
 import yaml
-from contextlib import ExitStack
+from contextlib import ExitStack, contextmanager, nullcontext
 from pathlib import Path
-from typing import Optional
+from typing import ContextManager, Iterator, Optional
 
-from . import actions
-from .abstract import source_for_url, target_for_url
+from . import actions, async_abstract, async_actions
+from .abstract import DEFAULT_VERSION, Source, TargetSession, invalidator_for_url, source_for_url, target_for_url
 from .configuration import MkdocsDeployConfig, find_configuration, load_configuration
+from .instrumentation import InstrumentedSource, InstrumentedTargetSession, PerformanceReport
+from .shared_implementations import CachePolicy
 
 _logger =logging.getLogger(__name__)
 
@@ -21,6 +25,8 @@ _LOG_FORMAT = "%(levelname)s: %(message)s"
 _DEBUG_FORMAT = "%(levelname)s: %(name)s:  %(message)s"
 _LOG_LEVEL_NAMES = [name for name, val in logging._nameToLevel.items() if val]
 
+_REPORT_KEY = "mkdocs_deploy.performance_report"
+
 
 @click.group()
 @click.option(
@@ -32,8 +38,19 @@ _LOG_LEVEL_NAMES = [name for name, val in logging._nameToLevel.items() if val]
 @click.option("--built-site", help="URL or file path to the built site - output from mkdocs")
 @click.option("--built-site-pattern", help="Glob pattern for a file path to the built site. Replaces --built-site-url")
 @click.option("--deploy-url", help="URL to deploy to")
+@click.option("--invalidate-url", help="URL of a CDN to invalidate changed files in, eg: cloudfront://DISTRIBUTION_ID")
 @click.option("--redirect-mechanisms", help="Coma seperated list of alias mechanisms. Defaults to just 'html'")
-def main(log_level: str, config_file: Optional[Path], **overrides):
+@click.option(
+    "--report",
+    type=click.Choice(["json"]),
+    help="At the end of the command, write a report of where the time went: per phase, per operation, and API calls",
+)
+@click.option(
+    "--report-file",
+    help="Write the --report to this file instead of stderr",
+    type=click.Path(file_okay=True, dir_okay=False, path_type=Path),
+)
+def main(log_level: str, config_file: Optional[Path], report: Optional[str], report_file: Optional[Path], **overrides):
     """
     Version aware Mkdocs deployment tool.
 
@@ -48,6 +65,12 @@ def main(log_level: str, config_file: Optional[Path], **overrides):
         level=numeric_level,
         format=_LOG_FORMAT if numeric_level >= logging.INFO else _DEBUG_FORMAT,
     )
+    if report is not None:
+        context = click.get_current_context()
+        performance_report = context.meta[_REPORT_KEY] = PerformanceReport()
+        performance_report.count_boto3_calls()
+        # Called when the command finishes, even if it failed
+        context.call_on_close(lambda: _write_report(performance_report, report_file))
     actions.load_plugins()
     if config_file is not None:
         config = click.get_current_context().obj = load_configuration(config_path=config_file)
@@ -67,8 +90,20 @@ def main(log_level: str, config_file: Optional[Path], **overrides):
 @click.argument("TITLE", required=False)
 @click.option("--alias", "-a", multiple=True, help="Additional alias for this version")
 @click.option("--no-default-alias", is_flag=True, help="Do not add the default alias from config file")
-@click.option("--title", "-t", help="A title for this version")
-def deploy(version: str, title:Optional[str], alias: tuple[str]):
+@click.option("--concurrency", type=int, help="Maximum number of files to upload at once")
+@click.option(
+    "--deduplicate/--no-deduplicate", default=None, help="Copy files identical to those in other versions, not upload"
+)
+@click.option("--asyncio/--no-asyncio", "use_asyncio", default=None, help="Upload from an asyncio event loop")
+def deploy(
+    version: str,
+    title: Optional[str],
+    alias: tuple[str],
+    no_default_alias: bool,
+    concurrency: Optional[int],
+    deduplicate: Optional[bool],
+    use_asyncio: Optional[bool],
+):
     """
     Deploy a version of your documentation
 
@@ -79,15 +114,31 @@ def deploy(version: str, title:Optional[str], alias: tuple[str]):
     config: MkdocsDeployConfig = click.get_current_context().obj
     if config.effective_built_site is None:
         raise click.ClickException(f"No built site {'set' if config.built_site_pattern is None else 'found'}")
-    target = target_for_url(target_url=config.effective_built_site)
+    if concurrency is not None:
+        config.upload_concurrency = concurrency
+    if deduplicate is not None:
+        config.deduplicate_files = deduplicate
+    if use_asyncio is not None:
+        config.use_asyncio = use_asyncio
+    aliases = list(alias) if no_default_alias else [*config.default_aliases, *alias]
     with ExitStack() as exit_stack:
         try:
-            source = exit_stack.enter_context(source_for_url(source_url=config.effective_built_site))
+            source = exit_stack.enter_context(_open_source(config))
         except FileNotFoundError as exc:
             raise click.ClickException(str(exc))
-        target_session = exit_stack.enter_context(target.start_session())
-        actions.upload(source=source, target=target_session, version_id=version, title=title)
-        for _alias in alias:
+        target_session = exit_stack.enter_context(_start_session(config))
+        if config.use_asyncio:
+            asyncio.run(_upload_asyncio(source, target_session, version, title, config))
+        else:
+            actions.upload(
+                source=source,
+                target=target_session,
+                version_id=version,
+                title=title,
+                concurrency=config.upload_concurrency,
+                deduplicate=config.deduplicate_files,
+            )
+        for _alias in aliases:
             actions.create_alias(
                 target=target_session,
                 alias_id=_alias,
@@ -96,18 +147,42 @@ def deploy(version: str, title:Optional[str], alias: tuple[str]):
             )
 
 
+async def _upload_asyncio(
+    source: Source, target_session: TargetSession, version: str, title: Optional[str], config: MkdocsDeployConfig
+) -> None:
+    async with async_abstract.async_session_for(target_session) as async_session:
+        await async_actions.upload(
+            source=async_abstract.AsyncSourceAdapter(source),
+            target=async_session,
+            version_id=version,
+            title=title,
+            concurrency=config.upload_concurrency,
+            deduplicate=config.deduplicate_files,
+        )
+
+
 @main.command()
 @click.argument("VERSION")
-def delete_version(version: str):
+@click.option("--asyncio/--no-asyncio", "use_asyncio", default=None, help="Delete from an asyncio event loop")
+def delete_version(version: str, use_asyncio: Optional[bool]):
     """
     Delete a version of your documentation and all aliases pointing to it.
 
     VERSION: The version number to deploy as.
     """
     config: MkdocsDeployConfig = click.get_current_context().obj
-    target = target_for_url(target_url=config.deploy_url)
-    with target.start_session() as target_session:
-        actions.delete_version(target_session, version)
+    if use_asyncio is not None:
+        config.use_asyncio = use_asyncio
+    with _start_session(config) as target_session:
+        if config.use_asyncio:
+            asyncio.run(_delete_version_asyncio(target_session, version))
+        else:
+            actions.delete_version(target_session, version)
+
+
+async def _delete_version_asyncio(target_session: TargetSession, version: str) -> None:
+    async with async_abstract.async_session_for(target_session) as async_session:
+        await async_actions.delete_version(async_session, version)
 
 
 @main.command()
@@ -118,8 +193,7 @@ def set_alias(version: str, alias: str):
     Set an alias for a specific version, or add a redirect type for that alias.
     """
     config: MkdocsDeployConfig = click.get_current_context().obj
-    target = target_for_url(target_url=config.deploy_url)
-    with target.start_session() as target_session:
+    with _start_session(config) as target_session:
         actions.create_alias(
             target=target_session,
             alias_id=alias,
@@ -143,17 +217,16 @@ def delete_alias(alias: Optional[str], all_redirects_type: Optional[str]):
     --all-aliases Exists for preparation of site moves.
     """
     config: MkdocsDeployConfig = click.get_current_context().obj
-    target = target_for_url(target_url=config.deploy_url)
     if all_redirects_type is not None:
         if alias is not None:
             raise click.ClickException("Cannot specify an ALIAS and --all-aliases")
-        with target.start_session() as target_session:
+        with _start_session(config) as target_session:
             for alias_id, alias in target_session.deployment_spec.aliases.items():
                 matching_mechanisms = [_type for _type in all_redirects_type if _type in alias.redirect_mechanisms]
                 if matching_mechanisms:
                     actions.delete_alias(target=target_session, alias_id=alias_id, mechanisms=matching_mechanisms)
     if alias is not None:
-        with target.start_session() as target_session:
+        with _start_session(config) as target_session:
             actions.delete_alias(target=target_session, alias_id=alias, mechanisms=None)
     else:
         raise click.ClickException("If ALIAS is not given both --all-redirects-type must be set")
@@ -168,9 +241,8 @@ def set_default(version: str):
     This is very similar to an alias and makes use of redirect rules.
     """
     config: MkdocsDeployConfig = click.get_current_context().obj
-    target = target_for_url(target_url=config.deploy_url)
-    with target.start_session() as target_session:
-        actions.create_alias(target_session, ..., version, config.redirect_mechanisms)
+    with _start_session(config) as target_session:
+        actions.create_alias(target_session, DEFAULT_VERSION, version, config.redirect_mechanisms)
 
 
 @main.command()
@@ -181,23 +253,22 @@ def unset_default():
     This is very similar to an alias and makes use of redirect rules.
     """
     config: MkdocsDeployConfig = click.get_current_context().obj
-    target = target_for_url(target_url=config.deploy_url)
-    with target.start_session() as target_session:
-        actions.delete_alias(target_session, ..., None)
+    with _start_session(config) as target_session:
+        actions.delete_alias(target_session, DEFAULT_VERSION, None)
 
 
 @main.command()
 @click.option("--out-format", type=click.Choice(["plain", "json"]), help="Output format")
-def describe(out_format: str):
+@click.option("--files", is_flag=True, help="Show the number and total size of files in each version")
+def describe(out_format: str, files: bool):
     """
     Describe the current deployment setup of your software versions
     """
     config: MkdocsDeployConfig = click.get_current_context().obj
-    target = target_for_url(target_url=config.deploy_url)
-    with target.start_session() as target_session:
+    with _start_session(config) as target_session:
         if out_format == "json":
             print(target_session.deployment_spec.json(sort_keys=True, indent=True))
-        if out_format == "yaml":
+        elif out_format == "yaml":
             yaml.safe_dump(to_jsonable_dict(target_session.deployment_spec.dict()), stream=sys.stdout)
         else:
             deployment_spec = target_session.deployment_spec
@@ -207,9 +278,72 @@ def describe(out_format: str):
                 print(f"👋 Default version → {deployment_spec.default_version.version_id} "
                       f"['{', '.join(deployment_spec.default_version.redirect_mechanisms)}']")
             for version_id, version in deployment_spec.versions.items():
-                print(f"📦 {version_id} - '{version.title}'")
+                print(f"📦 {version_id} - '{version.title}'{_describe_files(target_session, version_id, files)}")
             for alias_id, alias in deployment_spec.aliases.items():
-                print(f"🔗 {alias_id} → {version_id} ['{', '.join(alias.redirect_mechanisms)}']")
+                print(f"🔗 {alias_id} → {alias.version_id} ['{', '.join(alias.redirect_mechanisms)}']")
+
+
+@contextmanager
+def _start_session(config: MkdocsDeployConfig) -> Iterator[TargetSession]:
+    """
+    Start a session on the configured target with the settings every session shares.
+
+    Once the session has closed successfully, files it changed are invalidated in the configured CDN.
+    """
+    with _measure("target", "start_session"):
+        target_session = target_for_url(target_url=config.deploy_url).start_session()
+    performance_report = _performance_report()
+    if performance_report is not None:
+        target_session = InstrumentedTargetSession(target_session, performance_report)
+    target_session.set_cache_policy(CachePolicy(config.cache_control, config.redirect_cache_control))
+    with target_session:
+        yield target_session
+    if config.invalidate_url is not None:
+        changed_paths = target_session.changed_paths
+        if changed_paths is not None and not changed_paths:
+            _logger.debug("Nothing changed, not invalidating %s", config.invalidate_url)
+            return
+        with _measure("invalidate", "invalidate"):
+            invalidator_for_url(config.invalidate_url).invalidate(changed_paths)
+
+
+def _open_source(config: MkdocsDeployConfig) -> Source:
+    with _measure("source", "open"):
+        source = source_for_url(source_url=config.effective_built_site)
+    performance_report = _performance_report()
+    if performance_report is not None:
+        source = InstrumentedSource(source, performance_report)
+    return source
+
+
+def _performance_report() -> Optional[PerformanceReport]:
+    """The report for this command or None if --report was not given"""
+    return click.get_current_context().meta.get(_REPORT_KEY)
+
+
+def _measure(phase: str, operation: str) -> ContextManager[None]:
+    """Measure with the command's report, if there is one"""
+    performance_report = _performance_report()
+    return nullcontext() if performance_report is None else performance_report.measure(phase, operation)
+
+
+def _write_report(performance_report: PerformanceReport, report_file: Optional[Path]) -> None:
+    if report_file is None:
+        json.dump(performance_report.to_dict(), sys.stderr, indent=2)
+        print(file=sys.stderr)
+    else:
+        with open(report_file, "w") as file:
+            json.dump(performance_report.to_dict(), file, indent=2)
+
+
+def _describe_files(target_session: TargetSession, version_id: str, files: bool) -> str:
+    if not files:
+        return ""
+    manifest = target_session.get_manifest(version_id)
+    if manifest is None:
+        return " (no manifest)"
+    total_size = sum(entry.size for entry in manifest.files.values())
+    return f" ({len(manifest.files)} files, {total_size} bytes)"
 
 
 @main.command()
@@ -1,49 +1,104 @@
+import base64
 import contextlib
-import copy
+import functools
+import hashlib
+import io
 import json
 import logging
 import mimetypes
+import tarfile
 import tempfile
+import threading
 import urllib.parse
-from typing import IO, Iterable, NamedTuple, Optional
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterable, NamedTuple, Optional, TYPE_CHECKING
 
 import boto3
+import boto3.s3.transfer
 import botocore.exceptions
 
 from . import local_filesystem
-from .. import abstract, shared_implementations, versions
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3.type_defs import ObjectTypeDef
+from .. import abstract, async_abstract, shared_implementations, versions
 
 _logger = logging.getLogger(__name__)
 
+_DELETE_BATCH_SIZE = 1000
+"""The maximum number of keys S3 will accept in one DeleteObjects request"""
+
+_SIZE_SUFFIXES = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+_RANGE_READ_SIZE = 1024 * 1024
+"""Minimum number of bytes fetched by each ranged GET when reading a zip file from S3"""
+
+_DEPLOYMENTS_WRITE_ATTEMPTS = 5
+"""How many times to merge and retry writing deployments.json when other deployments keep changing it"""
+
 
 def enable_plugin() -> None:
     """
     Enables the plugin.
 
-    Registers s3:// urls as both source and target
+    Registers s3:// urls as both source and target.
+    Registers cloudfront:// urls as an invalidator.
+    Registers an asynchronous session for S3 targets if aiobotocore is installed.
     """
     abstract.register_source(source_scheme="s3", source_class=S3Source)
     abstract.register_target(target_scheme="s3", target_class=target_from_url)
+    abstract.register_invalidator(invalidator_scheme="cloudfront", invalidator_class=invalidator_from_url)
+    try:
+        from . import aws_s3_async
+    except ImportError:
+        _logger.debug("aiobotocore is not installed, S3 targets will be used from asyncio through worker threads")
+    else:
+        async_abstract.register_async_session(S3TargetSession, aws_s3_async.AsyncS3TargetSession)
 
 
 class S3Source(contextlib.closing):
+    """
+    Reads a zip or tar site archive directly from S3 without first downloading it.
+
+    Tar files (optionally compressed) are read as they stream from a single GET, so the first file is available after
+    one round trip.  Zip files keep their index at the end so are instead read with ranged GETs.
+    """
 
     def __init__(self, file_url: str):
         self._exit_stack = contextlib.ExitStack()
         super().__init__(self._exit_stack)
         object_details = s3_details_from_url(file_url)
         try:
-            temp_file = self._exit_stack.enter_context(tempfile.TemporaryFile())
             s3 = boto3.client('s3')
-            s3.download_fileobj(object_details.bucket, object_details.key, temp_file)
-            self._wrapper = local_filesystem.open_file_obj_source(temp_file)
-        except ValueError as exc:
+            response = s3.get_object(Bucket=object_details.bucket, Key=object_details.key)
+            body = response['Body']
+            self._exit_stack.callback(body.close)
+            magic = body.read(4)
+            if magic[:2] == b"PK":
+                _logger.debug("Reading zip file s3://%s/%s", object_details.bucket, object_details.key)
+                body.close()
+                reader = self._exit_stack.enter_context(io.BufferedReader(
+                    S3RangeReader(s3, object_details.bucket, object_details.key, response['ContentLength']),
+                    buffer_size=_RANGE_READ_SIZE,
+                ))
+                self._wrapper = self._exit_stack.enter_context(local_filesystem.ZipSource(reader))
+            else:
+                _logger.debug("Streaming tar file s3://%s/%s", object_details.bucket, object_details.key)
+                self._wrapper = self._exit_stack.enter_context(
+                    local_filesystem.StreamingTarSource(_PrefixedReader(magic, body))
+                )
+        except (zipfile.BadZipFile, tarfile.ReadError) as exc:
             self._exit_stack.close()
             raise ValueError(f"Cannot open {file_url}") from exc
         except:
             self._exit_stack.close()
             raise
 
+    def __enter__(self):
+        return self
+
     def __getattr__(self, item: str):
         return getattr(self._wrapper, item)
 
@@ -51,23 +106,123 @@ class S3Source(contextlib.closing):
         self._exit_stack.close()
 
 
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable read only file reading an S3 object with ranged GETs.
+
+    Every read is a request, so this should be wrapped in an ``io.BufferedReader``.
+    """
+
+    def __init__(self, client, bucket: str, key: str, size: int):
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self._size)
+        if end <= self._position:
+            return 0
+        response = self._client.get_object(
+            Bucket=self._bucket, Key=self._key, Range=f"bytes={self._position}-{end - 1}"
+        )
+        data = response['Body'].read()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class _PrefixedReader(io.RawIOBase):
+    """Put back bytes already read from the start of a stream"""
+
+    def __init__(self, prefix: bytes, stream: IO[bytes]):
+        super().__init__()
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
 class S3TargetSession(abstract.TargetSession):
 
-    def __init__(self, bucket: str, prefix_key: str, seperator: str = "/"):
+    def __init__(
+        self,
+        bucket: str,
+        prefix_key: str,
+        seperator: str = "/",
+        delete_concurrency: int = 4,
+        transfer_config: Optional[boto3.s3.transfer.TransferConfig] = None,
+        compression: Optional[shared_implementations.Compression] = None,
+    ):
+        """
+        :param compression: Files to store compressed with a Content-Encoding.  Only the first encoding is used since S3
+            cannot choose between variants by the request's Accept-Encoding.
+        """
         self._bucket = bucket
         self._prefix_key = prefix_key
         self._seperator = seperator
+        self._delete_concurrency = delete_concurrency
+        self._compression = compression
+        self._cache_policy = shared_implementations.CachePolicy()
         self._client = boto3.client("s3")
-        self._deployment_spec = self._load_deployments()
+        self._transfer_config = transfer_config if transfer_config is not None else boto3.s3.transfer.TransferConfig()
+        # One transfer manager for the whole session so its threads are shared by every upload rather than being
+        # started and stopped for each file.
+        self._transfer_manager = boto3.s3.transfer.create_transfer_manager(self._client, self._transfer_config)
+        deployment_spec, self._deployments_etag = self._load_deployments()
+        self._deployment_spec = shared_implementations.DeploymentSpecJournal(deployment_spec)
+        self._manifests = shared_implementations.ManifestTracker(self._load_manifest)
         self._changed = False
-
-    def _load_deployments(self) -> versions.DeploymentSpec:
+        # Only ever added to, which is thread safe, so concurrent uploads need no lock.
+        self._changed_paths: set[str] = set()
+        # Files from before a version was started which have not yet been replaced.  They are only deleted on close so
+        # the live version keeps working while it is uploaded.
+        self._stale_files: dict[str, set[str]] = {}
+        self._stale_files_lock = threading.Lock()
+
+    def _load_deployments(self) -> tuple[versions.DeploymentSpec, Optional[str]]:
+        """
+        :return: The deployment spec and the ETag of deployments.json, or None if it does not exist
+        """
         try:
             result = self._client.get_object(
                 Bucket=self._bucket,
                 Key= self._prefix_key + versions.DEPLOYMENTS_FILENAME,
             )
-            return versions.DeploymentSpec.parse_obj(json.load(result['Body']))
+            return versions.DeploymentSpec.parse_obj(json.load(result['Body'])), result['ETag']
         except botocore.exceptions.ClientError as exc:
             if exc.response['Error']['Code'] == 'NoSuchKey':
                 _logger.warning(
@@ -76,28 +231,154 @@ class S3TargetSession(abstract.TargetSession):
                      self._bucket,
                      self._prefix_key,
                 )
-                return versions.DeploymentSpec()
+                return versions.DeploymentSpec(), None
             raise
 
-    def start_version(self, version_id: str, title: str) -> None:
-        self._deployment_spec.versions[version_id] = versions.DeploymentVersion(title=title)
-        self._changed = True
+    def _load_manifest(self, version_id: str) -> Optional[bytes]:
+        try:
+            result = self._client.get_object(
+                Bucket=self._bucket,
+                Key=self._prefix_key + versions.manifest_filename(version_id),
+            )
+            return result['Body'].read()
+        except self._client.exceptions.NoSuchKey:
+            return None
 
-    def upload_file(self, version_id: abstract.Version, filename: str, file_obj: IO[bytes]) -> None:
+    def start_version(self, version_id: str, title: str, keep_existing_files: bool = False) -> None:
+        self._deployment_spec.set_version(version_id, title)
+        self._changed = True
+        if not keep_existing_files:
+            # Listed from the bucket as in _clean_directory()
+            existing_files = {filename for filename, _ in self._iter_objects(version_id)}
+            with self._stale_files_lock:
+                self._stale_files.setdefault(version_id, set()).update(existing_files)
+        self._manifests.start_version(version_id, keep_existing_files)
+
+    def _record_replaced(self, version_id: abstract.Version, filename: str) -> None:
+        """Record a file as written or deleted in this session, so it is not deleted as stale on close."""
+        if version_id in self._stale_files:
+            with self._stale_files_lock:
+                self._stale_files[version_id].discard(filename)
+
+    def _delete_stale_files(self) -> None:
+        with self._stale_files_lock:
+            stale_files, self._stale_files = self._stale_files, {}
+        for version_id, filenames in stale_files.items():
+            if filenames:
+                _logger.debug("Deleting %d files left in %s from before it was redeployed", len(filenames), version_id)
+                self.delete_files(version_id, sorted(filenames))
+
+    def upload_file(
+        self, version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None
+    ) -> None:
+        # md5 is not used: the content is hashed as it is sent anyway, for S3 to check it arrived intact.
+        with contextlib.ExitStack() as exit_stack:
+            upload = self._prepare_upload(exit_stack, version_id, filename, file_obj)
+            if self._fits_in_one_request(upload.size):
+                # Small seekable files (eg: archive members already in memory) go in one request with no copy to a
+                # buffer.
+                request, uploaded = self._put_object_request(upload)
+                self._client.put_object(**request)
+            else:
+                hashing_reader = shared_implementations.HashingReader(upload.file_obj)
+                self._transfer_manager.upload(hashing_reader, self._bucket, upload.key, upload.extra_args).result()
+                uploaded = hashing_reader.size, hashing_reader.md5
+        self._record_upload(version_id, filename, *(upload.original or uploaded))
+
+    def _prepare_upload(
+        self, exit_stack: contextlib.ExitStack, version_id: abstract.Version, filename: str, file_obj: IO[bytes]
+    ) -> "_PreparedUpload":
+        """
+        Work out the headers for an upload, compressing the file if it should be.
+
+        :param exit_stack: Closes the compressed copy, if any, once the upload is done.
+        """
         extra_args = {}
         mime_type, _ = mimetypes.guess_type(filename)
         if mime_type is not None:
             extra_args['ContentType'] = mime_type
         if not self._alias_or_version_exists(version_id):
             raise abstract.VersionNotFound(version_id)
-
-        self._client.upload_fileobj(
-            file_obj,
-            self._bucket,
-            self._key_for(version_id, filename),
-            extra_args,
+        cache_control = self._cache_control_for(version_id, filename)
+        if cache_control is not None:
+            extra_args['CacheControl'] = cache_control
+
+        size = shared_implementations.remaining_size(file_obj)
+        # The manifest records the content before compression, for comparing with the source.
+        original: Optional[tuple[int, str]] = None
+        if self._compression is not None and self._compression.applies_to(filename, size):
+            encoding = self._compression.encodings[0]
+            start = file_obj.tell() if size is not None else None
+            hashing_reader = shared_implementations.HashingReader(file_obj)
+            # Spooled so large files are compressed to disk, not memory
+            compressed = exit_stack.enter_context(
+                tempfile.SpooledTemporaryFile(max_size=self._transfer_config.multipart_threshold)
+            )
+            self._compression.compress_file(hashing_reader, compressed, encoding)
+            original = hashing_reader.size, hashing_reader.md5
+            # Files of unknown size can't be read again, but files matching the patterns almost always shrink.
+            if compressed.tell() < hashing_reader.size or start is None:
+                extra_args['ContentEncoding'] = encoding
+                size = compressed.tell()
+                compressed.seek(0)
+                file_obj = compressed
+            else:
+                file_obj.seek(start)
+        return _PreparedUpload(self._key_for(version_id, filename), file_obj, size, extra_args, original)
+
+    def _fits_in_one_request(self, size: Optional[int]) -> bool:
+        return size is not None and size < self._transfer_config.multipart_threshold
+
+    def _put_object_request(self, upload: "_PreparedUpload") -> tuple[dict, tuple[int, str]]:
+        """
+        Read a small upload into a single PutObject request.
+
+        :return: The request's arguments, and the size and md5 of the content sent.
+        """
+        content = upload.file_obj.read()
+        digest = hashlib.md5(content, usedforsecurity=False).digest()
+        request = dict(
+            Bucket=self._bucket,
+            Key=upload.key,
+            Body=content,
+            ContentLength=len(content),
+            ContentMD5=base64.b64encode(digest).decode("ascii"),
+            **upload.extra_args,
         )
+        return request, (len(content), digest.hex())
+
+    def _record_upload(self, version_id: abstract.Version, filename: str, size: int, md5: str) -> None:
         self._changed = True
+        self._record_change(version_id, filename)
+        self._record_replaced(version_id, filename)
+        if version_id is not abstract.DEFAULT_VERSION:
+            self._manifests.record_upload(version_id, filename, size, md5)
+
+    @property
+    def supports_concurrent_upload(self) -> bool:
+        # boto3 clients are thread safe
+        return True
+
+    @property
+    def changed_paths(self) -> set[str]:
+        return set(self._changed_paths)
+
+    def _record_change(self, version_id: abstract.Version, filename: str) -> None:
+        self._changed_paths.add(self._key_for(version_id, filename)[len(self._prefix_key):])
+
+    def set_cache_policy(self, cache_policy: shared_implementations.CachePolicy) -> None:
+        self._cache_policy = cache_policy
+
+    def _cache_control_for(self, version_id: abstract.Version, filename: str) -> Optional[str]:
+        # Anything not in a version is a redirect to one
+        return self._cache_policy.cache_control_for(
+            filename, redirect=version_id not in self._deployment_spec.spec.versions
+        )
+
+    def _redirect_args(self, filename: str) -> dict[str, str]:
+        """Extra arguments for writing redirects and site meta data, which change whenever an alias moves"""
+        cache_control = self._cache_policy.cache_control_for(filename, redirect=True)
+        return {} if cache_control is None else {"CacheControl": cache_control}
 
     def delete_file(self, version_id: abstract.Version, filename: str) -> None:
         if not self._alias_or_version_exists(version_id):
@@ -106,23 +387,126 @@ class S3TargetSession(abstract.TargetSession):
         # https://stackoverflow.com/a/30698746/453851
         self._client.delete_object(Bucket=self._bucket, Key=self._key_for(version_id, filename))
         self._changed = True
+        self._record_change(version_id, filename)
+        self._record_replaced(version_id, filename)
+        if version_id is not abstract.DEFAULT_VERSION:
+            self._manifests.record_delete(version_id, filename)
+
+    def delete_files(self, version_id: abstract.Version, filenames: Iterable[str]) -> None:
+        if not self._alias_or_version_exists(version_id):
+            raise abstract.VersionNotFound(version_id)
+        filenames = list(filenames)
+        batches = [filenames[i:i + _DELETE_BATCH_SIZE] for i in range(0, len(filenames), _DELETE_BATCH_SIZE)]
+        if len(batches) > 1 and self._delete_concurrency > 1:
+            with ThreadPoolExecutor(max_workers=min(len(batches), self._delete_concurrency)) as executor:
+                for _ in executor.map(functools.partial(self._delete_batch, version_id), batches):
+                    pass
+        else:
+            for batch in batches:
+                self._delete_batch(version_id, batch)
+
+    def _delete_batch(self, version_id: abstract.Version, filenames: list[str]) -> None:
+        result = self._client.delete_objects(**self._delete_objects_request(version_id, filenames))
+        self._record_deletes(version_id, filenames, result)
+
+    def _delete_objects_request(self, version_id: abstract.Version, filenames: list[str]) -> dict:
+        _logger.debug("Deleting %d files from %s", len(filenames), version_id)
+        return dict(
+            Bucket=self._bucket,
+            Delete={
+                "Objects": [{"Key": self._key_for(version_id, filename)} for filename in filenames],
+                "Quiet": True,
+            },
+        )
+
+    def _record_deletes(self, version_id: abstract.Version, filenames: list[str], result: dict) -> None:
+        """
+        Record the files a DeleteObjects request deleted.
+
+        :raises RuntimeError: If any could not be deleted.
+        """
+        self._changed = True
+        errors = result.get("Errors", [])
+        failed_keys = {error["Key"] for error in errors}
+        for filename in filenames:
+            if self._key_for(version_id, filename) not in failed_keys:
+                self._record_change(version_id, filename)
+                self._record_replaced(version_id, filename)
+                if version_id is not abstract.DEFAULT_VERSION:
+                    self._manifests.record_delete(version_id, filename)
+        if errors:
+            raise RuntimeError(
+                f"Failed to delete {len(errors)} objects from s3://{self._bucket}. "
+                f"First error: {errors[0]['Key']} {errors[0].get('Code')} {errors[0].get('Message')}"
+            )
 
     def close(self, success: bool = False) -> None:
+        self._transfer_manager.shutdown()
         if success:
+            self._delete_stale_files()
             if self._changed:
-                meta_data = shared_implementations.generate_meta_data(self._deployment_spec)
-                for filename, content in meta_data.items():
-                    _logger.debug("Writing %s", filename)
-                    self._client.put_object(
-                        Bucket=self._bucket,
-                        Key=self._prefix_key + filename,
-                        Body=content,
-                    )
+                manifests = self._manifests.changed_manifests()
+                for version_id, manifest in manifests.items():
+                    filename = versions.manifest_filename(version_id)
+                    if manifest is None:
+                        _logger.debug("Deleting %s", filename)
+                        self._client.delete_object(Bucket=self._bucket, Key=self._prefix_key + filename)
+                    else:
+                        _logger.debug("Writing %s", filename)
+                        self._client.put_object(
+                            Bucket=self._bucket, Key=self._prefix_key + filename, Body=manifest.json().encode("utf-8")
+                        )
+                self._write_deployments()
             else:
                 _logger.debug("No changes, not writing meta")
         else:
             _logger.warning("Not saving site meta due to error. Site might be in an inconsistent state")
 
+    def _write_deployments(self) -> None:
+        """
+        Write deployments.json, and the files generated from it, without losing changes written by other sessions.
+
+        deployments.json is only written if it has not changed since it was read.  If it has, it is read again and this
+        session's changes are replayed on top of it before trying again.
+        """
+        for attempt in range(1, _DEPLOYMENTS_WRITE_ATTEMPTS + 1):
+            meta_data = shared_implementations.generate_meta_data(self._deployment_spec.spec)
+            if self._deployments_etag is None:
+                condition = {"IfNoneMatch": "*"}
+            else:
+                condition = {"IfMatch": self._deployments_etag}
+            _logger.debug("Writing %s", versions.DEPLOYMENTS_FILENAME)
+            try:
+                self._client.put_object(
+                    Bucket=self._bucket,
+                    Key=self._prefix_key + versions.DEPLOYMENTS_FILENAME,
+                    Body=meta_data.pop(versions.DEPLOYMENTS_FILENAME),
+                    **condition,
+                    **self._redirect_args(versions.DEPLOYMENTS_FILENAME),
+                )
+                self._record_change(abstract.DEFAULT_VERSION, versions.DEPLOYMENTS_FILENAME)
+            except botocore.exceptions.ClientError as exc:
+                if exc.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                    raise
+                _logger.info(
+                    "%s was changed by another deployment, merging changes (attempt %d)",
+                    versions.DEPLOYMENTS_FILENAME, attempt,
+                )
+                deployment_spec, self._deployments_etag = self._load_deployments()
+                self._deployment_spec.rebase(deployment_spec)
+                continue
+            for filename, content in meta_data.items():
+                _logger.debug("Writing %s", filename)
+                self._client.put_object(
+                    Bucket=self._bucket, Key=self._prefix_key + filename, Body=content, **self._redirect_args(filename)
+                )
+                self._record_change(abstract.DEFAULT_VERSION, filename)
+            return
+        raise RuntimeError(
+            f"Could not write {versions.DEPLOYMENTS_FILENAME} after {_DEPLOYMENTS_WRITE_ATTEMPTS} attempts, other "
+            f"deployments kept changing it"
+        )
+
     def delete_version_or_alias(self, version_id: str) -> None:
         if version_id is abstract.DEFAULT_VERSION:
             raise RuntimeError(
@@ -132,13 +516,89 @@ class S3TargetSession(abstract.TargetSession):
         if not self._alias_or_version_exists(version_id):
             raise abstract.VersionNotFound(version_id)
         self._changed = True
+        with self._stale_files_lock:
+            self._stale_files.pop(version_id, None)
         self._clean_directory(version_id)
-        self._deployment_spec.versions.pop(version_id, None)
-        self._deployment_spec.aliases.pop(version_id, None)
+        self._manifests.record_delete_version(version_id)
+        self._deployment_spec.delete_version_or_alias(version_id)
 
     def _clean_directory(self, version_id: str) -> None:
-        for file in self.iter_files(version_id=version_id):
-            self.delete_file(version_id, file)
+        # Listed from the bucket, not the manifest: a failed session may have left files the manifest does not know.
+        self.delete_files(version_id, [filename for filename, _ in self._iter_objects(version_id)])
+
+    def copy_file(
+        self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str
+    ) -> None:
+        request = self._copy_object_request(src_version, src_name, dst_version, dst_name)
+        try:
+            # Server side copy: the content never passes through this process
+            self._client.copy_object(**request)
+        except botocore.exceptions.ClientError as exc:
+            _raise_if_missing(exc, request["CopySource"]["Key"])
+            raise
+        self._record_copy(src_version, src_name, dst_version, dst_name)
+
+    def _copy_object_request(
+        self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str
+    ) -> dict:
+        """
+        Build the CopyObject request.  If the destination needs different headers from the source, eg: a 404.html copied
+        into an alias is a redirect with the redirect Cache-Control, this makes a HeadObject request.
+
+        :raises FileNotFoundError: If the source does not exist and had to be looked up.
+        """
+        for version_id in (src_version, dst_version):
+            if not self._alias_or_version_exists(version_id):
+                raise abstract.VersionNotFound(version_id)
+        request = dict(
+            Bucket=self._bucket,
+            Key=self._key_for(dst_version, dst_name),
+            CopySource={"Bucket": self._bucket, "Key": self._key_for(src_version, src_name)},
+        )
+        cache_control = self._cache_control_for(dst_version, dst_name)
+        content_type, _ = mimetypes.guess_type(dst_name)
+        if (cache_control, content_type) == (
+            self._cache_control_for(src_version, src_name), mimetypes.guess_type(src_name)[0]
+        ):
+            return request
+        # S3 either copies all of the source's headers or replaces all of them, so the rest are copied here
+        try:
+            head = self._client.head_object(**request["CopySource"])
+        except botocore.exceptions.ClientError as exc:
+            _raise_if_missing(exc, request["CopySource"]["Key"])
+            raise
+        request.update(MetadataDirective="REPLACE", Metadata=head.get("Metadata", {}))
+        if content_type is None:
+            content_type = head.get("ContentType")
+        if content_type is not None:
+            request["ContentType"] = content_type
+        if "ContentEncoding" in head:
+            request["ContentEncoding"] = head["ContentEncoding"]
+        if cache_control is not None:
+            request["CacheControl"] = cache_control
+        return request
+
+    def _record_copy(
+        self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str
+    ) -> None:
+        """
+        Record a copy in the destination's manifest.  If the source's manifest does not have the file, this makes a
+        HeadObject request.
+        """
+        self._changed = True
+        self._record_change(dst_version, dst_name)
+        self._record_replaced(dst_version, dst_name)
+        if dst_version is not abstract.DEFAULT_VERSION and self._manifests.get(dst_version) is not None:
+            entry = None
+            if src_version is not abstract.DEFAULT_VERSION:
+                entry = self._manifests.get_entry(src_version, src_name)
+            if entry is not None:
+                self._manifests.record_upload(dst_version, dst_name, entry.size, entry.md5)
+            else:
+                head = self._client.head_object(Bucket=self._bucket, Key=self._key_for(src_version, src_name))
+                self._manifests.record_upload(
+                    dst_version, dst_name, head["ContentLength"], _md5_from_etag(head["ETag"])
+                )
 
     def download_file(self, version_id: abstract.Version, filename: str) -> IO[bytes]:
         if not self._alias_or_version_exists(version_id):
@@ -150,6 +610,31 @@ class S3TargetSession(abstract.TargetSession):
             raise FileNotFoundError(self._key_for(version_id, filename)) from exc
 
     def iter_files(self, version_id: abstract.Version) -> Iterable[str]:
+        return [filename for filename, _ in self._iter_objects(version_id)]
+
+    def iter_file_details(self, version_id: abstract.Version) -> Iterable[abstract.FileDetails]:
+        """
+        Files are always listed from the bucket.  The manifest only supplies their details: the md5 of multipart
+        uploads, and the size and md5 of compressed files before compression, which the bucket does not know.
+        """
+        manifest = None if version_id is abstract.DEFAULT_VERSION else self._manifests.get(version_id)
+        result = []
+        for filename, s3_object in self._iter_objects(version_id):
+            entry = None if manifest is None else manifest.files.get(filename)
+            if entry is not None:
+                result.append(abstract.FileDetails(filename=filename, size=entry.size, md5=entry.md5))
+            else:
+                result.append(abstract.FileDetails(
+                    filename=filename, size=s3_object["Size"], md5=_md5_from_etag(s3_object["ETag"])
+                ))
+        if version_id is not abstract.DEFAULT_VERSION and manifest is None:
+            self._manifests.seed(version_id, result)
+        return result
+
+    def get_manifest(self, version_id: str) -> Optional[versions.VersionManifest]:
+        return self._manifests.get(version_id)
+
+    def _iter_objects(self, version_id: abstract.Version) -> Iterable[tuple[str, "ObjectTypeDef"]]:
         paginator = self._client.get_paginator('list_objects_v2')
         prefix = self._key_for(version_id, "")
         if version_id is abstract.DEFAULT_VERSION:
@@ -158,25 +643,22 @@ class S3TargetSession(abstract.TargetSession):
             results = paginator.paginate(Bucket=self._bucket, Prefix=prefix)
         for page in results:
             for file in page.get('Contents', ()):
-                yield file['Key'][len(prefix):]
+                yield file['Key'][len(prefix):], file
 
     def set_alias(self, alias_id: abstract.Version, alias: versions.DeploymentAlias) -> None:
-        alias = copy.deepcopy(alias)
         if alias_id is abstract.DEFAULT_VERSION:
-            self._deployment_spec.default_version = alias
+            self._deployment_spec.set_default_version(alias)
         else:
-            self._deployment_spec.aliases[alias_id] = alias
+            self._deployment_spec.set_alias(alias_id, alias)
         self._changed = True
 
     @property
     def available_redirect_mechanisms(self) -> dict[str, abstract.RedirectMechanism]:
-        # TODO add S3 redirect
-        # TODO cloud front redirect rules
-        return {}
+        return {"s3": S3WebsiteRedirect()}
 
     @property
     def deployment_spec(self) -> versions.DeploymentSpec:
-        return copy.deepcopy(self._deployment_spec)
+        return self._deployment_spec.snapshot()
 
     def _key_for(self, version_id: abstract.Version, filename: str) -> str:
         if version_id is abstract.DEFAULT_VERSION:
@@ -188,25 +670,265 @@ class S3TargetSession(abstract.TargetSession):
     def _alias_or_version_exists(self, version_id: abstract.Version) -> bool:
         if version_id is abstract.DEFAULT_VERSION:
             return True
-        return version_id in self._deployment_spec.versions or version_id in self._deployment_spec.aliases
+        deployment_spec = self._deployment_spec.spec
+        return version_id in deployment_spec.versions or version_id in deployment_spec.aliases
+
+
+class _PreparedUpload(NamedTuple):
+    key: str
+    file_obj: IO[bytes]
+    """The content to send: the file given or its compressed copy"""
+    size: Optional[int]
+    """Size of the content to send, or None if not known"""
+    extra_args: dict[str, str]
+    """Headers for the upload, eg: ``ContentType``"""
+    original: Optional[tuple[int, str]]
+    """Size and md5 before compression, if the file was compressed"""
+
+
+def _raise_if_missing(exc: botocore.exceptions.ClientError, key: str) -> None:
+    """Turn an S3 error for a missing object into FileNotFoundError"""
+    if exc.response['Error']['Code'] in ('NoSuchKey', '404'):
+        raise FileNotFoundError(key) from exc
+
+
+def _md5_from_etag(etag: str) -> Optional[str]:
+    """
+    Objects uploaded in a single part have an ETag of their md5.  Multipart uploads have an ETag of the form
+    ``"<md5 of part md5s>-<part count>"`` which says nothing about the content.
+    """
+    etag = etag.strip('"')
+    if "-" in etag:
+        return None
+    return etag
+
+
+class S3WebsiteRedirect(abstract.RedirectMechanism):
+    """
+    Redirects using S3 static website hosting, without writing a file per page.
+
+    Named aliases are a single routing rule in the bucket's website configuration redirecting every key with the alias
+    prefix to the same key in the version.  The default version is a zero byte ``index.html`` with
+    ``x-amz-website-redirect-location`` set.  The bucket must already have static website hosting enabled, so this is
+    only used when asked for by name.
+    """
+
+    @property
+    def used_by_default(self) -> bool:
+        return False
+
+    def create_redirect(self, session: "S3TargetSession", alias: abstract.Version, version_id: str) -> None:
+        if alias is abstract.DEFAULT_VERSION:
+            session._client.put_object(
+                Bucket=session._bucket,
+                Key=session._key_for(abstract.DEFAULT_VERSION, "index.html"),
+                Body=b"",
+                ContentType="text/html",
+                WebsiteRedirectLocation=f"/{session._key_for(version_id, '')}",
+                **session._redirect_args("index.html"),
+            )
+            session._record_change(abstract.DEFAULT_VERSION, "index.html")
+        else:
+            alias_prefix = session._key_for(alias, "")
+            website_configuration = self._get_website_configuration(session)
+            routing_rules = [
+                rule for rule in website_configuration.get("RoutingRules", [])
+                if rule.get("Condition", {}).get("KeyPrefixEquals") != alias_prefix
+            ]
+            routing_rules.append({
+                "Condition": {"KeyPrefixEquals": alias_prefix},
+                # Aliases move so must not be cached by browsers as a permanent (301) redirect would be.
+                "Redirect": {"ReplaceKeyPrefixWith": session._key_for(version_id, ""), "HttpRedirectCode": "302"},
+            })
+            if len(routing_rules) > _MAX_ROUTING_RULES:
+                raise ValueError(
+                    f"Cannot add s3 redirect for {alias}. s3://{session._bucket} would have more than "
+                    f"{_MAX_ROUTING_RULES} website routing rules"
+                )
+            website_configuration["RoutingRules"] = routing_rules
+            self._put_website_configuration(session, website_configuration)
+            # Every page of the alias now redirects somewhere else
+            session._record_change(alias, "*")
+
+    def refresh_redirect(self, session: "S3TargetSession", alias: abstract.Version, version_id: str) -> None:
+        # Redirects are not per file, so they remain valid after a version changes. Recreating replaces the old one.
+        self.create_redirect(session, alias, version_id)
+
+    def delete_redirect(self, session: "S3TargetSession", alias: abstract.Version) -> None:
+        if alias is abstract.DEFAULT_VERSION:
+            key = session._key_for(abstract.DEFAULT_VERSION, "index.html")
+            try:
+                head = session._client.head_object(Bucket=session._bucket, Key=key)
+            except botocore.exceptions.ClientError as exc:
+                if exc.response['Error']['Code'] in ('NoSuchKey', '404'):
+                    return
+                raise
+            # Don't delete an index.html written by a different redirect mechanism
+            if "WebsiteRedirectLocation" in head:
+                session._client.delete_object(Bucket=session._bucket, Key=key)
+                session._record_change(abstract.DEFAULT_VERSION, "index.html")
+        else:
+            alias_prefix = session._key_for(alias, "")
+            website_configuration = self._get_website_configuration(session)
+            routing_rules = website_configuration.get("RoutingRules", [])
+            remaining_rules = [
+                rule for rule in routing_rules if rule.get("Condition", {}).get("KeyPrefixEquals") != alias_prefix
+            ]
+            if len(remaining_rules) != len(routing_rules):
+                if remaining_rules:
+                    website_configuration["RoutingRules"] = remaining_rules
+                else:
+                    website_configuration.pop("RoutingRules")
+                self._put_website_configuration(session, website_configuration)
+                session._record_change(alias, "*")
+
+    @staticmethod
+    def _get_website_configuration(session: "S3TargetSession") -> dict:
+        try:
+            result = session._client.get_bucket_website(Bucket=session._bucket)
+        except botocore.exceptions.ClientError as exc:
+            if exc.response['Error']['Code'] == 'NoSuchWebsiteConfiguration':
+                raise RuntimeError(
+                    f"s3://{session._bucket} does not have static website hosting enabled. "
+                    f"This is required for s3 redirects"
+                ) from exc
+            raise
+        return {key: value for key, value in result.items() if key in _WEBSITE_CONFIGURATION_KEYS}
+
+    @staticmethod
+    def _put_website_configuration(session: "S3TargetSession", website_configuration: dict) -> None:
+        _logger.debug("Updating website configuration for s3://%s", session._bucket)
+        session._client.put_bucket_website(Bucket=session._bucket, WebsiteConfiguration=website_configuration)
+
+
+_MAX_ROUTING_RULES = 50
+"""The maximum number of routing rules S3 allows in a bucket website configuration"""
+
+_WEBSITE_CONFIGURATION_KEYS = ("ErrorDocument", "IndexDocument", "RedirectAllRequestsTo", "RoutingRules")
 
 
 class S3Target(abstract.Target):
 
-    def __init__(self, bucket: str, prefix_key: str, seperator: str = "/"):
+    def __init__(
+        self,
+        bucket: str,
+        prefix_key: str,
+        seperator: str = "/",
+        delete_concurrency: int = 4,
+        transfer_config: Optional[boto3.s3.transfer.TransferConfig] = None,
+        compression: Optional[shared_implementations.Compression] = None,
+    ):
         self._bucket = bucket
         if prefix_key and not prefix_key[-1] == seperator:
             prefix_key += seperator
         self._prefix_key = prefix_key
         self._seperator = seperator
+        self._delete_concurrency = delete_concurrency
+        self._transfer_config = transfer_config
+        self._compression = compression
 
     def start_session(self) -> S3TargetSession:
-        return S3TargetSession(self._bucket, self._prefix_key, self._seperator)
+        return S3TargetSession(
+            self._bucket,
+            self._prefix_key,
+            self._seperator,
+            self._delete_concurrency,
+            self._transfer_config,
+            self._compression,
+        )
 
 
 def target_from_url(url: str) -> "S3Target":
+    """
+    Create a target from an s3:// url.
+
+    Uploads may be tuned with query parameters, eg: ``s3://bucket/prefix?multipart_threshold=64MB&max_concurrency=20``
+
+    - ``multipart_threshold``: files this size or larger are uploaded in parts.
+    - ``multipart_chunksize``: size of each part.
+    - ``max_concurrency``: maximum number of requests the session will make at once for uploads.
+    - ``compress``: comma separated patterns of files to store gzip compressed, eg: ``*.html,*.js,*.json``.
+    - ``compress_encodings``: use ``br`` instead of ``gzip``.  Only do this if every client accepts brotli.
+    """
     details = s3_details_from_url(url)
-    return S3Target(details.bucket, details.key)
+    query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+    # Compression options are removed from the query first, leaving only transfer options.
+    compression = shared_implementations.Compression.from_query(query)
+    return S3Target(
+        details.bucket,
+        details.key,
+        transfer_config=_transfer_config_from_query(query, url),
+        compression=compression,
+    )
+
+
+def _transfer_config_from_query(query: dict[str, str], url: str) -> Optional[boto3.s3.transfer.TransferConfig]:
+    if not query:
+        return None
+    kwargs = {}
+    for name, value in query.items():
+        if name in ("multipart_threshold", "multipart_chunksize"):
+            kwargs[name] = _parse_size(value)
+        elif name == "max_concurrency":
+            kwargs[name] = int(value)
+        else:
+            raise ValueError(f"Unknown S3 target option {name} in {url}")
+    return boto3.s3.transfer.TransferConfig(**kwargs)
+
+
+def _parse_size(value: str) -> int:
+    """Parse a size in bytes with an optional KB, MB or GB suffix"""
+    value = value.strip().upper()
+    for suffix, multiplier in _SIZE_SUFFIXES.items():
+        if value.endswith(suffix):
+            return int(value[:-len(suffix)]) * multiplier
+    return int(value)
+
+
+class CloudFrontInvalidator(abstract.Invalidator):
+    """
+    Invalidates changed files in a CloudFront distribution.
+
+    Changed paths are collapsed to fit a single invalidation (see ``shared_implementations.invalidation_paths``) since
+    CloudFront charges per path and limits how many may be in progress at once.
+    """
+
+    def __init__(self, distribution_id: str, path_prefix: str = "/"):
+        """
+        :param distribution_id: The CloudFront distribution to invalidate, eg: ``E2QWRUHAPOMQZL``
+        :param path_prefix: The url path of the site root on the distribution.
+        """
+        self._distribution_id = distribution_id
+        self._path_prefix = path_prefix if path_prefix.endswith("/") else path_prefix + "/"
+
+    def invalidate(self, paths: Optional[Iterable[str]]) -> None:
+        site_paths = ["*"] if paths is None else shared_implementations.invalidation_paths(paths)
+        if not site_paths:
+            _logger.debug("Nothing changed, not invalidating CloudFront distribution %s", self._distribution_id)
+            return
+        items = [self._path_prefix + urllib.parse.quote(path, safe="/*") for path in site_paths]
+        result = boto3.client("cloudfront").create_invalidation(
+            DistributionId=self._distribution_id,
+            InvalidationBatch={
+                "Paths": {"Quantity": len(items), "Items": items},
+                "CallerReference": str(uuid.uuid4()),
+            },
+        )
+        _logger.info(
+            "Invalidating %d paths in CloudFront distribution %s: %s",
+            len(items), self._distribution_id, result["Invalidation"]["Id"],
+        )
+
+
+def invalidator_from_url(url: str) -> CloudFrontInvalidator:
+    """
+    Create an invalidator from a cloudfront:// url, eg: ``cloudfront://E2QWRUHAPOMQZL/docs/`` where the site is served
+    from ``/docs/`` on the distribution.
+    """
+    parts = urllib.parse.urlparse(url)
+    if not parts.netloc:
+        raise ValueError(f"Not a valid CloudFront URL. No distribution id in {url}")
+    return CloudFrontInvalidator(parts.netloc, parts.path or "/")
 
 
 class S3Details(NamedTuple):
@@ -0,0 +1,100 @@
+"""
+Asyncio S3 session using aiobotocore.
+
+This is only available if aiobotocore is installed (``pip install mkdocs-deploy[async]``).  The s3 plugin registers it
+as the asynchronous session for ``S3TargetSession``.
+"""
+import asyncio
+import contextlib
+from typing import IO, Iterable, Optional
+
+import aiobotocore.session
+import botocore.exceptions
+
+from .. import abstract, async_abstract, shared_implementations
+from .aws_s3 import _DELETE_BATCH_SIZE, S3TargetSession, _raise_if_missing
+
+
+class AsyncS3TargetSession(async_abstract.AsyncTargetSession):
+    """
+    Uploads, copies and deletes are each a single request awaited on the event loop, so hundreds may be in flight at
+    once.  Requests are built and recorded by the synchronous session, so both write the same objects, manifests and
+    changed paths.
+
+    Files too large for a single request are uploaded in parts by the synchronous session on a worker thread.  So is
+    compressing and reading files, which would otherwise hold up the event loop.
+    """
+
+    def __init__(self, session: S3TargetSession):
+        self._session = session
+        self._exit_stack = contextlib.AsyncExitStack()
+        self._client = None
+
+    @property
+    def session(self) -> S3TargetSession:
+        return self._session
+
+    async def __aenter__(self):
+        # The same endpoint and region as the synchronous client, so both always see the same bucket
+        self._client = await self._exit_stack.enter_async_context(aiobotocore.session.get_session().create_client(
+            "s3",
+            region_name=self._session._client.meta.region_name,
+            endpoint_url=self._session._client.meta.endpoint_url,
+        ))
+        return self
+
+    async def close(self) -> None:
+        await self._exit_stack.aclose()
+
+    async def upload_file(
+        self, version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None
+    ) -> None:
+        if not self._session._fits_in_one_request(shared_implementations.remaining_size(file_obj)):
+            await asyncio.to_thread(self._session.upload_file, version_id, filename, file_obj, md5)
+            return
+        request, (size, md5_hex) = await asyncio.to_thread(self._put_object_request, version_id, filename, file_obj)
+        await self._client.put_object(**request)
+        self._session._record_upload(version_id, filename, size, md5_hex)
+
+    def _put_object_request(
+        self, version_id: abstract.Version, filename: str, file_obj: IO[bytes]
+    ) -> tuple[dict, tuple[int, str]]:
+        with contextlib.ExitStack() as exit_stack:
+            upload = self._session._prepare_upload(exit_stack, version_id, filename, file_obj)
+            request, uploaded = self._session._put_object_request(upload)
+        return request, upload.original or uploaded
+
+    async def copy_file(
+        self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str
+    ) -> None:
+        # Building the request may need a HeadObject request from the synchronous client
+        request = await asyncio.to_thread(
+            self._session._copy_object_request, src_version, src_name, dst_version, dst_name
+        )
+        try:
+            await self._client.copy_object(**request)
+        except botocore.exceptions.ClientError as exc:
+            _raise_if_missing(exc, request["CopySource"]["Key"])
+            raise
+        # So may recording it
+        await asyncio.to_thread(self._session._record_copy, src_version, src_name, dst_version, dst_name)
+
+    async def delete_files(self, version_id: abstract.Version, filenames: Iterable[str]) -> None:
+        if not self._session._alias_or_version_exists(version_id):
+            raise abstract.VersionNotFound(version_id)
+        filenames = list(filenames)
+        await asyncio.gather(*(
+            self._delete_batch(version_id, filenames[i:i + _DELETE_BATCH_SIZE])
+            for i in range(0, len(filenames), _DELETE_BATCH_SIZE)
+        ))
+
+    async def _delete_batch(self, version_id: abstract.Version, filenames: list[str]) -> None:
+        result = await self._client.delete_objects(**self._session._delete_objects_request(version_id, filenames))
+        self._session._record_deletes(version_id, filenames, result)
+
+    async def delete_version_or_alias(self, version_id: abstract.Version) -> None:
+        # Delete the files here so their batches are all in flight at once.  The synchronous session then finds the
+        # version empty and only has to record it as deleted.
+        if version_id is not abstract.DEFAULT_VERSION and self._session._alias_or_version_exists(version_id):
+            await self.delete_files(version_id, await asyncio.to_thread(self._session.iter_files, version_id))
+        await asyncio.to_thread(self._session.delete_version_or_alias, version_id)
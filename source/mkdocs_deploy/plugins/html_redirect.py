@@ -32,10 +32,11 @@ class HtmlRedirect(RedirectMechanism):
             for filename in files_created:
                 # I really don't remember why I added this?!
                 if filename == "404.html" or filename.endswith("/404.htm"):
-                    session.upload_file(
-                        version_id=alias,
-                        filename=filename,
-                        file_obj=session.download_file(version_id=version_id, filename=filename)
+                    session.copy_file(
+                        src_version=version_id,
+                        src_name=filename,
+                        dst_version=alias,
+                        dst_name=filename,
                     )
                 else:
                     url = relative_link(target_version=version_id, target_file_name=filename)
@@ -45,8 +46,8 @@ class HtmlRedirect(RedirectMechanism):
                         file_obj=BytesIO(_HTML_REDIRECT_PATTERN.format(url=url).encode("utf-8"))
                     )
 
-            for filename in files_deleted:
-                session.delete_file(alias, filename)
+            if files_deleted:
+                session.delete_files(alias, files_deleted)
 
     def refresh_redirect(self, session: TargetSession, alias: Version, version_id: str) -> None:
         # create_redirect already cleans up so no need to explicitly delete the old one
@@ -58,8 +59,7 @@ class HtmlRedirect(RedirectMechanism):
                 session.delete_file(version_id=DEFAULT_VERSION, filename="index.html")
         else:
             to_delete = list(session.iter_files(version_id=alias))
-            for filename in to_delete:
-                session.delete_file(version_id=alias, filename=filename)
+            session.delete_files(version_id=alias, filenames=to_delete)
 
 
 _HTML_REDIRECT_PATTERN="""<!DOCTYPE html>
@@ -1,17 +1,43 @@
+import contextlib
+import heapq
+import io
 import logging
 import os
+import shutil
+import stat
 import tarfile
+import threading
 import urllib.parse
+import uuid
 import zipfile
-from copy import deepcopy
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import IO, Iterable, Optional, Union
+from typing import IO, Iterable, Iterator, NamedTuple, Optional, Union
 
-from .. import abstract, shared_implementations
-from ..versions import DeploymentAlias, DeploymentSpec, DeploymentVersion
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+from .. import abstract, shared_implementations, versions
+from ..versions import DeploymentAlias, DeploymentSpec, manifest_filename
 
 _logger = logging.getLogger(__name__)
 
+_IN_MEMORY_MEMBER_SIZE = 1024 * 1024
+"""Archive members up to this size are read into memory when opened, giving a seekable file of known size"""
+
+_WORKING_DIR = ".mkdocs-deploy"
+"""Suffix of the directory beside the target for files which are not (yet or any longer) part of the site"""
+
+_FICLONE = 0x40049409
+"""Linux ioctl to clone (reflink) a whole file on copy-on-write file systems such as btrfs and xfs"""
+
+_SCAN_CONCURRENCY = 8
+"""Maximum number of directories listed at once.  Listing is dominated by latency on network file systems"""
+
 
 def enable_plugin() -> None:
     """
@@ -29,20 +55,27 @@ class LocalFileTreeSource(abstract.Source):
 
     def __init__(self, file_path: Union[Path]):
         self._file_path = file_path
+        self._sizes: dict[str, int] = {}
 
     def iter_files(self) -> Iterable[str]:
-        return self._iter_files(self._file_path)
-
-    def _iter_files(self, file_path: Path) -> Iterable[str]:
-        for file in file_path.iterdir():
-            if file.is_file():
-                yield str(file.relative_to(self._file_path))
-            elif file.is_dir():
-                yield from self._iter_files(file)
+        for file in _scan_tree(self._file_path, follow_symlinks=True):
+            # Remember sizes so get_file_size() does not need to stat every file a second time
+            self._sizes[file.filename] = file.size
+            yield file.filename
 
     def open_file_for_read(self, filename: str) -> IO[bytes]:
         return open(self._file_path / filename, "rb")
 
+    def get_file_size(self, filename: str) -> Optional[int]:
+        try:
+            return self._sizes[filename]
+        except KeyError:
+            return (self._file_path / filename).stat().st_size
+
+    @property
+    def supports_concurrent_read(self) -> bool:
+        return True
+
 
 class TarSource(abstract.Source):
 
@@ -54,22 +87,67 @@ class TarSource(abstract.Source):
         else:
             self._tar_file = tarfile.open(fileobj=file_path, mode="r")
         self._file_path = file_path
+        # TarFile.getmember() is a linear search, so index members once.
+        self._members = {
+            member.name[len(prefix):]: member
+            for member in self._tar_file.getmembers()
+            if member.isreg() and member.name.startswith(prefix)
+        }
 
     def iter_files(self) -> Iterable[str]:
-        for file in self._tar_file.getmembers():
-            if file.isreg() and file.name.startswith(self._prefix):
-                yield file.name[len(self._prefix):]
+        return iter(self._members)
 
     def open_file_for_read(self, filename: str) -> IO[bytes]:
-        result = self._tar_file.extractfile(self._prefix + filename)
-        if result is None:
+        try:
+            member = self._members[filename]
+        except KeyError:
             raise RuntimeError(f"Requested file is not a regular file: {filename} in {self._file_path}")
-        return result
+        return _open_tar_member(self._tar_file, member)
+
+    def get_file_size(self, filename: str) -> Optional[int]:
+        return self._members[filename].size
 
     def close(self):
         self._tar_file.close()
 
 
+class StreamingTarSource(abstract.Source):
+    """
+    Reads a tar (optionally compressed) from a stream without ever seeking, so it can be read as it downloads.
+
+    Files can only be read once, in order.  See ``Source.requires_sequential_read``.
+    """
+
+    def __init__(self, file_obj: IO[bytes], prefix: str = "site/"):
+        super().__init__()
+        self._prefix = prefix
+        self._tar_file = tarfile.open(fileobj=file_obj, mode="r|*")
+        self._current_member: Optional[tarfile.TarInfo] = None
+
+    def iter_files(self) -> Iterable[str]:
+        for member in self._tar_file:
+            if member.isreg() and member.name.startswith(self._prefix):
+                self._current_member = member
+                yield member.name[len(self._prefix):]
+        self._current_member = None
+
+    def open_file_for_read(self, filename: str) -> IO[bytes]:
+        if self._current_member is None or self._current_member.name != self._prefix + filename:
+            raise RuntimeError(f"Cannot read {filename} out of order from a streaming tar")
+        return _open_tar_member(self._tar_file, self._current_member)
+
+    def get_file_size(self, filename: str) -> Optional[int]:
+        if self._current_member is not None and self._current_member.name == self._prefix + filename:
+            return self._current_member.size
+        return None
+
+    @property
+    def requires_sequential_read(self) -> bool:
+        return True
+
+    def close(self):
+        self._tar_file.close()
+
 
 class ZipSource(abstract.Source):
 
@@ -84,12 +162,31 @@ class ZipSource(abstract.Source):
                 yield file.filename[len(self._prefix):]
 
     def open_file_for_read(self, filename: str) -> IO[bytes]:
-        return self._zip_file.open(self._prefix + filename, "r")
+        info = self._zip_file.getinfo(self._prefix + filename)
+        if info.file_size <= _IN_MEMORY_MEMBER_SIZE:
+            return io.BytesIO(self._zip_file.read(info))
+        return self._zip_file.open(info, "r")
+
+    def get_file_size(self, filename: str) -> Optional[int]:
+        return self._zip_file.getinfo(self._prefix + filename).file_size
 
     def close(self):
         self._zip_file.close()
 
 
+def _open_tar_member(tar_file: tarfile.TarFile, member: tarfile.TarInfo) -> IO[bytes]:
+    """
+    Open a member of a tar.  Small members are read into memory so targets get a seekable file of known size.
+    """
+    result = tar_file.extractfile(member)
+    if result is None:
+        raise RuntimeError(f"Requested file is not a regular file: {member.name}")
+    if member.size <= _IN_MEMORY_MEMBER_SIZE:
+        with result:
+            return io.BytesIO(result.read())
+    return result
+
+
 def open_source(path: str) -> abstract.Source:
     """
     Open a local source.  Will
@@ -134,160 +231,744 @@ def open_file_obj_source(file: IO[bytes]) -> abstract.Source:
 
 def _path_from_url(url: str) -> Path:
     if "://" in url:
-        return Path((url.path or "")[1:])
+        return Path(urllib.parse.urlparse(url).path or "/")
     return Path(url)
 
 
 class LocalFileTreeTargetSession(abstract.TargetSession):
 
-    def __init__(self, target_path: Path):
+    def __init__(
+        self,
+        target_path: Path,
+        link_files: bool = False,
+        compression: Optional[shared_implementations.Compression] = None,
+    ):
+        """
+        :param target_path: The root directory of the site.
+        :param link_files: Hard link uploaded files to the source files where possible instead of copying them.  Only
+            safe if the source files are never modified in place after the deploy.
+        :param compression: Files to write pre-compressed copies of alongside the original, eg: ``index.html.gz``, for
+            web servers to send instead (nginx ``gzip_static`` / ``brotli_static``).
+        """
         self._target_path = target_path.resolve()
+        if not self._target_path.name:
+            raise ValueError(
+                f"Cannot use {self._target_path} as a target, deploy to a directory within it instead.  The target's "
+                f"parent directory is needed for staging and deleting versions."
+            )
+        self._working_path_created: Optional[Path] = None
+        self._working_path_lock = threading.Lock()
+        self._link_files = link_files
+        self._compression = compression
+        self._deployment_spec = shared_implementations.DeploymentSpecJournal(self._load_deployments())
+        self._manifests = shared_implementations.ManifestTracker(self._load_manifest)
+        self._changed = False
+        self._file_md5s: dict[tuple[int, int, int], str] = {}
+        """md5s of files recorded without one, by file identity.  Only kept in memory: reading must not write"""
+        self._staging: dict[str, Path] = {}
+        self._cleanup_threads: list[threading.Thread] = []
+
+    def _load_deployments(self) -> DeploymentSpec:
         try:
-            self._deployment_spec = DeploymentSpec.parse_file(self._target_path / 'deployments.json')
+            return DeploymentSpec.parse_file(self._target_path / versions.DEPLOYMENTS_FILENAME)
         except FileNotFoundError:
             # TODO attempt to parse versions.json instead.
-            self._deployment_spec = DeploymentSpec()
-        self._changed = False
+            return DeploymentSpec()
 
-    def start_version(self, version_id: str, title: str) -> None:
-        if version_id in self._deployment_spec.aliases:
+    def _load_manifest(self, version_id: str) -> Optional[bytes]:
+        try:
+            return (self._target_path / manifest_filename(version_id)).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def start_version(self, version_id: str, title: str, keep_existing_files: bool = False) -> None:
+        if version_id in self._deployment_spec.spec.aliases:
             raise ValueError(f"Cannot create a version with the same name as an alias. "
                              f"Delete the alias first: {version_id}")
-        if version_id not in self._deployment_spec.versions:
-            self._deployment_spec.versions[version_id] = DeploymentVersion(title=title)
-        else:
-            # If there is other meta, we don't really want to overwrite it here.
-            # It seems pragmatic to roll over old meta.
-            # I guess this decision might change if someone has a burning reason to start new every time.
-            self._deployment_spec.versions[version_id].title = title
+        # If there is other meta, we don't really want to overwrite it here.
+        # It seems pragmatic to roll over old meta.
+        # I guess this decision might change if someone has a burning reason to start new every time.
+        self._deployment_spec.set_version(version_id, title)
         self._changed = True
-        version_path = self._path_for_file(version_id)
-        # Ensure the path is clean with no junk left behind for previous failure
-        _recursive_delete(version_path)
-        version_path.mkdir(parents=True, exist_ok=False)
-
-    def upload_file(self, version_id: Union[str, type(...)], filename: str, file_obj: IO[bytes]) -> None:
+        # Files are written to a staging directory which replaces the live version on close(success=True), so readers
+        # never see a half deployed version and a failed deploy leaves the live version untouched.
+        if version_id in self._staging:
+            self._background_delete(self._staging.pop(version_id))
+        staging_path = self._working_path / "staging" / uuid.uuid4().hex
+        live_path = self._path_for_file(version_id)
+        if keep_existing_files and live_path.is_dir():
+            _link_tree(live_path, staging_path)
+        else:
+            staging_path.mkdir(parents=True)
+        self._staging[version_id] = staging_path
+        self._manifests.start_version(version_id, keep_existing_files)
+
+    def upload_file(
+        self, version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: Optional[str] = None
+    ) -> None:
+        self._check_not_symlinked(version_id)
         target_path = self._path_for_file(version_id, filename)
         _logger.debug("Adding file %s", target_path)
         target_path.parent.mkdir(parents=True, exist_ok=True)
         self._changed = True
-        with open(target_path, "wb") as target_file:
-            while bytes_read := file_obj.read(102400):
-                target_file.write(bytes_read)
+        source_fd = _source_file_descriptor(file_obj)
+        # Never write into an existing file: it may be hard linked from another version by copy_file()
+        with _replace_file(target_path) as temp_path:
+            if source_fd is not None and _copy_file_in_kernel(file_obj, source_fd, temp_path, self._link_files):
+                # The content never passed through this process.  Without an md5 from the caller, it is only worked out
+                # if the manifest is read.
+                size = os.fstat(source_fd).st_size
+            else:
+                hashing_reader = shared_implementations.HashingReader(file_obj)
+                with open(temp_path, "wb") as target_file:
+                    while bytes_read := hashing_reader.read(102400):
+                        target_file.write(bytes_read)
+                size, md5 = hashing_reader.size, hashing_reader.md5
+        if self._compression is not None:
+            self._write_compressed_variants(filename, target_path, size)
+        if version_id is not abstract.DEFAULT_VERSION:
+            self._manifests.record_upload(version_id, filename, size, md5)
+
+    def _write_compressed_variants(self, filename: str, target_path: Path, size: int) -> None:
+        """
+        Write a compressed copy of a file next to it for each encoding, or remove old ones if it should not have any.
+        """
+        compress = self._compression.applies_to(filename, size)
+        for encoding in self._compression.encodings:
+            variant_path = _variant_path(target_path, encoding)
+            if compress:
+                with _replace_file(variant_path) as temp_path:
+                    with open(target_path, "rb") as source_file, open(temp_path, "wb") as variant_file:
+                        self._compression.compress_file(source_file, variant_file, encoding)
+                        compressed_size = variant_file.tell()
+                if compressed_size < size:
+                    continue
+            # A variant no smaller than the file is still correct, but not worth serving
+            variant_path.unlink(missing_ok=True)
+
+    def copy_file(
+        self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str
+    ) -> None:
+        self._check_not_symlinked(dst_version)
+        src_path = self._path_for_file(src_version, src_name)
+        dst_path = self._path_for_file(dst_version, dst_name)
+        _logger.debug("Copying file %s to %s", src_path, dst_path)
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        self._changed = True
+        _link_or_copy(src_path, dst_path)
+        if self._compression is not None:
+            for encoding in self._compression.encodings:
+                try:
+                    _link_or_copy(_variant_path(src_path, encoding), _variant_path(dst_path, encoding))
+                except FileNotFoundError:
+                    _variant_path(dst_path, encoding).unlink(missing_ok=True)
+        if dst_version is not abstract.DEFAULT_VERSION and self._manifests.get(dst_version) is not None:
+            entry = None
+            if src_version is not abstract.DEFAULT_VERSION:
+                entry = self._manifests.get_entry(src_version, src_name)
+            if entry is not None:
+                self._manifests.record_upload(dst_version, dst_name, entry.size, entry.md5)
+            else:
+                with open(dst_path, "rb") as file:
+                    size, md5 = shared_implementations.file_md5(file)
+                self._manifests.record_upload(dst_version, dst_name, size, md5)
+
+    @property
+    def supports_concurrent_upload(self) -> bool:
+        return True
+
+    @property
+    def changed_paths(self) -> Optional[set[str]]:
+        # Paths are not recorded, but a session which changed nothing (eg: describe) has nothing to invalidate
+        return None if self._changed else set()
 
     def close(self, success: bool = False) -> None:
-        if self._changed:
-            for file_name, content in shared_implementations.generate_meta_data(self._deployment_spec).items():
-                with open(self._path_for_file(..., file_name), "wb") as file:
-                    file.write(content)
-# PosixPath('/Users/philip/Documents/Development/MkdocsDeploy/private/var/folders/nb/9f9993hs2yg3gjs966_ltd8c0000gn/T/pytest-of-philip/pytest-16/test_upload0/mock_target')
-# PosixPath('/Users/philip/Documents/Development/MkdocsDeploy/private/var/folders/nb/9f9993hs2yg3gjs966_ltd8c0000gn/T/pytest-of-philip/pytest-16/test_upload0/mock_target/deployments.json')
-    def iter_files(self, version_id: str) -> Iterable[str]:
-        def _iter_files(file_path: Path):
+        if success:
+            # Every change, including starting a version to stage, sets _changed.  So sessions which only read never
+            # take the lock or create the working directory.
+            if self._changed:
+                with self._metadata_lock():
+                    self._publish_staged_versions()
+                    # Another session may have written the metadata since this one read it.  Replay this session's
+                    # changes on top of the latest so neither session's versions are lost.
+                    self._deployment_spec.rebase(self._load_deployments())
+                    manifests = self._manifests.changed_manifests()
+                    meta_data = shared_implementations.generate_meta_data(
+                        self._deployment_spec.spec,
+                        {version_id: manifest for version_id, manifest in manifests.items() if manifest is not None},
+                    )
+                    for file_name, content in meta_data.items():
+                        with _replace_file(self._path_for_file(abstract.DEFAULT_VERSION, file_name)) as temp_path:
+                            temp_path.write_bytes(content)
+                    for version_id, manifest in manifests.items():
+                        if manifest is None:
+                            self._path_for_file(abstract.DEFAULT_VERSION, manifest_filename(version_id)).unlink(
+                                missing_ok=True
+                            )
+            else:
+                _logger.debug("No changes, not writing meta")
+        else:
+            for staging_path in self._staging.values():
+                self._background_delete(staging_path)
+            self._staging.clear()
+            _logger.warning("Not saving site meta due to error. Site might be in an inconsistent state")
+
+    @property
+    def _working_path(self) -> Path:
+        """
+        Where staged versions, deleted versions and the lock are kept (see ``_working_path_for``).  Only created when
+        first needed so sessions which only read create nothing.
+        """
+        with self._working_path_lock:
+            if self._working_path_created is None:
+                self._working_path_created = _working_path_for(self._target_path)
+            return self._working_path_created
+
+    @contextlib.contextmanager
+    def _metadata_lock(self) -> Iterator[None]:
+        """
+        Hold an exclusive lock while publishing and writing metadata, so concurrent sessions take turns.
+
+        Without fcntl (Windows) this is not locked, but changes are still replayed on the latest metadata.
+        """
+        if fcntl is None:
+            yield
+            return
+        lock_path = self._working_path / "lock"
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "wb") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
             try:
-                for file in file_path.iterdir():
-                    if not file.is_symlink():
-                        if file.is_dir():
-                            yield from _iter_files(file)
-                        elif file.is_file():
-                            yield str(file.relative_to(version_path))
-            except FileNotFoundError:
-                pass
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _publish_staged_versions(self) -> None:
+        try:
+            for version_id, staging_path in list(self._staging.items()):
+                self._publish(version_id, staging_path)
+                del self._staging[version_id]
+        finally:
+            # Versions which could not be published are discarded, leaving their live version in place.
+            for staging_path in self._staging.values():
+                self._background_delete(staging_path)
+            self._staging.clear()
+
+    def _publish(self, version_id: str, staging_path: Path) -> None:
+        live_path = self._path_for_file(version_id, staged=False)
+        _logger.debug("Publishing %s to %s", staging_path, live_path)
+        if live_path.exists() or live_path.is_symlink():
+            old_path = self._trash_path()
+            os.rename(live_path, old_path)
+            try:
+                os.rename(staging_path, live_path)
+            except BaseException:
+                # Put the live version back before it can be deleted from the trash
+                os.rename(old_path, live_path)
+                raise
+            self._background_delete(old_path)
+        else:
+            live_path.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(staging_path, live_path)
+
+    def _trash_path(self) -> Path:
+        """A new path to move a directory to when it's no longer part of the site."""
+        trash_path = self._working_path / "trash"
+        trash_path.mkdir(parents=True, exist_ok=True)
+        return trash_path / uuid.uuid4().hex
+
+    def _discard(self, path: Path) -> None:
+        """Remove a directory from the site immediately, deleting its content in the background."""
+        if path.is_symlink() or not path.is_dir():
+            path.unlink(missing_ok=True)
+            return
+        trash_path = self._trash_path()
+        os.rename(path, trash_path)
+        self._background_delete(trash_path)
+
+    def _background_delete(self, path: Path) -> None:
+        """Delete a directory which is no longer part of the site without blocking the deploy.
 
+        Threads are not daemons so the process will not exit before they finish."""
+        thread = threading.Thread(target=_recursive_delete, args=(path,), name=f"delete-{path.name}")
+        thread.start()
+        self._cleanup_threads.append(thread)
+
+    def iter_files(self, version_id: abstract.Version) -> Iterable[str]:
         version_path = self._path_for_file(version_id)
+        if version_id is abstract.DEFAULT_VERSION:
+            if not version_path.is_dir():
+                return ()
+            files = (file.name for file in version_path.iterdir() if file.is_file() and not file.is_symlink())
+        elif version_path.is_symlink():
+            # A symlinked alias owns no files of its own. Its version's files are listed under the version.
+            return ()
+        else:
+            files = (file.filename for file in _scan_tree(version_path, follow_symlinks=False))
+        if self._compression is None:
+            return files
+        # Compressed variants are part of the file they were made from, not files in their own right.
+        files = set(files)
+        suffixes = tuple(
+            shared_implementations.COMPRESSED_SUFFIXES[encoding] for encoding in self._compression.encodings
+        )
+        return [
+            filename for filename in files
+            if not (filename.endswith(suffixes) and filename[:filename.rindex(".")] in files)
+        ]
+
+    def iter_file_details(self, version_id: abstract.Version) -> Iterable[abstract.FileDetails]:
+        if version_id is abstract.DEFAULT_VERSION:
+            return super().iter_file_details(version_id)
+        manifest = self.get_manifest(version_id)
+        if manifest is not None:
+            return [
+                abstract.FileDetails(filename=filename, size=entry.size, md5=entry.md5)
+                for filename, entry in manifest.files.items()
+            ]
+        result = list(super().iter_file_details(version_id))
+        self._manifests.seed(version_id, result)
+        return result
 
-        return _iter_files(version_path)
+    def get_manifest(self, version_id: str) -> Optional[versions.VersionManifest]:
+        manifest = self._manifests.get(version_id)
+        if manifest is None:
+            return None
+        # Files copied in the kernel may be recorded without an md5, so it is worked out here for the reader
+        files = dict(manifest.files)
+        unhashed = [filename for filename, entry in files.items() if entry.md5 is None]
+        if not unhashed:
+            return manifest
+        for filename in unhashed:
+            md5 = self._file_md5(self._path_for_file(version_id, filename))
+            if md5 is not None:
+                files[filename] = files[filename].copy(update={"md5": md5})
+        return manifest.copy(update={"files": files})
+
+    def _file_md5(self, path: Path) -> Optional[str]:
+        """
+        Get the md5 of a file on the target, or None if it does not exist.
+
+        Files are always replaced, never written in place, so the md5 is cached by the file's identity.
+        """
+        try:
+            with open(path, "rb") as file:
+                file_stat = os.fstat(file.fileno())
+                key = file_stat.st_dev, file_stat.st_ino, file_stat.st_mtime_ns
+                try:
+                    return self._file_md5s[key]
+                except KeyError:
+                    pass
+                _, md5 = shared_implementations.file_md5(file)
+        except FileNotFoundError:
+            return None
+        self._file_md5s[key] = md5
+        return md5
 
-    def download_file(self, version_id: Union[str, type(...)], filename: str) -> IO[bytes]:
+    def download_file(self, version_id: abstract.Version, filename: str) -> IO[bytes]:
         return open(self._path_for_file(version_id, filename), "rb")
 
-    def delete_file(self, version_id: Union[str, type(...)], filename: str) -> None:
-        file_to_delete = self._path_for_file(version_id, filename)
-        _logger.debug("unlink %s", file_to_delete)
-        file_to_delete.unlink(missing_ok=True)
+    def delete_file(self, version_id: abstract.Version, filename: str) -> None:
+        self.delete_files(version_id, (filename,))
+
+    def delete_files(self, version_id: abstract.Version, filenames: Iterable[str]) -> None:
+        self._check_not_symlinked(version_id)
+        parent_dirs = set()
+        for filename in filenames:
+            file_to_delete = self._path_for_file(version_id, filename)
+            _logger.debug("unlink %s", file_to_delete)
+            file_to_delete.unlink(missing_ok=True)
+            if self._compression is not None:
+                for encoding in self._compression.encodings:
+                    _variant_path(file_to_delete, encoding).unlink(missing_ok=True)
+            parent_dirs.add(file_to_delete.parent)
+            if version_id is not abstract.DEFAULT_VERSION:
+                self._manifests.record_delete(version_id, filename)
         self._changed = True
-        file_to_delete = file_to_delete.parent
         # Remove any empty directories this leaves
-        while file_to_delete != self._target_path:
-            if next(file_to_delete.iterdir(), None) is None:
-                _logger.debug("%s is empty, removing", file_to_delete)
-                file_to_delete.rmdir()
-                file_to_delete = file_to_delete.parent
-            else:
-                break
+        _prune_empty_dirs(parent_dirs, self._path_for_file(version_id))
 
-    def set_alias(self, alias_id: Union[str, type(...)], alias: Optional[DeploymentAlias]) -> None:
-        if alias_id is ...:
-            self._deployment_spec.default_version = alias
+    def set_alias(self, alias_id: abstract.Version, alias: Optional[DeploymentAlias]) -> None:
+        if alias_id is abstract.DEFAULT_VERSION:
+            self._deployment_spec.set_default_version(alias)
         else:
             if alias is None:
-                try:
-                    del self._deployment_spec.aliases[alias_id]
-                    _recursive_delete(self._target_path / alias_id)
-                except KeyError:
-                    pass
+                if alias_id in self._deployment_spec.spec.aliases:
+                    self._deployment_spec.set_alias(alias_id, None)
+                    self._discard(self._target_path / alias_id)
+                    self._manifests.record_delete_version(alias_id)
             else:
-                self._deployment_spec.aliases[alias_id] = alias
+                self._deployment_spec.set_alias(alias_id, alias)
         self._changed = True
 
     @property
     def available_redirect_mechanisms(self) -> dict[str, abstract.RedirectMechanism]:
-        return {}
+        return {"symlink": LocalSymlinkRedirect()}
 
     @property
     def deployment_spec(self) -> DeploymentSpec:
-        return deepcopy(self._deployment_spec)
-
-    def delete_version(self, version_id: str) -> None:
-        self._check_version_exists(version_id)
-        for alias_id, alias in self._deployment_spec.aliases.items():
-            if alias.version_id == version_id:
-                raise ValueError(f"Cannot delete a version while there are still aliases for it.  "
-                                 f"Delete alias '{alias_id}' firs for version {version_id}")
-        _recursive_delete(self._path_for_file(version_id))
-        del self._deployment_spec.versions[version_id]
+        return self._deployment_spec.snapshot()
+
+    def delete_version_or_alias(self, version_id: abstract.Version) -> None:
+        if version_id is abstract.DEFAULT_VERSION:
+            raise RuntimeError(
+                "Attempt to delete the DEFAULT_VERSION. "
+                "This must not happen: it would delete the entire site."
+            )
+        if version_id in self._staging:
+            self._background_delete(self._staging.pop(version_id))
+        self._discard(self._path_for_file(version_id))
+        self._manifests.record_delete_version(version_id)
+        self._deployment_spec.delete_version_or_alias(version_id)
         self._changed = True
 
-    def _path_for_file(self, version_id: Union[str, type(...)], filename: str = "") -> Path:
+    def _path_for_file(self, version_id: abstract.Version, filename: str = "", staged: bool = True) -> Path:
+        """
+        :param staged: If the version is being deployed in this session, give the path in its staging directory rather
+            than the path of the live version.
+        """
         if "\\" in filename:
             raise ValueError("Cannot accept filenames containing \\")
-        if version_id is ...:
+        if version_id is abstract.DEFAULT_VERSION:
             if "/" in filename:
-                raise ValueError(f"filename cannot contain '/' if version_id is ...: {filename}")
+                raise ValueError(f"filename cannot contain '/' if version_id is abstract.DEFAULT_VERSION: {filename}")
             return self._target_path / filename
-        elif version_id not in self._deployment_spec.versions and version_id not in self._deployment_spec.aliases:
+        deployment_spec = self._deployment_spec.spec
+        if version_id not in deployment_spec.versions and version_id not in deployment_spec.aliases:
             raise abstract.VersionNotFound(version_id)
-        result = Path(self._target_path, *filename.split("/"))
+        result = Path(self._target_path, version_id, *filename.split("/"))
         # Raise a ValueError if the result is above the base path
         result.relative_to(self._target_path)
+        if staged and version_id in self._staging:
+            return Path(self._staging[version_id], *filename.split("/"))
         return result
 
-    def _check_version_exists(self, version_id: Union[str, type(...)]) -> None:
-        if version_id is ...:
+    def _check_not_symlinked(self, version_id: abstract.Version) -> None:
+        """Refuse to write through a symlinked alias: the files would land in the version it points to."""
+        if version_id is not abstract.DEFAULT_VERSION and self._path_for_file(version_id).is_symlink():
+            raise ValueError(f"Cannot change files in {version_id}, it is a symlink to another version")
+
+    def _check_version_exists(self, version_id: abstract.Version) -> None:
+        if version_id is abstract.DEFAULT_VERSION:
             return
-        if version_id not in self._deployment_spec.versions:
+        if version_id not in self._deployment_spec.spec.versions:
             raise abstract.VersionNotFound(version_id)
 
 
+class LocalSymlinkRedirect(abstract.RedirectMechanism):
+    """
+    Redirects an alias by making the alias directory a relative symlink to the version directory.
+
+    The web server must be configured to follow symlinks.  Moving an alias replaces the link with a single rename so
+    readers never see a missing alias.  This cannot be combined with mechanisms which write files into the alias
+    directory such as ``html``, and cannot be used for the default version.  So it is only used when asked for by name.
+    """
+
+    @property
+    def used_by_default(self) -> bool:
+        return False
+
+    def create_redirect(self, session: LocalFileTreeTargetSession, alias: abstract.Version, version_id: str) -> None:
+        if alias is abstract.DEFAULT_VERSION:
+            raise ValueError("The symlink redirect mechanism cannot be used for the default version")
+        alias_path = session._path_for_file(alias)
+        # Link to where the version will be once published, not to its staging directory.
+        version_path = session._path_for_file(version_id, staged=False)
+        if alias_path.is_dir() and not alias_path.is_symlink():
+            if next(alias_path.iterdir(), None) is not None:
+                raise ValueError(
+                    f"Cannot symlink {alias} to {version_id}, {alias_path} contains files from another redirect "
+                    f"mechanism"
+                )
+            alias_path.rmdir()
+        alias_path.parent.mkdir(parents=True, exist_ok=True)
+        _logger.debug("Linking %s to %s", alias_path, version_path)
+        temp_path = alias_path.with_name(f".{alias_path.name}.{uuid.uuid4().hex}.tmp")
+        os.symlink(os.path.relpath(version_path, alias_path.parent), temp_path, target_is_directory=True)
+        try:
+            os.replace(temp_path, alias_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    def refresh_redirect(self, session: LocalFileTreeTargetSession, alias: abstract.Version, version_id: str) -> None:
+        # The link points at the directory, not its files, so it stays valid when the version is redeployed.
+        self.create_redirect(session, alias, version_id)
+
+    def delete_redirect(self, session: LocalFileTreeTargetSession, alias: abstract.Version) -> None:
+        if alias is abstract.DEFAULT_VERSION:
+            return
+        alias_path = session._path_for_file(alias)
+        if alias_path.is_symlink():
+            _logger.debug("Removing link %s", alias_path)
+            alias_path.unlink()
+
+
 class LocalFileTreeTarget(abstract.Target):
 
-    def __init__(self, target_path: str):
+    def __init__(
+        self,
+        target_path: str,
+        link_files: bool = False,
+        compression: Optional[shared_implementations.Compression] = None,
+    ):
+        """
+        :param target_path: A path or file:// url.  A url may set options in its query string, eg:
+            ``file:///var/www/html?link_files=true&compress=*.html,*.js&compress_encodings=gzip,br``
+        :param link_files: See ``LocalFileTreeTargetSession``.
+        :param compression: See ``LocalFileTreeTargetSession``.
+        """
         self._target_path = _path_from_url(target_path)
+        self._link_files = link_files
+        self._compression = compression
+        if "://" in target_path:
+            query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(target_path).query))
+            self._compression = shared_implementations.Compression.from_query(query) or compression
+            for key, value in query.items():
+                if key != "link_files":
+                    raise ValueError(f"Unknown option {key} in {target_path}")
+                self._link_files = value.lower() in ("1", "true", "yes")
 
     def start_session(self) -> abstract.TargetSession:
-        return LocalFileTreeTargetSession(self._target_path)
+        return LocalFileTreeTargetSession(
+            self._target_path, link_files=self._link_files, compression=self._compression
+        )
 
 
-def _recursive_delete(dir_path: Path):
-    if dir_path.is_dir() and not dir_path.is_symlink():
-        for child in dir_path.iterdir():
-            if child.is_symlink() or not child.is_dir():
-                child.unlink()
-            else:
-                _recursive_delete(child)
-        dir_path.rmdir()
-    else:
+def _working_path_for(target_path: Path) -> Path:
+    """
+    Where a session keeps staged versions, deleted versions and its lock for a target.
+
+    This is a hidden directory beside the target so it is never served or copied by tools mirroring the site.  Staged
+    versions are published by renaming, so it must be on the same file system as the target.  When it cannot be, eg:
+    the target is the root of a mounted volume, the directory is made inside the target instead.
+    """
+    working_path = target_path.with_name(f".{target_path.name}{_WORKING_DIR}")
+    try:
+        working_path.mkdir(parents=True, exist_ok=True)
+        target_device = (target_path if target_path.exists() else target_path.parent).stat().st_dev
+        if working_path.stat().st_dev == target_device:
+            return working_path
+        reason = "is on a different file system"
+    except OSError as exc:
+        reason = f"cannot be created: {exc}"
+    _logger.warning(
+        "%s %s, keeping staged and deleted files in %s instead", working_path, reason, target_path / _WORKING_DIR
+    )
+    return target_path / _WORKING_DIR
+
+
+@contextlib.contextmanager
+def _replace_file(target_path: Path) -> Iterator[Path]:
+    """
+    Give a temporary path next to target_path to write to.  When the context exits without error, the temporary file
+    atomically replaces target_path.  Readers never see a partially written file.
+    """
+    temp_path = target_path.with_name(f".{target_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp_path
+        os.replace(temp_path, target_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+class _ScannedFile(NamedTuple):
+    filename: str
+    """Path relative to the directory scanned, always separated with ``/``"""
+    size: int
+
+
+def _scan_tree(root: Path, follow_symlinks: bool) -> Iterator[_ScannedFile]:
+    """
+    List every regular file under root.
+
+    Uses ``os.scandir`` so the type of each entry comes from the directory listing rather than a stat call per file.
+    Subdirectories are listed concurrently.  A missing root is treated as empty.
+    :param follow_symlinks: If False, symlinks are skipped entirely.  If True they are treated as what they point to.
+    """
+    executor = ThreadPoolExecutor(max_workers=_SCAN_CONCURRENCY, thread_name_prefix="mkdocs-deploy-scan")
+    try:
+        pending: deque[Future] = deque([executor.submit(_scan_dir, str(root), "", follow_symlinks)])
+        while pending:
+            files, sub_dirs = pending.popleft().result()
+            for dir_path, prefix in sub_dirs:
+                pending.append(executor.submit(_scan_dir, dir_path, prefix, follow_symlinks))
+            yield from files
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _scan_dir(dir_path: str, prefix: str, follow_symlinks: bool) -> tuple[list[_ScannedFile], list[tuple[str, str]]]:
+    """
+    List a single directory for ``_scan_tree``.
+
+    :return: The files in the directory and a list of (path, prefix) for each subdirectory
+    """
+    files = []
+    sub_dirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    sub_dirs.append((entry.path, f"{prefix}{entry.name}/"))
+                elif entry.is_file(follow_symlinks=follow_symlinks):
+                    files.append(_ScannedFile(prefix + entry.name, entry.stat(follow_symlinks=follow_symlinks).st_size))
+    except FileNotFoundError:
+        pass
+    return files, sub_dirs
+
+
+def _variant_path(file_path: Path, encoding: str) -> Path:
+    """The path of the compressed variant of a file"""
+    return file_path.with_name(file_path.name + shared_implementations.COMPRESSED_SUFFIXES[encoding])
+
+
+def _link_or_copy(src_path: Path, dst_path: Path) -> None:
+    """
+    Hard link src_path to dst_path, replacing dst_path, or copy it if the file system does not support hard links.
+
+    :raises FileNotFoundError: If src_path does not exist
+    """
+    with _replace_file(dst_path) as temp_path:
         try:
-            dir_path.unlink()
+            os.link(src_path, temp_path)
         except FileNotFoundError:
-            pass
+            raise
+        except OSError as exc:
+            # Eg: the file system does not support hard links.  copyfile uses copy_file_range / sendfile if it can.
+            _logger.debug("Cannot link %s, copying instead: %s", src_path, str(exc))
+            shutil.copyfile(src_path, temp_path)
+
+
+def _source_file_descriptor(file_obj: IO[bytes]) -> Optional[int]:
+    """
+    Find the OS file descriptor behind a file handle if it is a regular file which has not yet been read from.
+
+    :return: The file descriptor or None if file_obj is not a plain file (eg: an archive member or in memory)
+    """
+    try:
+        if file_obj.tell() != 0:
+            return None
+        source_fd = file_obj.fileno()
+    except (AttributeError, OSError):
+        # io.UnsupportedOperation is an OSError
+        return None
+    if not stat.S_ISREG(os.fstat(source_fd).st_mode):
+        return None
+    return source_fd
+
+
+def _copy_file_in_kernel(file_obj: IO[bytes], source_fd: int, target_path: Path, link_files: bool) -> bool:
+    """
+    Write a new file at target_path with the content of source_fd without reading it into this process.
+
+    A hard link is tried first if link_files is set, then a reflink (sharing blocks copy-on-write), then
+    ``os.copy_file_range`` which lets the kernel copy the data.  None of these move the position of file_obj.
+    :return: True if target_path was written, False if the caller must copy the file itself.
+    """
+    if link_files:
+        source_name = getattr(file_obj, "name", None)
+        if isinstance(source_name, str):
+            try:
+                if os.path.samestat(os.stat(source_name), os.fstat(source_fd)):
+                    os.link(source_name, target_path)
+                    return True
+            except OSError as exc:
+                _logger.debug("Cannot link %s: %s", source_name, str(exc))
+    with open(target_path, "wb") as target_file:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(target_file.fileno(), _FICLONE, source_fd)
+                return True
+            except OSError:
+                # Eg: not Linux, not the same file system, or the file system does not support reflinks
+                pass
+        if not hasattr(os, "copy_file_range"):
+            return False
+        offset = 0
+        try:
+            while copied := os.copy_file_range(source_fd, target_file.fileno(), 1 << 30, offset, offset):
+                offset += copied
+        except OSError as exc:
+            _logger.debug("Cannot copy_file_range, copying instead: %s", str(exc))
+            target_file.truncate(0)
+            return False
+    return True
+
+
+def _link_tree(source_path: Path, destination_path: Path) -> None:
+    """
+    Populate destination_path with hard links to every file in source_path.  Falls back to copying if the file system
+    does not support hard links.  Files are only ever replaced, never written in place, so sharing them is safe.
+    """
+    for dir_path, _, file_names in os.walk(source_path):
+        relative_path = Path(dir_path).relative_to(source_path)
+        (destination_path / relative_path).mkdir(parents=True, exist_ok=True)
+        for file_name in file_names:
+            try:
+                os.link(Path(dir_path, file_name), destination_path / relative_path / file_name)
+            except OSError as exc:
+                _logger.debug("Cannot link %s, copying instead: %s", file_name, str(exc))
+                shutil.copy2(Path(dir_path, file_name), destination_path / relative_path / file_name)
+
+
+def _prune_empty_dirs(dir_paths: Iterable[Path], stop_at: Path) -> None:
+    """
+    Remove any of dir_paths left empty, and their parents if that leaves them empty, up to but not including stop_at.
+
+    Directories are visited deepest first, so each is tried at most once however many files were deleted from it.
+    Emptiness is discovered by ``rmdir`` failing rather than listing the directory.
+    """
+    heap = [(-len(dir_path.parts), dir_path) for dir_path in set(dir_paths)]
+    heapq.heapify(heap)
+    visited = set()
+    while heap:
+        _, dir_path = heapq.heappop(heap)
+        if dir_path in visited or stop_at not in dir_path.parents:
+            continue
+        visited.add(dir_path)
+        try:
+            dir_path.rmdir()
+        except OSError:
+            # Not empty, or already gone
+            continue
+        _logger.debug("%s is empty, removed", dir_path)
+        heapq.heappush(heap, (-len(dir_path.parent.parts), dir_path.parent))
+
+
+def _recursive_delete(dir_path: Path) -> None:
+    """
+    Delete a directory and everything in it, never following symlinks.
+
+    Subdirectories are emptied concurrently, then every directory is removed deepest first.
+    """
+    if dir_path.is_symlink() or not dir_path.is_dir():
+        dir_path.unlink(missing_ok=True)
+        return
+    all_dirs = [str(dir_path)]
+    with ThreadPoolExecutor(max_workers=_SCAN_CONCURRENCY, thread_name_prefix="mkdocs-deploy-delete") as executor:
+        pending: deque[Future] = deque([executor.submit(_delete_dir_files, str(dir_path))])
+        while pending:
+            sub_dirs = pending.popleft().result()
+            all_dirs.extend(sub_dirs)
+            pending.extend(executor.submit(_delete_dir_files, sub_dir) for sub_dir in sub_dirs)
+    # Directories were found breadth first, so every directory comes after its parent
+    for dir_to_remove in reversed(all_dirs):
+        os.rmdir(dir_to_remove)
+
+
+def _delete_dir_files(dir_path: str) -> list[str]:
+    """
+    Unlink everything in a directory which is not a directory, for ``_recursive_delete``.
+
+    :return: The paths of the subdirectories
+    """
+    sub_dirs = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            else:
+                os.unlink(entry.path)
+    return sub_dirs
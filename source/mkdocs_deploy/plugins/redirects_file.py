@@ -0,0 +1,93 @@
+from io import BytesIO
+from typing import Optional
+from urllib.parse import quote
+
+from ..abstract import DEFAULT_VERSION, RedirectMechanism, TargetSession, Version, register_shared_redirect_mechanism
+
+REDIRECTS_FILENAME = "_redirects"
+
+
+def enable_plugin() -> None:
+    """Enables the plugin.
+
+    Registers the redirects_file redirect mechanism"""
+    register_shared_redirect_mechanism("redirects_file", RedirectsFile("redirects_file"))
+
+
+class RedirectsFile(RedirectMechanism):
+    """
+    Redirects every alias with one ``_redirects`` file in the root of the site.
+
+    This is the format understood by Netlify and Cloudflare Pages.  The whole file is regenerated from the deployment
+    spec whenever an alias changes, so creating, moving or refreshing an alias costs one upload however many pages the
+    version has.  Only some hosts read the file, so it is only used when asked for by name.
+    """
+
+    def __init__(self, mechanism_key: str):
+        """
+        :param mechanism_key: The key this mechanism is registered under.  Only aliases using this key are written.
+        """
+        self._mechanism_key = mechanism_key
+
+    @property
+    def used_by_default(self) -> bool:
+        return False
+
+    def create_redirect(self, session: TargetSession, alias: Version, version_id: str) -> None:
+        self._write_redirects(session, alias, version_id)
+
+    def refresh_redirect(self, session: TargetSession, alias: Version, version_id: str) -> None:
+        # Redirects are not per file so never need to be deleted first.
+        self._write_redirects(session, alias, version_id)
+
+    def delete_redirect(self, session: TargetSession, alias: Version) -> None:
+        self._write_redirects(session, alias, None)
+
+    def _write_redirects(self, session: TargetSession, changed_alias: Version, version_id: Optional[str]) -> None:
+        """
+        Regenerate the file.
+
+        Actions call the mechanism before updating the alias in the deployment spec, so the alias being changed is
+        passed explicitly and overrides whatever the spec says.
+        """
+        deployment_spec = session.deployment_spec
+        redirects: dict[Version, str] = {
+            alias_id: alias.version_id
+            for alias_id, alias in deployment_spec.aliases.items()
+            if self._mechanism_key in alias.redirect_mechanisms
+        }
+        default_version = deployment_spec.default_version
+        if default_version is not None and self._mechanism_key in default_version.redirect_mechanisms:
+            redirects[DEFAULT_VERSION] = default_version.version_id
+        if version_id is None:
+            redirects.pop(changed_alias, None)
+        else:
+            redirects[changed_alias] = version_id
+
+        if redirects:
+            session.upload_file(
+                version_id=DEFAULT_VERSION,
+                filename=REDIRECTS_FILENAME,
+                file_obj=BytesIO(render_redirects(redirects).encode("utf-8")),
+            )
+        elif REDIRECTS_FILENAME in session.iter_files(DEFAULT_VERSION):
+            session.delete_file(version_id=DEFAULT_VERSION, filename=REDIRECTS_FILENAME)
+
+
+def render_redirects(redirects: dict[Version, str]) -> str:
+    """
+    Render redirects in ``_redirects`` format.
+
+    :param redirects: Dictionary of alias to version_id.  DEFAULT_VERSION redirects the root of the site.
+    :return: The content of the ``_redirects`` file
+    """
+    lines = ["# Generated by mkdocs-deploy. Any changes will be overwritten when an alias changes."]
+    for alias_id, version_id in sorted(redirects.items(), key=lambda item: (item[0] is not DEFAULT_VERSION, item[0])):
+        version_path = "/" + quote(version_id)
+        if alias_id is DEFAULT_VERSION:
+            lines.append(f"/  {version_path}/  302")
+        else:
+            alias_path = "/" + quote(alias_id)
+            lines.append(f"{alias_path}  {version_path}/  302")
+            lines.append(f"{alias_path}/*  {version_path}/:splat  302")
+    return "\n".join(lines) + "\n"
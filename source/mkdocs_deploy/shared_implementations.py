@@ -1,10 +1,23 @@
-import contextlib
+import fnmatch
+import gzip
+import hashlib
+import io
 import logging
+import mimetypes
 import os
+import threading
+from collections import Counter
 from tempfile import SpooledTemporaryFile
-from typing import IO
+from typing import Callable, IO, Iterable, Iterator, Mapping, Optional
 from urllib.parse import quote
-from .versions import DEPLOYMENTS_FILENAME, DeploymentSpec, MIKE_VERSIONS_FILENAME
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .versions import (DEPLOYMENTS_FILENAME, DeploymentAlias, DeploymentSpec, DeploymentVersion, MIKE_VERSIONS_FILENAME,
+                       ManifestEntry, VersionManifest, manifest_filename)
 
 _logger = logging.getLogger(__name__)
 
@@ -57,64 +70,490 @@ def relative_link(
     return relative + target_version + url
 
 
-def generate_meta_data(deployment_spec: DeploymentSpec) -> dict[str, bytes]:
+def generate_meta_data(
+    deployment_spec: DeploymentSpec, manifests: Mapping[str, VersionManifest] | None = None
+) -> dict[str, bytes]:
     """
     Generate metadata files to write at the root of a site.
 
     This just creates a dict with the filenames and content to write to them as bytes.
-    At present this is just deployments.json and versions.json.  More may be added in the future.
+    At present this is just deployments.json, versions.json, and a manifest for each version passed.  More may be added
+    in the future.
     :param deployment_spec: The deployment spec to covert to files.
+    :param manifests: Manifests to write, keyed by version_id.  Typically only those which changed.
     :return: A dictionary with filenames as keys and the bytes to write to them
     """
-    return {
+    result = {
         DEPLOYMENTS_FILENAME: deployment_spec.json().encode("utf-8"),
         MIKE_VERSIONS_FILENAME: deployment_spec.mike_versions().json().encode("utf-8"),
     }
+    if manifests is not None:
+        for version_id, manifest in manifests.items():
+            result[manifest_filename(version_id)] = manifest.json().encode("utf-8")
+    return result
 
 
-class SeekableFileWrapper(contextlib.closing):
+def file_md5(file_obj: IO[bytes]) -> tuple[int, str]:
     """
-    Acts as a wrapper on IO[bytes] which should always be seekable.
+    Read a file to the end, measuring its size and md5.
 
-    This is particularly useful when trying to take an IO[bytes] from an unknown source and send it to target that needs
-    to be seekable.  The source might be a local file, or might be downloaded over HTTP and thus be a non-seekable
-    stream, but when the source opens the file it's unclear what will be done with it and if it needs to take special
-    action to make it seekable.  So this wrapper can be used in a position in code where you NEED a seekable
-    ``IO[bytes]`` but are unsure if you have one or not.
+    :param file_obj: The file to read.  This is read from its current position and is not closed.
+    :return: A tuple of the number of bytes read and the hex md5 digest of those bytes
+    """
+    md5 = hashlib.md5(usedforsecurity=False)
+    size = 0
+    while bytes_read := file_obj.read(102400):
+        md5.update(bytes_read)
+        size += len(bytes_read)
+    return size, md5.hexdigest()
 
-    This wrapper first tries to ``file.seek(file.tell(), os.SEEK_SET)``. This should have no effect on files which are
-    seekable, but will raise an error if they are not seekable, for example if they are a stream.  Non-seekable files
-    are then immediately read entirely into memory or a temporary file (if greater than 100KiB).
 
-    Calling code is responsible for closing the wrapped file **after** it has closed this SeekableFileWrapper.
+class HashingReader:
+    """
+    Wraps a readable file, measuring the size and md5 of everything read through it.
 
-    Calling code should not make any assumptions about which operations such as read() or seek() will directly reach the
-    wrapped file.  This the tell()
+    This deliberately does not offer ``seek()`` so that code reading from it treats it as a stream and reads it exactly
+    once.  The wrapped file is not closed.
     """
 
     def __init__(self, file_to_wrap: IO[bytes]):
+        self._file = file_to_wrap
+        self._md5 = hashlib.md5(usedforsecurity=False)
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        result = self._file.read(size)
+        self._md5.update(result)
+        self.size += len(result)
+        return result
+
+    def readable(self) -> bool:
+        return True
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+
+def read_into_buffer(file_obj: IO[bytes]) -> tuple[IO[bytes], int, str]:
+    """
+    Read a file which can only be read once into a buffer, measuring its size and md5 as it goes.
+
+    :param file_obj: The file to read.  It is closed once read unless it is already in memory, in which case it is
+        returned as the buffer.
+    :return: A tuple of the buffer positioned at the start, the number of bytes and the hex md5 digest.  Small files are
+        buffered in memory, larger ones in a temporary file.
+    """
+    if isinstance(file_obj, io.BytesIO):
+        # Already in memory, no need to copy it
+        with file_obj.getbuffer() as content:
+            return file_obj, content.nbytes, hashlib.md5(content, usedforsecurity=False).hexdigest()
+    buffer = SpooledTemporaryFile(max_size=_BUFFER_MAX_MEMORY)
+    md5 = hashlib.md5(usedforsecurity=False)
+    size = 0
+    try:
+        with file_obj:
+            while bytes_read := file_obj.read(102400):
+                md5.update(bytes_read)
+                size += len(bytes_read)
+                buffer.write(bytes_read)
+        buffer.seek(0)
+    except:
+        buffer.close()
+        raise
+    return buffer, size, md5.hexdigest()  # type: ignore
+
+
+_BUFFER_MAX_MEMORY = 1024 * 1024
+
+
+def remaining_size(file_obj: IO[bytes]) -> Optional[int]:
+    """
+    Find how many bytes are left to read from a file without reading it.
+
+    :return: The number of bytes or None if the file is not seekable
+    """
+    if isinstance(file_obj, io.BytesIO):
+        with file_obj.getbuffer() as content:
+            return content.nbytes - file_obj.tell()
+    try:
+        if not file_obj.seekable():
+            return None
+        position = file_obj.tell()
+        end = file_obj.seek(0, os.SEEK_END)
+        file_obj.seek(position, os.SEEK_SET)
+        return end - position
+    except (AttributeError, OSError):
+        return None
+
+
+class ManifestTracker:
+    """
+    Keeps the manifest of each version up to date through a target session.
+
+    Manifests are loaded lazily, at most once per version.  A version with no manifest on the target (eg: one deployed
+    by an older release) is "unknown" and operations on it are not recorded until the version is either started from
+    empty or seeded from a complete listing with ``seed()``.  This avoids ever writing a manifest which misses files.
+
+    All methods are thread safe so uploads may be recorded concurrently.
+    """
+
+    def __init__(self, load_manifest: Callable[[str], Optional[bytes]]):
+        """
+        :param load_manifest: Function to read the raw manifest file for a version or return None if there isn't one.
         """
-        :param file_to_wrap: The underlying file to wrap.
+        self._load_manifest = load_manifest
+        self._manifests: dict[str, Optional[VersionManifest]] = {}
+        self._changed: set[str] = set()
+        self._lock = threading.Lock()
+
+    def get(self, version_id: str) -> Optional[VersionManifest]:
+        """
+        Get the manifest for a version.
+
+        :return: The manifest or None if it is not known.  The returned manifest MUST NOT be modified.
         """
-        self.__exit_stack = contextlib.ExitStack()
-        super().__init__(self)
+        with self._lock:
+            return self._get(version_id)
+
+    def _get(self, version_id: str) -> Optional[VersionManifest]:
         try:
-            file_to_wrap.seek(file_to_wrap.tell(), os.SEEK_SET)
-        except Exception as exc:
-            # I think catching Exception is appropriate due to the unpredictable nature of the exception we may get
-            _logger.debug("File not seekable caching.  Due to: %s", str(exc))
-            position = file_to_wrap.tell()
-            seekable = self.__exit_stack.enter_context(SpooledTemporaryFile(max_size=102400))
-            seekable.seek(position, os.SEEK_SET)
-            while bytes_read := file_to_wrap.read(102400):
-                seekable.write(bytes_read)
-            seekable.seek(0, os.SEEK_SET)
-            self.__wrapped_file = seekable
+            return self._manifests[version_id]
+        except KeyError:
+            pass
+        content = self._load_manifest(version_id)
+        manifest = VersionManifest.parse_raw(content) if content is not None else None
+        self._manifests[version_id] = manifest
+        return manifest
+
+    def start_version(self, version_id: str, keep_existing_files: bool) -> None:
+        """
+        Record a version being started.  If existing files are not kept, the version is known to be empty.
+        """
+        if not keep_existing_files:
+            with self._lock:
+                self._manifests[version_id] = VersionManifest()
+                self._changed.add(version_id)
+
+    def seed(self, version_id: str, files: Iterable[tuple[str, int, Optional[str]]]) -> None:
+        """
+        Build the manifest for an unknown version from a complete listing of its files.
+
+        :param version_id: The version the files are in.
+        :param files: Every file in the version as tuples of (filename, size, md5).  md5 may be None if not known.
+        """
+        with self._lock:
+            if self._get(version_id) is None:
+                self._manifests[version_id] = VersionManifest(files={
+                    filename: ManifestEntry(size=size, md5=md5, content_type=mimetypes.guess_type(filename)[0])
+                    for filename, size, md5 in files
+                })
+                self._changed.add(version_id)
+
+    def get_entry(self, version_id: str, filename: str) -> Optional[ManifestEntry]:
+        """
+        Get the manifest entry for a single file or None if the version's manifest is not known or has no such file.
+        """
+        manifest = self.get(version_id)
+        if manifest is None:
+            return None
+        return manifest.files.get(filename)
+
+    def record_upload(self, version_id: str, filename: str, size: int, md5: Optional[str]) -> None:
+        with self._lock:
+            manifest = self._get(version_id)
+            if manifest is not None:
+                manifest.files[filename] = ManifestEntry(
+                    size=size,
+                    md5=md5,
+                    content_type=mimetypes.guess_type(filename)[0],
+                )
+                self._changed.add(version_id)
+
+    def record_delete(self, version_id: str, filename: str) -> None:
+        with self._lock:
+            manifest = self._get(version_id)
+            if manifest is not None and manifest.files.pop(filename, None) is not None:
+                self._changed.add(version_id)
+
+    def record_delete_version(self, version_id: str) -> None:
+        """
+        Record a whole version (or alias) being deleted, so its manifest must also be deleted.
+        """
+        with self._lock:
+            self._manifests[version_id] = None
+            self._changed.add(version_id)
+
+    def changed_manifests(self) -> dict[str, Optional[VersionManifest]]:
+        """
+        All manifests which need to be written when the session closes.  None indicates the manifest must be deleted.
+        """
+        with self._lock:
+            return {version_id: self._manifests[version_id] for version_id in self._changed}
+
+
+class DeploymentSpecJournal:
+    """
+    Holds a session's deployment spec, recording every change so the changes can be replayed with ``rebase()`` on top
+    of a newer spec written by another session in the meantime.  This lets sessions deploying different versions to
+    the same site run concurrently without either losing the other's changes.
+
+    Sessions must only change the spec through this class.
+    """
+
+    def __init__(self, spec: DeploymentSpec):
+        self._spec = spec
+        self._changes: list[Callable[[DeploymentSpec], None]] = []
+        self._snapshot: Optional[DeploymentSpec] = None
+
+    @property
+    def spec(self) -> DeploymentSpec:
+        """
+        The spec with all changes applied.  This MUST NOT be modified directly.
+        """
+        return self._spec
+
+    def snapshot(self) -> DeploymentSpec:
+        """
+        A read only copy of the spec, shared by every caller until the next change.  See ``DeploymentSpec.snapshot``.
+        """
+        if self._snapshot is None:
+            self._snapshot = self._spec.snapshot()
+        return self._snapshot
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._changes)
+
+    def set_version(self, version_id: str, title: str) -> None:
+        """
+        Add a version or change the title of an existing one.
+        """
+        def change(spec: DeploymentSpec) -> None:
+            if version_id in spec.versions:
+                # Keep any other meta already on the version
+                spec.versions[version_id].title = title
+            else:
+                spec.versions[version_id] = DeploymentVersion(title=title)
+        self._apply(change)
+
+    def delete_version_or_alias(self, version_id: str) -> None:
+        def change(spec: DeploymentSpec) -> None:
+            spec.versions.pop(version_id, None)
+            spec.aliases.pop(version_id, None)
+        self._apply(change)
+
+    def set_alias(self, alias_id: str, alias: Optional[DeploymentAlias]) -> None:
+        """
+        Replace an alias, or delete it if alias is None.
+        """
+        alias = alias.copy(deep=True) if alias is not None else None
+
+        def change(spec: DeploymentSpec) -> None:
+            if alias is None:
+                spec.aliases.pop(alias_id, None)
+            else:
+                spec.aliases[alias_id] = alias.copy(deep=True)
+        self._apply(change)
+
+    def set_default_version(self, alias: Optional[DeploymentAlias]) -> None:
+        alias = alias.copy(deep=True) if alias is not None else None
+
+        def change(spec: DeploymentSpec) -> None:
+            spec.default_version = alias.copy(deep=True) if alias is not None else None
+        self._apply(change)
+
+    def rebase(self, latest: DeploymentSpec) -> None:
+        """
+        Replace the spec with a newer one, replaying every change made so far on top of it.
+        """
+        for change in self._changes:
+            change(latest)
+        self._spec = latest
+        self._snapshot = None
+
+    def _apply(self, change: Callable[[DeploymentSpec], None]) -> None:
+        change(self._spec)
+        self._changes.append(change)
+        self._snapshot = None
+
+
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+"""Supported content encodings and the suffix conventionally given to files pre-compressed with them"""
+
+
+class Compression:
+    """
+    Which files a target should store pre-compressed, and with which encodings.
+
+    Files are selected by glob pattern (``fnmatch``) on their filename within the version.  Files smaller than
+    ``min_size`` are not compressed since headers and framing would eat most of the saving.
+    """
+
+    def __init__(self, patterns: Iterable[str], encodings: Iterable[str] = ("gzip",), min_size: int = 1024):
+        self.patterns = tuple(patterns)
+        self.encodings = tuple(encodings)
+        self.min_size = min_size
+        for encoding in self.encodings:
+            if encoding not in COMPRESSED_SUFFIXES:
+                raise ValueError(f"Unsupported compression encoding {encoding}, expected one of "
+                                 f"{', '.join(COMPRESSED_SUFFIXES)}")
+            if encoding == "br" and brotli is None:
+                raise ValueError("Brotli compression requires the brotli package: pip install mkdocs-deploy[brotli]")
+
+    @classmethod
+    def from_query(cls, query: dict[str, str]) -> Optional["Compression"]:
+        """
+        Read compression settings from url query parameters, removing them from the dict.
+
+        ``compress`` is a comma separated list of patterns, eg: ``*.html,*.js``.  ``compress_encodings`` is a comma
+        separated list of encodings, default ``gzip``.
+        :return: The settings, or None if compress was not set.
+        """
+        patterns = query.pop("compress", None)
+        encodings = query.pop("compress_encodings", None)
+        if patterns is None:
+            if encodings is not None:
+                raise ValueError("compress_encodings may only be set with compress")
+            return None
+        if encodings is None:
+            return cls(patterns.split(","))
+        return cls(patterns.split(","), encodings.split(","))
+
+    def applies_to(self, filename: str, size: Optional[int] = None) -> bool:
+        """
+        :param size: The size of the file or None if it is not known.
+        """
+        if size is not None and size < self.min_size:
+            return False
+        return any(fnmatch.fnmatchcase(filename, pattern) for pattern in self.patterns)
+
+    @staticmethod
+    def compress_file(source: IO[bytes], destination: IO[bytes], encoding: str) -> None:
+        """
+        Compress at the highest level: files are compressed once but served many times.
+
+        Output is deterministic so unchanged content always gives the same bytes.  The file is compressed a chunk at a
+        time so large files are never held in memory.
+
+        :param source: Read from its current position to the end.  Not closed.
+        :param destination: Written from its current position.  Not closed.
+        """
+        if encoding == "gzip":
+            with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=destination, mtime=0) as gzip_file:
+                while chunk := source.read(_COMPRESS_CHUNK_SIZE):
+                    gzip_file.write(chunk)
+        elif encoding == "br":
+            compressor = brotli.Compressor()
+            while chunk := source.read(_COMPRESS_CHUNK_SIZE):
+                destination.write(compressor.process(chunk))
+            destination.write(compressor.finish())
+        else:
+            raise ValueError(f"Unsupported compression encoding {encoding}")
+
+
+_COMPRESS_CHUNK_SIZE = 1024 * 1024
+
+
+class CachePolicy:
+    """
+    Cache-Control headers for targets which can store them with each file.
+
+    Files are matched by glob pattern (``fnmatch``) on their filename within the version.  The first matching pattern
+    wins so more specific patterns should be listed first.
+    """
+
+    def __init__(self, cache_control: Mapping[str, str] = {}, redirect_cache_control: Optional[str] = None):
+        """
+        :param cache_control: Cache-Control header values by filename pattern, eg: ``{"*.html": "max-age=300"}``.
+        :param redirect_cache_control: Cache-Control for redirects and the site's version lists.  These change whenever
+            an alias is moved, regardless of the patterns.
+        """
+        self.cache_control = dict(cache_control)
+        self.redirect_cache_control = redirect_cache_control
+
+    def cache_control_for(self, filename: str, redirect: bool = False) -> Optional[str]:
+        """
+        :param redirect: True if the file is a redirect or version list rather than part of a version.
+        :return: The Cache-Control header value for the file or None if it should not have one.
+        """
+        if redirect:
+            return self.redirect_cache_control
+        for pattern, cache_control in self.cache_control.items():
+            if fnmatch.fnmatchcase(filename, pattern):
+                return cache_control
+        return None
+
+
+def invalidation_paths(paths: Iterable[str], max_paths: int = 3000, max_wildcards: int = 15) -> list[str]:
+    """
+    Collapse changed paths into few enough for one CDN invalidation, invalidating as little else as possible.
+
+    Whole directories are invalidated with a wildcard, eg: ``1.0/*``, only when there are too many paths.  Each time the
+    deepest directory which brings the count within the limits is chosen.  If no one directory can, the directory
+    covering the most paths is chosen and the process repeats.  The defaults are CloudFront's limits.
+
+    :param paths: Changed paths relative to the site root.  Paths ending ``*`` are already wildcards.
+    :return: Sorted paths.  Index pages are included with their directory since both urls serve them.  ``["*"]`` if
+        everything should be invalidated.
+    """
+    files: set[str] = set()
+    wildcards: set[str] = set()
+    for path in paths:
+        if path.endswith("*"):
+            wildcards.add(path[:-1])
+        else:
+            files.add(path)
+            if is_index_file(path):
+                files.add(path[:path.rindex("/") + 1] if "/" in path else "")
+    if "" in wildcards:
+        return ["*"]
+    for wildcard in list(wildcards):
+        _add_wildcard(wildcard, files, wildcards)
+
+    while len(files) + len(wildcards) > max_paths or len(wildcards) > max_wildcards:
+        excess_paths = len(files) + len(wildcards) - max_paths
+        excess_wildcards = len(wildcards) - max_wildcards
+        covered_files = Counter(directory for path in files for directory in _parent_directories(path))
+        covered_wildcards = Counter(directory for path in wildcards for directory in _parent_directories(path))
+        candidates = set(covered_files) | set(covered_wildcards)
+        sufficient = [
+            directory for directory in candidates
+            if covered_files[directory] + covered_wildcards[directory] - 1 >= excess_paths
+            and covered_wildcards[directory] - 1 >= excess_wildcards
+        ]
+        if sufficient:
+            directory = max(
+                sufficient,
+                key=lambda d: (d.count("/"), -covered_files[d] - covered_wildcards[d]),
+            )
+        elif excess_wildcards > 0:
+            directory = max(candidates, key=lambda d: (covered_wildcards[d], d.count("/")), default=None)
+            if directory is not None and covered_wildcards[directory] < 2:
+                directory = None
         else:
-            self.__wrapped_file = file_to_wrap
+            directory = max(
+                candidates, key=lambda d: (covered_files[d] + covered_wildcards[d], d.count("/")), default=None
+            )
+        if directory is None:
+            return ["*"]
+        _add_wildcard(directory, files, wildcards)
+    return sorted([*files, *(wildcard + "*" for wildcard in wildcards)])
+
+
+def _parent_directories(path: str) -> Iterator[str]:
+    """Directories containing path excluding the site root, eg: ``a/b/c`` gives ``a/b/`` and ``a/``"""
+    index = path.rfind("/", 0, len(path) - 1)
+    while index > 0:
+        yield path[:index + 1]
+        index = path.rfind("/", 0, index)
+
 
-    def __getattr__(self, item: str):
-        return self.__wrapped_file.__getattribute__(item)
+def _add_wildcard(directory: str, files: set[str], wildcards: set[str]) -> None:
+    """Add a wildcard for directory removing any paths it covers"""
+    if any(directory.startswith(wildcard) for wildcard in wildcards if wildcard != directory):
+        return
+    files.difference_update([path for path in files if path.startswith(directory)])
+    wildcards.difference_update([wildcard for wildcard in wildcards if wildcard.startswith(directory)])
+    wildcards.add(directory)
 
-    def close(self) -> None:
-        self.__exit_stack.close()
@@ -1,8 +1,10 @@
+import copy
 import pydantic
 from typing import Iterable, Optional
 
 DEPLOYMENTS_FILENAME = 'deployments.json'
 MIKE_VERSIONS_FILENAME = 'versions.json'
+MANIFEST_FILENAME_PATTERN = 'manifest-{version_id}.json'
 
 
 # [{"version": "2.1", "title": "2.1", "aliases": []}, {"version": "2.0", "title": "2.0", "aliases": ["latest"]}]
@@ -38,11 +40,66 @@ class DeploymentAlias(pydantic.BaseModel):
     redirect_mechanisms: set[str]
 
 
+class _ReadOnlyDict(dict):
+    """
+    A dict which cannot be modified.  Copies of it are ordinary dicts.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("A deployment spec snapshot is read only, modify a copy of it instead")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo: dict) -> dict:
+        return copy.deepcopy(dict(self), memo)
+
+
 class DeploymentSpec(pydantic.BaseModel):
     default_version: Optional[DeploymentAlias] = None
     versions: dict[str, DeploymentVersion] = {}
     aliases: dict[str, DeploymentAlias] = {}
 
+    _aliases_by_version: Optional[dict[str, tuple[str, ...]]] = pydantic.PrivateAttr(None)
+
+    def snapshot(self) -> "DeploymentSpec":
+        """
+        Make a deep copy to hand out as a read only view of this spec.
+
+        The copy indexes aliases by version so ``aliases_for_version`` does not scan every alias.  So that the index
+        cannot go stale, setting its fields or adding and removing versions or aliases raises TypeError.  Copies of it
+        (``.copy()``) may be modified as usual.
+        """
+        result = self.copy(deep=True)
+        result.versions = _ReadOnlyDict(result.versions)
+        result.aliases = _ReadOnlyDict(result.aliases)
+        aliases_by_version: dict[str, list[str]] = {}
+        for alias_id, alias in result.aliases.items():
+            if alias is not None:
+                aliases_by_version.setdefault(alias.version_id, []).append(alias_id)
+        result._aliases_by_version = {
+            version_id: tuple(alias_ids) for version_id, alias_ids in aliases_by_version.items()
+        }
+        return result
+
+    def copy(self, **kwargs) -> "DeploymentSpec":
+        """
+        Copy the spec as pydantic does.  Copies of a snapshot can be modified so do not keep its index.
+        """
+        result = super().copy(**kwargs)
+        if result._aliases_by_version is not None:
+            result._aliases_by_version = None
+            result.versions = dict(result.versions)
+            result.aliases = dict(result.aliases)
+        return result
+
+    def __setattr__(self, name, value):
+        if name in self.__fields__ and self._aliases_by_version is not None:
+            raise TypeError("A deployment spec snapshot is read only, modify a copy of it instead")
+        super().__setattr__(name, value)
+
     def mike_versions(self) -> MikeVersions:
         versions = {
             version_id: MikeVersion(version=version_id, title=version.title)
@@ -59,6 +116,31 @@ class DeploymentSpec(pydantic.BaseModel):
         :param version_id: the version to search for
         :return: An iterable of alias_ids for the given version
         """
+        if self._aliases_by_version is not None:
+            return self._aliases_by_version.get(version_id, ())
+        return self._scan_aliases_for_version(version_id)
+
+    def _scan_aliases_for_version(self, version_id: str) -> Iterable[str]:
         for alias_id, alias in self.aliases.items():
             if alias.version_id == version_id:
                 yield alias_id
+
+
+class ManifestEntry(pydantic.BaseModel):
+    size: int
+    md5: Optional[str] = None
+    content_type: Optional[str] = None
+
+
+class VersionManifest(pydantic.BaseModel):
+    """
+    Every file in a version (or alias) with enough detail to tell if it has changed, without listing or downloading it.
+    """
+    files: dict[str, ManifestEntry] = {}
+
+
+def manifest_filename(version_id: str) -> str:
+    """
+    The filename (in the root of the site) of the manifest for a version.
+    """
+    return MANIFEST_FILENAME_PATTERN.format(version_id=version_id)
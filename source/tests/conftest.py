@@ -2,7 +2,7 @@ import uuid
 
 import pytest
 
-from mkdocs_deploy import abstract
+from mkdocs_deploy import abstract, async_abstract
 from .mock_plugin import MockTargetSession
 
 
@@ -11,7 +11,9 @@ def _clean_plugins(monkeypatch: pytest.MonkeyPatch):
     """Ensure that all tests run with uninitialized plugins"""
     monkeypatch.setattr(abstract, "_SOURCES", {})
     monkeypatch.setattr(abstract, "_TARGETS", {})
+    monkeypatch.setattr(abstract, "_INVALIDATORS", {})
     monkeypatch.setattr(abstract, "_SHARED_REDIRECT_MECHANISMS", {})
+    monkeypatch.setattr(async_abstract, "_ASYNC_SESSIONS", {})
 
 
 @pytest.fixture()
@@ -50,6 +50,7 @@ class MockTargetSession(abstract.TargetSession):
     internal_deployment_spec: abstract.DeploymentSpec
     closed: bool = False
     close_success: bool = False
+    supports_concurrent_upload: bool = False
     redirect_mechanisms: dict[str, abstract.RedirectMechanism] = {'mock': MockRedirectMechanism()}
 
     def __init__(self):
@@ -58,7 +59,7 @@ class MockTargetSession(abstract.TargetSession):
         self.internal_deployment_spec = abstract.DeploymentSpec()
         self.redirect_mechanisms = self.redirect_mechanisms.copy()
 
-    def start_version(self, version_id: str, title: str) -> None:
+    def start_version(self, version_id: str, title: str, keep_existing_files: bool = False) -> None:
         self.internal_deployment_spec.versions[version_id] = versions.DeploymentVersion(title=title)
 
     def delete_version_or_alias(self, version_id: abstract.Version) -> None:
@@ -81,7 +82,7 @@ class MockTargetSession(abstract.TargetSession):
                 and version_id not in self.internal_deployment_spec.aliases):
             raise abstract.VersionNotFound(version_id)
 
-    def upload_file(self, version_id: Version, filename: str, file_obj: IO[bytes]) -> None:
+    def upload_file(self, version_id: Version, filename: str, file_obj: IO[bytes], md5: str | None = None) -> None:
         self._check_version_exists(version_id)
         self.files[(version_id, filename)] = file_obj.read()
 
@@ -4,7 +4,7 @@ import pytest
 
 from mkdocs_deploy import abstract
 from mkdocs_deploy.actions import create_alias
-from ...mock_plugin import MockTargetSession
+from ...mock_plugin import MockRedirectMechanism, MockTargetSession
 from ...mock_wrapper import mock_wrapper
 
 
@@ -81,3 +81,15 @@ def test_deleting_non_existent_mechanism_fails(mock_session: MockTargetSession,
 
     with pytest.raises(ValueError):
         create_alias(mock_session, alias, "2.0", ["mock"])
+
+
+def test_implicit_mechanisms_skip_opt_in(mock_session: MockTargetSession, alias: abstract.Version):
+    class OptInMechanism(MockRedirectMechanism):
+        used_by_default = False
+
+    mock_session.redirect_mechanisms["opt_in"], calls = mock_wrapper(OptInMechanism())
+    create_alias(mock_session, alias, "1.1")
+    assert not calls
+    alias_spec = mock_session.deployment_spec.default_version if alias is abstract.DEFAULT_VERSION \
+        else mock_session.deployment_spec.aliases[alias]
+    assert alias_spec.redirect_mechanisms == {"mock"}
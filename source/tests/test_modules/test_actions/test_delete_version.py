@@ -22,7 +22,10 @@ def test_delete_version_with_aliases(mock_session: MockTargetSession, alias: abs
     else:
         assert alias not in mock_session.internal_deployment_spec.aliases
 
-    assert MethodCall("MockTargetSession.delete_version_or_alias", (alias,), {}) in session_calls
+    if alias is abstract.DEFAULT_VERSION:
+        assert MethodCall("MockTargetSession.set_alias", (alias, None), {}) in session_calls
+    else:
+        assert MethodCall("MockTargetSession.delete_version_or_alias", (alias,), {}) in session_calls
 
 
 def test_delete_missing_version(mock_session: MockTargetSession, alias: abstract.Version, caplog: pytest.LogCaptureFixture):
@@ -3,7 +3,7 @@ import importlib.metadata
 import pytest
 
 from mkdocs_deploy import actions
-from mkdocs_deploy.plugins import aws_s3, local_filesystem, html_redirect
+from mkdocs_deploy.plugins import aws_s3, local_filesystem, html_redirect, redirects_file
 import functools
 
 def test_load_plugins_calls_entry_point(monkeypatch: pytest.MonkeyPatch):
@@ -55,7 +55,7 @@ def test_load_plugin_cascades_error(monkeypatch: pytest.MonkeyPatch):
 
 def test_inbuilt_plugins_are_loaded(monkeypatch: pytest.MonkeyPatch):
     """The aim of this is to ensure that we don't mess up entry points in pyproject.toml"""
-    all_plugins = (aws_s3, local_filesystem, html_redirect)
+    all_plugins = (aws_s3, local_filesystem, html_redirect, redirects_file)
     executed: set[str] = set()
 
     def enable_plugin(name: str):
@@ -1,3 +1,8 @@
+import hashlib
+import threading
+import uuid
+from typing import IO
+
 import pytest
 
 from mkdocs_deploy import abstract, actions, versions
@@ -75,3 +80,131 @@ def test_upload_refreshes_aliases(mock_source_files: dict[str, bytes]):
     assert method_calls_1[0].name == 'MockRedirectMechanism.refresh_redirect'
     assert method_calls_1[0].kwargs["alias"] == ALIAS
     assert method_calls_1[0].kwargs["version_id"] == VERSION
+
+
+class _ThreadRecordingSession(MockTargetSession):
+
+    def __init__(self, fail_on: str | None = None):
+        super().__init__()
+        self.upload_threads: set[str] = set()
+        self.fail_on = fail_on
+
+    def upload_file(
+        self, version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: str | None = None
+    ) -> None:
+        self.upload_threads.add(threading.current_thread().name)
+        if filename == self.fail_on:
+            raise _UploadFailure(filename)
+        super().upload_file(version_id, filename, file_obj, md5)
+
+
+class _UploadFailure(Exception):
+    pass
+
+
+@pytest.fixture()
+def many_source_files() -> dict[str, bytes]:
+    return {f"dir_{i % 7}/file_{i}.html": str(uuid.uuid4()).encode() for i in range(100)}
+
+
+def test_upload_concurrently(many_source_files: dict[str, bytes]):
+    VERSION = "1.1"
+    source = MockSource(many_source_files)
+    session = _ThreadRecordingSession()
+    session.supports_concurrent_upload = True
+
+    actions.upload(source=source, target=session, version_id=VERSION, title=None, concurrency=4)
+
+    assert session.files == {(VERSION, file): content for file, content in many_source_files.items()}
+    assert threading.current_thread().name not in session.upload_threads
+
+
+def test_upload_concurrently_raises_failed_upload(many_source_files: dict[str, bytes]):
+    source = MockSource(many_source_files)
+    session = _ThreadRecordingSession(fail_on="dir_3/file_10.html")
+    session.supports_concurrent_upload = True
+
+    with pytest.raises(_UploadFailure):
+        actions.upload(source=source, target=session, version_id="1.1", title=None, concurrency=4)
+
+
+def test_upload_ignores_concurrency_if_target_does_not_support_it(many_source_files: dict[str, bytes]):
+    VERSION = "1.1"
+    source = MockSource(many_source_files)
+    session = _ThreadRecordingSession()
+
+    actions.upload(source=source, target=session, version_id=VERSION, title=None, concurrency=4)
+
+    assert session.files == {(VERSION, file): content for file, content in many_source_files.items()}
+    assert session.upload_threads == {threading.current_thread().name}
+
+
+@pytest.mark.parametrize("concurrency", [1, 4], ids=["serial", "concurrent"])
+def test_incremental_upload_only_sends_changes(mock_source_files: dict[str, bytes], concurrency: int):
+    VERSION = "1.1"
+    source = MockSource(mock_source_files)
+    source.files["new_file.html"] = b"new"
+    session = MockTargetSession()
+    session.supports_concurrent_upload = True
+    session.start_version(VERSION, VERSION)
+    session.files[(VERSION, "index.html")] = mock_source_files["index.html"]
+    session.files[(VERSION, "subdir/foo.txt")] = b"old content"
+    session.files[(VERSION, "removed.html")] = b"removed"
+    wrapped_session, session_calls = mock_wrapper(session)
+
+    actions.upload(source=source, target=wrapped_session, version_id=VERSION, title=None, concurrency=concurrency)
+
+    assert session.files == {(VERSION, file): content for file, content in source.files.items()}
+    uploaded = {call.kwargs["filename"] for call in session_calls if call.name == "MockTargetSession.upload_file"}
+    assert uploaded == {"subdir/foo.txt", "new_file.html"}
+
+
+def test_full_upload_sends_everything(mock_source_files: dict[str, bytes]):
+    VERSION = "1.1"
+    source = MockSource(mock_source_files)
+    session = MockTargetSession()
+    session.start_version(VERSION, VERSION)
+    for filename, content in mock_source_files.items():
+        session.files[(VERSION, filename)] = content
+    wrapped_session, session_calls = mock_wrapper(session)
+
+    actions.upload(source=source, target=wrapped_session, version_id=VERSION, title=None, incremental=False)
+
+    uploaded = {call.kwargs["filename"] for call in session_calls if call.name == "MockTargetSession.upload_file"}
+    assert uploaded == set(mock_source_files)
+
+
+class _ManifestSession(MockTargetSession):
+
+    def get_manifest(self, version_id: str) -> versions.VersionManifest | None:
+        return versions.VersionManifest(files={
+            filename: versions.ManifestEntry(size=len(content), md5=hashlib.md5(content).hexdigest())
+            for (file_version, filename), content in self.files.items()
+            if file_version == version_id
+        })
+
+
+@pytest.mark.parametrize("concurrency", [1, 4], ids=["serial", "concurrent"])
+def test_deduplicate_copies_files_from_other_versions(mock_source_files: dict[str, bytes], concurrency: int):
+    source = MockSource(mock_source_files)
+    session = _ManifestSession()
+    session.supports_concurrent_upload = True
+    session.start_version("1.0", "1.0")
+    session.files[("1.0", "old/index.html")] = mock_source_files["index.html"]
+    session.files[("1.0", "subdir/foo.txt")] = b"old content"
+    wrapped_session, session_calls = mock_wrapper(session)
+
+    actions.upload(
+        source=source, target=wrapped_session, version_id="1.1", title=None, concurrency=concurrency, deduplicate=True
+    )
+
+    assert {filename: content for (version_id, filename), content in session.files.items() if version_id == "1.1"} \
+        == mock_source_files
+    copies = [call.args for call in session_calls if call.name == "_ManifestSession.copy_file"]
+    assert copies == [("1.0", "old/index.html", "1.1", "index.html")]
+    uploaded = {call.kwargs["filename"] for call in session_calls if call.name == "_ManifestSession.upload_file"}
+    assert uploaded == set(mock_source_files) - {"index.html"}
+    # Files hashed to look for duplicates pass the md5 on so the target need not hash them again
+    for call in session_calls:
+        if call.name == "_ManifestSession.upload_file":
+            assert call.kwargs["md5"] == hashlib.md5(mock_source_files[call.kwargs["filename"]]).hexdigest()
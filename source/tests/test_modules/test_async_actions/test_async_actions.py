@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import io
+import tarfile
+from typing import IO
+
+import pytest
+
+from mkdocs_deploy import abstract, async_abstract, async_actions, versions
+from mkdocs_deploy.plugins import local_filesystem
+from ...mock_plugin import MockSource, MockTargetSession
+
+
+def _adapt(source: MockSource, session: MockTargetSession):
+    return async_abstract.AsyncSourceAdapter(source), async_abstract.async_session_for(session)
+
+
+def test_upload(mock_source_files: dict[str, bytes]):
+    session = MockTargetSession()
+    source, target = _adapt(MockSource(mock_source_files), session)
+
+    asyncio.run(async_actions.upload(source, target, "1.1", None, concurrency=4))
+
+    assert session.files == {("1.1", filename): content for filename, content in mock_source_files.items()}
+    assert session.deployment_spec.versions == {"1.1": versions.DeploymentVersion(title="1.1")}
+
+
+def test_upload_skips_unchanged_and_deletes_removed(mock_source_files: dict[str, bytes]):
+    session = MockTargetSession()
+    session.start_version("1.1", "1.1")
+    for filename, content in mock_source_files.items():
+        session.upload_file("1.1", filename, io.BytesIO(content))
+    session.upload_file("1.1", "removed.html", io.BytesIO(b"gone"))
+    uploads = []
+    original_upload = session.upload_file
+
+    def upload_file(version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: str | None = None) -> None:
+        uploads.append(filename)
+        original_upload(version_id, filename, file_obj, md5)
+
+    session.upload_file = upload_file
+    changed = dict(mock_source_files, **{"index.html": b"changed"})
+    source, target = _adapt(MockSource(changed), session)
+
+    asyncio.run(async_actions.upload(source, target, "1.1", None))
+
+    assert uploads == ["index.html"]
+    assert ("1.1", "removed.html") not in session.files
+    assert session.files[("1.1", "index.html")] == b"changed"
+
+
+class _ManifestSession(MockTargetSession):
+    """Mock session with manifests, which deduplication needs to find identical files"""
+
+    def get_manifest(self, version_id: str) -> versions.VersionManifest | None:
+        return versions.VersionManifest(files={
+            filename: versions.ManifestEntry(size=len(content), md5=hashlib.md5(content).hexdigest())
+            for (file_version, filename), content in self.files.items()
+            if file_version == version_id
+        })
+
+    def copy_file(self, src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str):
+        self.files[(dst_version, dst_name)] = self.files[(src_version, src_name)]
+
+
+def test_upload_deduplicates(mock_source_files: dict[str, bytes]):
+    session = _ManifestSession()
+    session.start_version("1.0", "1.0")
+    session.files[("1.0", "old/index.html")] = mock_source_files["index.html"]
+    uploads = []
+    copies = []
+    original_upload = session.upload_file
+    original_copy = session.copy_file
+
+    def upload_file(version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: str | None = None) -> None:
+        uploads.append((filename, md5))
+        original_upload(version_id, filename, file_obj, md5)
+
+    def copy_file(src_version: abstract.Version, src_name: str, dst_version: abstract.Version, dst_name: str) -> None:
+        copies.append((src_version, src_name, dst_version, dst_name))
+        original_copy(src_version, src_name, dst_version, dst_name)
+
+    session.upload_file = upload_file
+    session.copy_file = copy_file
+    source, target = _adapt(MockSource(mock_source_files), session)
+
+    asyncio.run(async_actions.upload(source, target, "1.1", None, deduplicate=True))
+
+    assert copies == [("1.0", "old/index.html", "1.1", "index.html")]
+    assert uploads == [("subdir/foo.txt", hashlib.md5(mock_source_files["subdir/foo.txt"]).hexdigest())]
+    assert {filename: session.files[("1.1", filename)] for filename in mock_source_files} == mock_source_files
+
+
+def test_upload_failure_is_raised(mock_source_files: dict[str, bytes]):
+    session = MockTargetSession()
+
+    def upload_file(version_id: abstract.Version, filename: str, file_obj: IO[bytes], md5: str | None = None) -> None:
+        raise OSError("upload failed")
+
+    session.upload_file = upload_file
+    source, target = _adapt(MockSource(mock_source_files), session)
+
+    with pytest.raises(OSError, match="upload failed"):
+        asyncio.run(async_actions.upload(source, target, "1.1", None, concurrency=2))
+
+
+def test_upload_from_sequential_source(mock_source_files: dict[str, bytes]):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for filename, content in mock_source_files.items():
+            info = tarfile.TarInfo("site/" + filename)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+    session = MockTargetSession()
+    source = async_abstract.AsyncSourceAdapter(local_filesystem.StreamingTarSource(buffer))
+
+    asyncio.run(async_actions.upload(source, async_abstract.async_session_for(session), "1.0", None))
+
+    assert session.files == {("1.0", filename): content for filename, content in mock_source_files.items()}
+
+
+def test_alias_operations(mock_session: MockTargetSession):
+    target = async_abstract.async_session_for(mock_session)
+
+    async def run():
+        await async_actions.create_alias(target, "latest", "1.1", ["mock"])
+        assert mock_session.deployment_spec.aliases["latest"].version_id == "1.1"
+        await async_actions.delete_version(target, "1.1")
+
+    asyncio.run(run())
+    assert "latest" not in mock_session.deployment_spec.aliases
+    assert "1.1" not in mock_session.deployment_spec.versions
+
+
+def test_async_session_for_uses_registered_session(mock_session: MockTargetSession):
+    class NativeSession(async_abstract.AsyncTargetSession):
+        def __init__(self, session: abstract.TargetSession):
+            self._session = session
+
+        @property
+        def session(self) -> abstract.TargetSession:
+            return self._session
+
+    assert isinstance(async_abstract.async_session_for(mock_session), async_abstract.AsyncTargetSessionAdapter)
+    async_abstract.register_async_session(MockTargetSession, NativeSession)
+    native = async_abstract.async_session_for(mock_session)
+    assert isinstance(native, NativeSession)
+    assert native.session is mock_session
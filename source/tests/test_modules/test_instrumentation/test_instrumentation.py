@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+from mkdocs_deploy import actions
+from mkdocs_deploy.instrumentation import InstrumentedSource, InstrumentedTargetSession, PerformanceReport
+from mkdocs_deploy.plugins import html_redirect
+from mkdocs_deploy.shared_implementations import CachePolicy
+from ...mock_plugin import MockSource, MockTargetSession
+
+
+def test_upload_is_recorded(mock_source_files: dict[str, bytes]):
+    report = PerformanceReport()
+    session = MockTargetSession()
+
+    actions.upload(
+        source=InstrumentedSource(MockSource(mock_source_files), report),
+        target=InstrumentedTargetSession(session, report),
+        version_id="1.0",
+        title=None,
+    )
+
+    assert session.files == {("1.0", filename): content for filename, content in mock_source_files.items()}
+    result = report.to_dict()
+    assert result["operations"]["target.upload_file"]["calls"] == len(mock_source_files)
+    assert result["operations"]["target.upload_file"]["bytes"] == sum(map(len, mock_source_files.values()))
+    assert result["operations"]["source.open_file_for_read"]["calls"] == len(mock_source_files)
+    assert set(result["phases"]) == {"source", "target"}
+    assert {slow["detail"] for slow in result["slowest"]} >= {f"1.0/{filename}" for filename in mock_source_files}
+
+
+def test_shared_redirect_mechanisms_are_recorded(mock_session: MockTargetSession):
+    html_redirect.enable_plugin()
+    mock_session.upload_file("1.1", "index.html", io.BytesIO(b"<html></html>"))
+    report = PerformanceReport()
+
+    actions.create_alias(InstrumentedTargetSession(mock_session, report), "latest", "1.1", ["html", "mock"])
+
+    operations = report.to_dict()["operations"]
+    assert operations["redirect.html.create_redirect"]["calls"] == 1
+    assert operations["redirect.mock.create_redirect"]["calls"] == 1
+    # Files written by the mechanism are recorded as target operations
+    assert operations["target.upload_file"]["calls"] == 1
+    assert ("latest", "index.html") in mock_session.files
+
+
+def test_session_setup_and_changes_are_recorded(mock_session: MockTargetSession):
+    report = PerformanceReport()
+    session = InstrumentedTargetSession(mock_session, report)
+
+    session.set_cache_policy(CachePolicy({"*.html": "max-age=60"}, "no-cache"))
+    assert session.changed_paths == mock_session.changed_paths
+
+    operations = report.to_dict()["operations"]
+    assert operations["target.set_cache_policy"]["calls"] == 1
+    assert operations["target.changed_paths"]["calls"] == 1
+
+
+def test_phase_wall_time_merges_overlapping_calls():
+    report = PerformanceReport()
+    report.record("target", "upload_file", 10.0, 12.0)
+    report.record("target", "upload_file", 11.0, 13.0)
+    report.record("target", "upload_file", 20.0, 21.0)
+
+    phase = report.to_dict()["phases"]["target"]
+
+    assert phase["wall_seconds"] == pytest.approx(4.0)
+    assert phase["busy_seconds"] == pytest.approx(5.0)
+    assert phase["calls"] == 3
+
+
+def test_keeps_slowest_calls():
+    report = PerformanceReport(slowest_count=2)
+    for seconds in (3, 1, 4, 1, 5):
+        report.record("target", "upload_file", 0, seconds, detail=str(seconds))
+
+    assert [slow["detail"] for slow in report.to_dict()["slowest"]] == ["5", "4"]
+
+
+def test_count_api_call():
+    report = PerformanceReport()
+    report.count_api_call(event_name="before-call.s3.PutObject")
+    report.count_api_call(event_name="before-call.s3.PutObject")
+    report.count_api_call(event_name="before-call.cloudfront.CreateInvalidation")
+
+    assert report.to_dict()["api_calls"] == {"cloudfront.CreateInvalidation": 1, "s3.PutObject": 2}
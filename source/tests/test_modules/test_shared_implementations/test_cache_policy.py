@@ -0,0 +1,20 @@
+from mkdocs_deploy.shared_implementations import CachePolicy
+
+
+def test_first_matching_pattern_wins():
+    policy = CachePolicy({"assets/*.min.js": "immutable", "*.html": "max-age=300", "*": "max-age=3600"})
+
+    assert policy.cache_control_for("assets/javascripts/bundle.min.js") == "immutable"
+    assert policy.cache_control_for("foo/index.html") == "max-age=300"
+    assert policy.cache_control_for("image.png") == "max-age=3600"
+
+
+def test_redirects_ignore_patterns():
+    policy = CachePolicy({"*": "max-age=3600"}, redirect_cache_control="no-cache")
+
+    assert policy.cache_control_for("index.html", redirect=True) == "no-cache"
+    assert CachePolicy({"*": "max-age=3600"}).cache_control_for("index.html", redirect=True) is None
+
+
+def test_no_match():
+    assert CachePolicy({"*.html": "max-age=300"}).cache_control_for("style.css") is None
@@ -0,0 +1,55 @@
+import gzip
+import io
+
+import brotli
+import pytest
+
+from mkdocs_deploy import shared_implementations
+from mkdocs_deploy.shared_implementations import Compression
+
+
+def test_applies_to_matches_patterns_and_min_size():
+    compression = Compression(["*.html", "*.js"], min_size=10)
+
+    assert compression.applies_to("foo/index.html", 100)
+    assert compression.applies_to("app.js")
+    assert not compression.applies_to("image.png", 100)
+    assert not compression.applies_to("index.html", 9)
+
+
+@pytest.mark.parametrize(("encoding", "decompress"), [("gzip", gzip.decompress), ("br", brotli.decompress)])
+def test_compress_file_round_trips(monkeypatch: pytest.MonkeyPatch, encoding: str, decompress):
+    # Many chunks, to check they are joined correctly
+    monkeypatch.setattr(shared_implementations, "_COMPRESS_CHUNK_SIZE", 100)
+    content = b"<html>" + b"hello " * 1000 + b"</html>"
+
+    compressed = io.BytesIO()
+    Compression.compress_file(io.BytesIO(content), compressed, encoding)
+
+    assert len(compressed.getvalue()) < len(content)
+    assert decompress(compressed.getvalue()) == content
+    # Deterministic so unchanged files produce identical objects
+    again = io.BytesIO()
+    Compression.compress_file(io.BytesIO(content), again, encoding)
+    assert again.getvalue() == compressed.getvalue()
+
+
+def test_from_query_pops_options():
+    query = {"compress": "*.html,*.json", "compress_encodings": "gzip,br", "other": "1"}
+
+    compression = Compression.from_query(query)
+
+    assert compression.patterns == ("*.html", "*.json")
+    assert compression.encodings == ("gzip", "br")
+    assert query == {"other": "1"}
+
+
+def test_from_query_without_compress():
+    assert Compression.from_query({"other": "1"}) is None
+    with pytest.raises(ValueError):
+        Compression.from_query({"compress_encodings": "br"})
+
+
+def test_unknown_encoding_raises():
+    with pytest.raises(ValueError):
+        Compression(["*"], ["zstd"])
@@ -0,0 +1,42 @@
+from mkdocs_deploy import versions
+from mkdocs_deploy.shared_implementations import DeploymentSpecJournal
+
+
+def test_rebase_replays_changes_on_newer_spec():
+    journal = DeploymentSpecJournal(versions.DeploymentSpec(versions={"1.0": versions.DeploymentVersion(title="1.0")}))
+    journal.set_version("2.0", "Version 2")
+    journal.set_alias("latest", versions.DeploymentAlias(version_id="2.0", redirect_mechanisms={"html"}))
+    journal.delete_version_or_alias("1.0")
+    snapshot = journal.snapshot()
+
+    # Meanwhile another session added 1.1 and set the default version
+    journal.rebase(versions.DeploymentSpec(
+        default_version=versions.DeploymentAlias(version_id="1.1", redirect_mechanisms={"html"}),
+        versions={
+            "1.0": versions.DeploymentVersion(title="1.0"),
+            "1.1": versions.DeploymentVersion(title="1.1"),
+        },
+    ))
+
+    assert journal.changed
+    assert journal.spec == versions.DeploymentSpec(
+        default_version=versions.DeploymentAlias(version_id="1.1", redirect_mechanisms={"html"}),
+        versions={
+            "1.1": versions.DeploymentVersion(title="1.1"),
+            "2.0": versions.DeploymentVersion(title="Version 2"),
+        },
+        aliases={"latest": versions.DeploymentAlias(version_id="2.0", redirect_mechanisms={"html"})},
+    )
+    assert journal.snapshot() is not snapshot
+    assert list(journal.snapshot().aliases_for_version("2.0")) == ["latest"]
+
+
+def test_set_alias_is_not_affected_by_later_changes_to_the_argument():
+    journal = DeploymentSpecJournal(versions.DeploymentSpec())
+    alias = versions.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"})
+    journal.set_alias("latest", alias)
+    alias.version_id = "2.0"
+
+    journal.rebase(versions.DeploymentSpec())
+
+    assert journal.spec.aliases["latest"].version_id == "1.0"
@@ -0,0 +1,41 @@
+from mkdocs_deploy.shared_implementations import invalidation_paths
+
+
+def test_few_paths_are_unchanged():
+    assert invalidation_paths(["versions.json", "1.0/foo/bar.html", "latest/*"]) == [
+        "1.0/foo/bar.html", "latest/*", "versions.json",
+    ]
+
+
+def test_index_pages_include_their_directory():
+    assert invalidation_paths(["index.html", "1.0/foo/index.html"]) == [
+        "", "1.0/foo/", "1.0/foo/index.html", "index.html",
+    ]
+
+
+def test_wildcards_absorb_covered_paths():
+    assert invalidation_paths(["latest/foo.html", "latest/*", "latest/bar/*"]) == ["latest/*"]
+    assert invalidation_paths(["*", "1.0/foo.html"]) == ["*"]
+
+
+def test_too_many_paths_uses_deepest_sufficient_directory():
+    paths = [f"1.0/api/{i}.html" for i in range(10)] + ["1.0/other.html", "versions.json"]
+
+    assert invalidation_paths(paths, max_paths=5) == ["1.0/api/*", "1.0/other.html", "versions.json"]
+
+
+def test_too_many_paths_collapses_repeatedly():
+    paths = [f"{version}/{i}.html" for version in ("1.0", "1.1", "2.0") for i in range(10)]
+
+    assert invalidation_paths(paths, max_paths=5) == ["1.0/*", "1.1/*", "2.0/*"]
+
+
+def test_too_many_wildcards():
+    paths = [f"a/{i}/*" for i in range(5)] + ["b/*"]
+
+    assert invalidation_paths(paths, max_wildcards=2) == ["a/*", "b/*"]
+    assert invalidation_paths(paths, max_wildcards=1) == ["*"]
+
+
+def test_nothing_changed():
+    assert invalidation_paths([]) == []
@@ -0,0 +1,71 @@
+from typing import Optional
+
+import pytest
+
+from mkdocs_deploy.shared_implementations import ManifestTracker
+from mkdocs_deploy.versions import ManifestEntry, VersionManifest
+
+
+@pytest.fixture()
+def stored_manifests() -> dict[str, bytes]:
+    return {
+        "1.0": VersionManifest(files={"index.html": ManifestEntry(size=3, md5="abc", content_type="text/html")})
+            .json().encode(),
+    }
+
+
+@pytest.fixture()
+def tracker(stored_manifests: dict[str, bytes]) -> ManifestTracker:
+    def load_manifest(version_id: str) -> Optional[bytes]:
+        return stored_manifests.get(version_id)
+    return ManifestTracker(load_manifest)
+
+
+def test_loads_existing_manifest(tracker: ManifestTracker):
+    manifest = tracker.get("1.0")
+    assert manifest is not None
+    assert manifest.files["index.html"].md5 == "abc"
+    assert tracker.changed_manifests() == {}
+
+
+def test_unknown_version_is_not_recorded(tracker: ManifestTracker):
+    tracker.record_upload("1.1", "index.html", 3, "abc")
+    assert tracker.get("1.1") is None
+    assert tracker.changed_manifests() == {}
+
+
+def test_started_version_is_recorded(tracker: ManifestTracker):
+    tracker.start_version("1.1", keep_existing_files=False)
+    tracker.record_upload("1.1", "foo/bar.css", 5, "def")
+    assert tracker.changed_manifests() == {
+        "1.1": VersionManifest(files={"foo/bar.css": ManifestEntry(size=5, md5="def", content_type="text/css")}),
+    }
+
+
+def test_kept_version_is_updated(tracker: ManifestTracker):
+    tracker.start_version("1.0", keep_existing_files=True)
+    tracker.record_upload("1.0", "foo.txt", 5, "def")
+    tracker.record_delete("1.0", "index.html")
+    assert tracker.changed_manifests() == {
+        "1.0": VersionManifest(files={"foo.txt": ManifestEntry(size=5, md5="def", content_type="text/plain")}),
+    }
+
+
+def test_seed_unknown_version(tracker: ManifestTracker):
+    tracker.seed("1.1", [("index.html", 3, None)])
+    manifest = tracker.get("1.1")
+    assert manifest is not None
+    assert manifest.files == {"index.html": ManifestEntry(size=3, md5=None, content_type="text/html")}
+
+
+def test_seed_does_not_replace_known_manifest(tracker: ManifestTracker):
+    tracker.seed("1.0", [])
+    manifest = tracker.get("1.0")
+    assert manifest is not None
+    assert "index.html" in manifest.files
+
+
+def test_delete_version(tracker: ManifestTracker):
+    tracker.record_delete_version("1.0")
+    assert tracker.get("1.0") is None
+    assert tracker.changed_manifests() == {"1.0": None}
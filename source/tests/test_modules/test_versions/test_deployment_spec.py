@@ -0,0 +1,66 @@
+import pytest
+
+from mkdocs_deploy import versions
+
+
+def _spec() -> versions.DeploymentSpec:
+    return versions.DeploymentSpec(
+        versions={"1.0": versions.DeploymentVersion(title="1.0"), "2.0": versions.DeploymentVersion(title="2.0")},
+        aliases={
+            "latest": versions.DeploymentAlias(version_id="2.0", redirect_mechanisms={"html"}),
+            "stable": versions.DeploymentAlias(version_id="2.0", redirect_mechanisms={"html"}),
+            "old": versions.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"}),
+        },
+    )
+
+
+def test_snapshot_indexes_aliases_by_version():
+    spec = _spec()
+    snapshot = spec.snapshot()
+
+    for version_id in ("1.0", "2.0", "3.0"):
+        assert sorted(snapshot.aliases_for_version(version_id)) == sorted(spec.aliases_for_version(version_id))
+    assert snapshot == spec
+
+
+def test_snapshot_does_not_share_state():
+    spec = _spec()
+    snapshot = spec.snapshot()
+
+    spec.aliases["old"].version_id = "2.0"
+    del spec.aliases["latest"]
+
+    assert snapshot.aliases["old"].version_id == "1.0"
+    assert sorted(snapshot.aliases_for_version("2.0")) == ["latest", "stable"]
+    assert sorted(spec.aliases_for_version("2.0")) == ["old", "stable"]
+
+
+def test_snapshot_is_read_only():
+    snapshot = _spec().snapshot()
+
+    with pytest.raises(TypeError):
+        snapshot.aliases["new"] = versions.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"})
+    with pytest.raises(TypeError):
+        del snapshot.aliases["latest"]
+    with pytest.raises(TypeError):
+        snapshot.versions.pop("1.0")
+    with pytest.raises(TypeError):
+        snapshot.aliases = {}
+
+    assert sorted(snapshot.aliases_for_version("2.0")) == ["latest", "stable"]
+
+
+@pytest.mark.parametrize("deep", [False, True], ids=["shallow", "deep"])
+def test_copy_of_snapshot_can_be_modified(deep: bool):
+    snapshot = _spec().snapshot()
+    edited = snapshot.copy(deep=deep)
+
+    del edited.aliases["latest"]
+    edited.aliases["new"] = versions.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"})
+    edited.versions["3.0"] = versions.DeploymentVersion(title="3.0")
+
+    assert sorted(edited.aliases_for_version("2.0")) == ["stable"]
+    assert sorted(edited.aliases_for_version("1.0")) == ["new", "old"]
+    assert sorted(snapshot.aliases_for_version("2.0")) == ["latest", "stable"]
+    assert "3.0" not in snapshot.versions
+    assert versions.DeploymentSpec.parse_raw(edited.json()) == edited
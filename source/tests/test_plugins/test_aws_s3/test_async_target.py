@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import uuid
+from typing import Iterable
+
+import boto3
+import pytest
+
+from mkdocs_deploy import abstract, async_abstract, async_actions, versions
+from mkdocs_deploy.plugins import aws_s3
+from ...mock_plugin import MockSource
+
+aws_s3_async = pytest.importorskip("mkdocs_deploy.plugins.aws_s3_async")
+moto_server = pytest.importorskip("moto.server")
+
+
+@pytest.fixture()
+def endpoint_url(default_region: str, monkeypatch: pytest.MonkeyPatch) -> Iterable[str]:
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    try:
+        endpoint_url = f"http://127.0.0.1:{server._server.server_port}"
+        # The synchronous session creates its own client, so point every client at the server
+        monkeypatch.setenv("AWS_ENDPOINT_URL", endpoint_url)
+        yield endpoint_url
+    finally:
+        server.stop()
+
+
+@pytest.fixture()
+def server_bucket(endpoint_url: str, default_region: str) -> str:
+    # The moto server keeps state between tests
+    bucket_name = f"test-bucket-{uuid.uuid4()}"
+    boto3.client("s3").create_bucket(
+        Bucket=bucket_name, CreateBucketConfiguration={"LocationConstraint": default_region},  # type: ignore
+    )
+    return bucket_name
+
+
+def _deploy(target: aws_s3.S3Target, files: dict[str, bytes], version_id: str = "1.0") -> None:
+    async def upload(session: abstract.TargetSession):
+        async with async_abstract.async_session_for(session) as async_session:
+            assert isinstance(async_session, aws_s3_async.AsyncS3TargetSession)
+            source = async_abstract.AsyncSourceAdapter(MockSource(files))
+            await async_actions.upload(source, async_session, version_id, None)
+
+    with target.start_session() as session:
+        asyncio.run(upload(session))
+
+
+def test_enable_plugin_registers_async_session(s3_bucket: str):
+    aws_s3.enable_plugin()
+    with aws_s3.S3Target(s3_bucket, "site").start_session() as session:
+        assert isinstance(async_abstract.async_session_for(session), aws_s3_async.AsyncS3TargetSession)
+
+
+def test_upload_and_redeploy(server_bucket: str, mock_source_files: dict[str, bytes]):
+    aws_s3.enable_plugin()
+    target = aws_s3.S3Target(server_bucket, "site")
+    client = boto3.client("s3")
+
+    _deploy(target, mock_source_files)
+    for filename, content in mock_source_files.items():
+        assert client.get_object(Bucket=server_bucket, Key=f"site/1.0/{filename}")["Body"].read() == content
+    manifest = versions.VersionManifest.parse_raw(
+        client.get_object(Bucket=server_bucket, Key="site/" + versions.manifest_filename("1.0"))["Body"].read()
+    )
+    assert {filename: entry.md5 for filename, entry in manifest.files.items()} == {
+        filename: hashlib.md5(content).hexdigest() for filename, content in mock_source_files.items()
+    }
+
+    removed = next(iter(mock_source_files))
+    _deploy(target, {filename: content for filename, content in mock_source_files.items() if filename != removed})
+    keys = {obj["Key"] for obj in client.list_objects_v2(Bucket=server_bucket, Prefix="site/1.0/")["Contents"]}
+    assert keys == {f"site/1.0/{filename}" for filename in mock_source_files if filename != removed}
+
+
+def test_delete_version(server_bucket: str, mock_source_files: dict[str, bytes]):
+    aws_s3.enable_plugin()
+    target = aws_s3.S3Target(server_bucket, "site")
+    client = boto3.client("s3")
+    _deploy(target, mock_source_files)
+
+    async def delete(session: abstract.TargetSession):
+        async with async_abstract.async_session_for(session) as async_session:
+            await async_actions.delete_version(async_session, "1.0")
+
+    with target.start_session() as session:
+        asyncio.run(delete(session))
+        assert "1.0" not in session.deployment_spec.versions
+
+    assert "Contents" not in client.list_objects_v2(Bucket=server_bucket, Prefix="site/1.0/")
+    with target.start_session() as session:
+        assert session.deployment_spec.versions == {}
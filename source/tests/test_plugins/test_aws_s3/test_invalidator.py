@@ -0,0 +1,72 @@
+from typing import Iterable
+
+import boto3
+import moto
+import pytest
+
+from mkdocs_deploy import abstract
+from mkdocs_deploy.plugins import aws_s3
+
+
+@pytest.fixture()
+def distribution_id(default_region: str) -> Iterable[str]:
+    with moto.mock_cloudfront():
+        client = boto3.client("cloudfront")
+        result = client.create_distribution(DistributionConfig={
+            "CallerReference": "test",
+            "Origins": {"Quantity": 1, "Items": [{
+                "Id": "origin", "DomainName": "example.s3.amazonaws.com", "S3OriginConfig": {"OriginAccessIdentity": ""}
+            }]},
+            "DefaultCacheBehavior": {"TargetOriginId": "origin", "ViewerProtocolPolicy": "allow-all"},
+            "Comment": "",
+            "Enabled": True,
+        })
+        yield result["Distribution"]["Id"]
+
+
+@pytest.fixture()
+def invalidated_paths(distribution_id: str) -> Iterable[list[list[str]]]:
+    """The paths of each invalidation as it is created, since moto's get_invalidation does not return them"""
+    result = []
+
+    def record(params: dict, **_) -> None:
+        result.append(params["InvalidationBatch"]["Paths"]["Items"])
+
+    boto3.setup_default_session()
+    boto3.DEFAULT_SESSION.events.register("provide-client-params.cloudfront.CreateInvalidation", record)
+    yield result
+    boto3.DEFAULT_SESSION = None
+
+
+def test_invalidator_for_url(distribution_id: str):
+    aws_s3.enable_plugin()
+
+    invalidator = abstract.invalidator_for_url(f"cloudfront://{distribution_id}/docs")
+
+    assert isinstance(invalidator, aws_s3.CloudFrontInvalidator)
+    assert invalidator._distribution_id == distribution_id
+    assert invalidator._path_prefix == "/docs/"
+
+
+def test_invalidate_changed_paths(distribution_id: str, invalidated_paths: list[list[str]]):
+    aws_s3.CloudFrontInvalidator(distribution_id, "/docs/").invalidate(
+        ["1.0/index.html", "1.0/my page.html", "latest/*"]
+    )
+
+    assert invalidated_paths == [
+        ["/docs/1.0/", "/docs/1.0/index.html", "/docs/1.0/my%20page.html", "/docs/latest/*"]
+    ]
+
+
+def test_invalidate_unknown_changes_invalidates_everything(distribution_id: str, invalidated_paths: list[list[str]]):
+    aws_s3.CloudFrontInvalidator(distribution_id).invalidate(None)
+
+    assert invalidated_paths == [["/*"]]
+    invalidations = boto3.client("cloudfront").list_invalidations(DistributionId=distribution_id)["InvalidationList"]
+    assert invalidations["Quantity"] == 1
+
+
+def test_invalidate_nothing_changed(distribution_id: str, invalidated_paths: list[list[str]]):
+    aws_s3.CloudFrontInvalidator(distribution_id).invalidate([])
+
+    assert invalidated_paths == []
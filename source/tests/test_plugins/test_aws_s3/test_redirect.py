@@ -0,0 +1,107 @@
+import boto3
+import pytest
+
+from mkdocs_deploy import abstract, actions
+from mkdocs_deploy.plugins import aws_s3, html_redirect
+
+
+@pytest.fixture()
+def target_prefix() -> str:
+    return "static-html/"
+
+
+@pytest.fixture()
+def website_bucket(s3_bucket: str) -> str:
+    client = boto3.client("s3")
+    client.put_bucket_website(
+        Bucket=s3_bucket,
+        WebsiteConfiguration={"IndexDocument": {"Suffix": "index.html"}, "ErrorDocument": {"Key": "404.html"}},
+    )
+    return s3_bucket
+
+
+@pytest.fixture()
+def s3_session(website_bucket: str, target_prefix: str) -> aws_s3.S3TargetSession:
+    session = aws_s3.S3Target(bucket=website_bucket, prefix_key=target_prefix).start_session()
+    session.start_version("1.0", "1.0")
+    session.start_version("1.1", "1.1")
+    return session
+
+
+def _routing_rules(bucket: str) -> list[dict]:
+    return boto3.client("s3").get_bucket_website(Bucket=bucket).get("RoutingRules", [])
+
+
+def test_session_offers_s3_mechanism(s3_session: aws_s3.S3TargetSession):
+    assert isinstance(s3_session.available_redirect_mechanisms["s3"], aws_s3.S3WebsiteRedirect)
+
+
+def test_create_alias_adds_routing_rule(s3_session: aws_s3.S3TargetSession, website_bucket: str):
+    actions.create_alias(s3_session, "latest", "1.0", ["s3"])
+
+    assert _routing_rules(website_bucket) == [{
+        "Condition": {"KeyPrefixEquals": "static-html/latest/"},
+        "Redirect": {"ReplaceKeyPrefixWith": "static-html/1.0/", "HttpRedirectCode": "302"},
+    }]
+    # Existing configuration must be retained
+    website = boto3.client("s3").get_bucket_website(Bucket=website_bucket)
+    assert website["IndexDocument"] == {"Suffix": "index.html"}
+    assert website["ErrorDocument"] == {"Key": "404.html"}
+    # No per file redirects
+    assert "Contents" not in boto3.client("s3").list_objects_v2(Bucket=website_bucket, Prefix="static-html/latest/")
+
+
+def test_moving_alias_replaces_routing_rule(s3_session: aws_s3.S3TargetSession, website_bucket: str):
+    actions.create_alias(s3_session, "latest", "1.0", ["s3"])
+    actions.create_alias(s3_session, "stable", "1.0", ["s3"])
+    actions.create_alias(s3_session, "latest", "1.1", ["s3"])
+
+    rules = {
+        rule["Condition"]["KeyPrefixEquals"]: rule["Redirect"]["ReplaceKeyPrefixWith"]
+        for rule in _routing_rules(website_bucket)
+    }
+    assert rules == {"static-html/latest/": "static-html/1.1/", "static-html/stable/": "static-html/1.0/"}
+
+
+def test_delete_alias_removes_routing_rule(s3_session: aws_s3.S3TargetSession, website_bucket: str):
+    actions.create_alias(s3_session, "latest", "1.0", ["s3"])
+    actions.delete_alias(s3_session, "latest")
+
+    assert _routing_rules(website_bucket) == []
+
+
+def test_default_version_redirect_object(s3_session: aws_s3.S3TargetSession, website_bucket: str):
+    actions.create_alias(s3_session, abstract.DEFAULT_VERSION, "1.0", ["s3"])
+
+    head = boto3.client("s3").head_object(Bucket=website_bucket, Key="static-html/index.html")
+    assert head["WebsiteRedirectLocation"] == "/static-html/1.0/"
+    assert head["ContentLength"] == 0
+
+    aws_s3.S3WebsiteRedirect().delete_redirect(s3_session, abstract.DEFAULT_VERSION)
+
+    with pytest.raises(boto3.client("s3").exceptions.ClientError):
+        boto3.client("s3").head_object(Bucket=website_bucket, Key="static-html/index.html")
+
+
+def test_delete_default_leaves_other_index(s3_session: aws_s3.S3TargetSession, website_bucket: str):
+    client = boto3.client("s3")
+    client.put_object(Bucket=website_bucket, Key="static-html/index.html", Body=b"html redirect")
+
+    aws_s3.S3WebsiteRedirect().delete_redirect(s3_session, abstract.DEFAULT_VERSION)
+
+    assert client.get_object(Bucket=website_bucket, Key="static-html/index.html")["Body"].read() == b"html redirect"
+
+
+def test_bucket_without_website_raises(s3_bucket: str, target_prefix: str):
+    session = aws_s3.S3Target(bucket=s3_bucket, prefix_key=target_prefix).start_session()
+    session.start_version("1.0", "1.0")
+    with pytest.raises(RuntimeError):
+        aws_s3.S3WebsiteRedirect().create_redirect(session, "latest", "1.0")
+
+
+def test_default_alias_does_not_use_s3_mechanism(s3_bucket: str, target_prefix: str):
+    html_redirect.enable_plugin()
+    session = aws_s3.S3Target(bucket=s3_bucket, prefix_key=target_prefix).start_session()
+    session.start_version("1.0", "1.0")
+    actions.create_alias(session, "latest", "1.0")
+    assert session.deployment_spec.aliases["latest"].redirect_mechanisms == {"html"}
@@ -1,10 +1,83 @@
+import io
+import tarfile
+import zipfile
+from typing import Callable
+
+import boto3
 import pytest
 
-from mkdocs_deploy import abstract
+from mkdocs_deploy import abstract, actions
 from mkdocs_deploy.plugins import aws_s3
+from ...mock_plugin import MockTargetSession
 
 @pytest.mark.skip(reason="S3 Source is known to be broken right now")
 def test_enable_plugin(s3_bucket: str):
     aws_s3.enable_plugin()
 
     assert isinstance(abstract.source_for_url(f"s3://{s3_bucket}/"), aws_s3.S3Source)
+
+
+def _zip_archive(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for filename, content in files.items():
+            archive.writestr("site/" + filename, content)
+    return buffer.getvalue()
+
+
+def _tar_archive(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for filename, content in files.items():
+            info = tarfile.TarInfo("site/" + filename)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("archive", [_zip_archive, _tar_archive], ids=["zip", "tar.gz"])
+@pytest.mark.parametrize("concurrency", [1, 4], ids=["serial", "concurrent"])
+def test_upload_from_archive(
+    s3_bucket: str, mock_source_files: dict[str, bytes], archive: Callable[[dict], bytes], concurrency: int
+):
+    boto3.client("s3").put_object(Bucket=s3_bucket, Key="site.archive", Body=archive(mock_source_files))
+    session = MockTargetSession()
+
+    with aws_s3.S3Source(f"s3://{s3_bucket}/site.archive") as source:
+        actions.upload(source, session, "1.0", None, concurrency=concurrency)
+
+    assert session.files == {("1.0", filename): content for filename, content in mock_source_files.items()}
+
+
+def test_tar_is_streamed(s3_bucket: str, mock_source_files: dict[str, bytes]):
+    boto3.client("s3").put_object(Bucket=s3_bucket, Key="site.tar.gz", Body=_tar_archive(mock_source_files))
+
+    with aws_s3.S3Source(f"s3://{s3_bucket}/site.tar.gz") as source:
+        assert source.requires_sequential_read
+        files = iter(source.iter_files())
+        first = next(files)
+        with source.open_file_for_read(first) as file_obj:
+            assert file_obj.read() == mock_source_files[first]
+        second = next(files)
+        with pytest.raises(RuntimeError):
+            source.open_file_for_read(first)
+        with source.open_file_for_read(second) as file_obj:
+            assert file_obj.read() == mock_source_files[second]
+
+
+def test_zip_is_read_with_ranges(s3_bucket: str, mock_source_files: dict[str, bytes]):
+    boto3.client("s3").put_object(Bucket=s3_bucket, Key="site.zip", Body=_zip_archive(mock_source_files))
+
+    with aws_s3.S3Source(f"s3://{s3_bucket}/site.zip") as source:
+        assert not source.requires_sequential_read
+        assert set(source.iter_files()) == set(mock_source_files)
+        for filename in reversed(list(mock_source_files)):
+            with source.open_file_for_read(filename) as file_obj:
+                assert file_obj.read() == mock_source_files[filename]
+
+
+def test_not_an_archive(s3_bucket: str):
+    boto3.client("s3").put_object(Bucket=s3_bucket, Key="site.txt", Body=b"not an archive at all" * 100)
+
+    with pytest.raises(ValueError):
+        aws_s3.S3Source(f"s3://{s3_bucket}/site.txt")
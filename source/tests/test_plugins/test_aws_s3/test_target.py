@@ -1,9 +1,12 @@
+import gzip
+import hashlib
 import io
 import itertools
 import uuid
 from copy import deepcopy
 
 import boto3
+import boto3.s3.transfer
 import mypy_boto3_s3.type_defs
 import pytest
 from mypy_boto3_s3.client import S3Client
@@ -109,6 +112,49 @@ def test_start_version_creates_version_in_deployment_spec(existing_site, s3_targ
     assert s3_target_session.deployment_spec.versions["3.0"] == versions.DeploymentVersion(title="Version 3")
 
 
+def test_restarting_version_keeps_old_files_until_close(s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str):
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.0", "1.0")
+        for filename in ("index.html", "old.html", "removed.html"):
+            s3_target_session.upload_file("1.0", filename, io.BytesIO(b"old"))
+    client = boto3.client("s3")
+
+    def version_files() -> dict[str, bytes]:
+        return {
+            item["Key"][len(target_prefix + "1.0/"):]:
+                client.get_object(Bucket=s3_bucket, Key=item["Key"])["Body"].read()
+            for item in client.list_objects_v2(Bucket=s3_bucket, Prefix=target_prefix + "1.0/")["Contents"]
+        }
+
+    s3_target_session = s3_target.start_session()
+    s3_target_session.start_version("1.0", "1.0")
+    # The live version must keep working while it is uploaded
+    assert version_files() == {"index.html": b"old", "old.html": b"old", "removed.html": b"old"}
+    s3_target_session.upload_file("1.0", "index.html", io.BytesIO(b"new"))
+    s3_target_session.delete_file("1.0", "removed.html")
+    assert version_files() == {"index.html": b"new", "old.html": b"old"}
+
+    s3_target_session.close(success=True)
+
+    assert version_files() == {"index.html": b"new"}
+    assert "1.0/old.html" in s3_target_session.changed_paths
+
+
+def test_restarting_version_keeps_old_files_if_session_fails(
+    s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str
+):
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.0", "1.0")
+        s3_target_session.upload_file("1.0", "old.html", io.BytesIO(b"old"))
+
+    s3_target_session = s3_target.start_session()
+    s3_target_session.start_version("1.0", "1.0")
+    s3_target_session.close(success=False)
+
+    client = boto3.client("s3")
+    assert client.get_object(Bucket=s3_bucket, Key=target_prefix + "1.0/old.html")["Body"].read() == b"old"
+
+
 def test_close_success_saves_metadata(
     s3_target: aws_s3.S3Target,
     s3_bucket: str,
@@ -305,7 +351,7 @@ def test_download_from_missing_version(s3_target: aws_s3.S3Target, s3_bucket:str
 def test_iter_files_for_version(s3_target: aws_s3.S3Target, s3_bucket:str, target_prefix: str):
     alias = "1.1"
     s3_target_session = s3_target.start_session()
-    s3_target_session.start_version(alias, alias)
+    s3_target_session.start_version(alias, alias, keep_existing_files=True)
     client = boto3.client("s3")
     client.put_object(Bucket=s3_bucket, Key=target_prefix + "other/bar/a.txt", Body=b"HelloWorld")
     client.put_object(Bucket=s3_bucket, Key=target_prefix + alias + "/foo/b.txt", Body=b"HelloWorld")
@@ -322,4 +368,323 @@ def test_iter_files_for_default(s3_target: aws_s3.S3Target, s3_bucket:str, targe
     client.put_object(Bucket=s3_bucket, Key=target_prefix + "other/bar/b.txt", Body=b"HelloWorld")
 
     all_files = list(s3_target_session.iter_files(abstract.DEFAULT_VERSION))
-    assert all_files == ["a.txt"]
\ No newline at end of file
+    assert all_files == ["a.txt"]
+
+def test_iter_file_details_uses_etag(s3_target: aws_s3.S3Target, s3_bucket:str, target_prefix: str):
+    s3_target_session = s3_target.start_session()
+    s3_target_session.start_version("1.1", "1.1", keep_existing_files=True)
+    content = uuid.uuid4().bytes
+    client = boto3.client("s3")
+    client.put_object(Bucket=s3_bucket, Key=target_prefix + "1.1/foo/b.txt", Body=content)
+
+    all_files = list(s3_target_session.iter_file_details("1.1"))
+    assert all_files == [
+        abstract.FileDetails(filename="foo/b.txt", size=len(content), md5=hashlib.md5(content).hexdigest()),
+    ]
+
+
+def test_close_saves_manifest(s3_target: aws_s3.S3Target, s3_bucket:str, target_prefix: str):
+    content = uuid.uuid4().bytes
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.1", "1.1")
+        s3_target_session.upload_file("1.1", "foo/b.txt", io.BytesIO(content))
+
+    client = boto3.client("s3")
+    result = client.get_object(Bucket=s3_bucket, Key=target_prefix + versions.manifest_filename("1.1"))
+    manifest = versions.VersionManifest.parse_raw(result["Body"].read())
+    assert manifest.files == {
+        "foo/b.txt": versions.ManifestEntry(
+            size=len(content), md5=hashlib.md5(content).hexdigest(), content_type="text/plain"
+        ),
+    }
+
+
+def test_iter_file_details_lists_bucket_with_manifest_details(
+    s3_target: aws_s3.S3Target, s3_bucket:str, target_prefix: str
+):
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.1", "1.1")
+        s3_target_session.upload_file("1.1", "foo/b.txt", io.BytesIO(b"Hello World"))
+    client = boto3.client("s3")
+    # Not in the manifest because it was not written through a session
+    client.put_object(Bucket=s3_bucket, Key=target_prefix + "1.1/foo/c.txt", Body=b"Hello")
+
+    s3_target_session = s3_target.start_session()
+    details = {file.filename: file for file in s3_target_session.iter_file_details("1.1")}
+    assert details.keys() == {"foo/b.txt", "foo/c.txt"}
+    assert details["foo/b.txt"].md5 == s3_target_session.get_manifest("1.1").files["foo/b.txt"].md5
+    assert details["foo/c.txt"].size == 5
+
+
+@pytest.mark.parametrize("full_redeploy", [True, False], ids=["full_redeploy", "delete_version"])
+def test_stale_manifest_does_not_hide_files(
+    s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str, full_redeploy: bool
+):
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.0", "1.0")
+        s3_target_session.upload_file("1.0", "index.html", io.BytesIO(b"Hello World"))
+    # A session which fails after uploading never writes the manifest
+    s3_target_session = s3_target.start_session()
+    s3_target_session.start_version("1.0", "1.0", keep_existing_files=True)
+    s3_target_session.upload_file("1.0", "orphan.html", io.BytesIO(b"Hello World"))
+    s3_target_session.close(success=False)
+
+    with s3_target.start_session() as s3_target_session:
+        if full_redeploy:
+            s3_target_session.start_version("1.0", "1.0")
+        else:
+            s3_target_session.delete_version_or_alias("1.0")
+
+    client = boto3.client("s3")
+    remaining = client.list_objects_v2(Bucket=s3_bucket, Prefix=target_prefix + "1.0/").get("Contents", [])
+    assert remaining == []
+
+
+def test_delete_version_deletes_manifest(s3_target: aws_s3.S3Target, s3_bucket:str, target_prefix: str):
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.1", "1.1")
+        s3_target_session.upload_file("1.1", "foo/b.txt", io.BytesIO(b"Hello World"))
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.delete_version_or_alias("1.1")
+
+    client = boto3.client("s3")
+    with pytest.raises(client.exceptions.NoSuchKey):
+        client.get_object(Bucket=s3_bucket, Key=target_prefix + versions.manifest_filename("1.1"))
+
+
+@pytest.mark.parametrize("file_count", [3, 2001], ids=["one_batch", "many_batches"])
+def test_delete_files(s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str, file_count: int):
+    s3_target_session = s3_target.start_session()
+    s3_target_session.start_version("1.1", "1.1")
+    client = boto3.client("s3")
+    filenames = [f"dir/file_{i}.txt" for i in range(file_count)]
+    for filename in filenames:
+        client.put_object(Bucket=s3_bucket, Key=f"{target_prefix}1.1/{filename}", Body=b"")
+    client.put_object(Bucket=s3_bucket, Key=f"{target_prefix}1.1/keep.txt", Body=b"")
+
+    s3_target_session.delete_files("1.1", filenames + ["does_not_exist.txt"])
+
+    remaining = [item["Key"] for item in client.list_objects_v2(Bucket=s3_bucket, Prefix=target_prefix)["Contents"]]
+    assert remaining == [f"{target_prefix}1.1/keep.txt"]
+
+
+def test_delete_files_raises_version_not_found(s3_target: aws_s3.S3Target):
+    s3_target_session = s3_target.start_session()
+    with pytest.raises(abstract.VersionNotFound):
+        s3_target_session.delete_files("version doesn't exist", ["don't care.txt"])
+
+
+def test_copy_file(s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str):
+    content = uuid.uuid4().bytes
+    with s3_target.start_session() as s3_target_session:
+        s3_target_session.start_version("1.1", "1.1")
+        s3_target_session.set_alias("latest", versions.DeploymentAlias(version_id="1.1", redirect_mechanisms=set()))
+        s3_target_session.upload_file("1.1", "404.html", io.BytesIO(content))
+        s3_target_session.copy_file("1.1", "404.html", "latest", "404.html")
+
+    client = boto3.client("s3")
+    copied_object = client.get_object(Bucket=s3_bucket, Key=target_prefix + "latest/404.html")
+    assert copied_object["Body"].read() == content
+    assert copied_object["ContentType"] == "text/html"
+
+
+def test_copy_file_into_alias_uses_redirect_cache_control(s3_bucket: str, target_prefix: str):
+    target = aws_s3.target_from_url(f"s3://{s3_bucket}/{target_prefix}?compress=*.html")
+    content = b"<html>" + b"not found " * 1000 + b"</html>"
+    with target.start_session() as s3_target_session:
+        s3_target_session.set_cache_policy(shared_implementations.CachePolicy({"*.html": "max-age=3600"}, "no-cache"))
+        s3_target_session.start_version("1.1", "1.1")
+        s3_target_session.set_alias("latest", versions.DeploymentAlias(version_id="1.1", redirect_mechanisms=set()))
+        s3_target_session.upload_file("1.1", "404.html", io.BytesIO(content))
+        s3_target_session.copy_file("1.1", "404.html", "latest", "404.html")
+        s3_target_session.copy_file("1.1", "404.html", "1.1", "copy.html")
+
+    client: S3Client = boto3.client("s3")
+    copied_object = client.get_object(Bucket=s3_bucket, Key=target_prefix + "latest/404.html")
+    assert copied_object["CacheControl"] == "no-cache"
+    assert copied_object["ContentType"] == "text/html"
+    assert copied_object["ContentEncoding"].split(",")[0] == "gzip"
+    assert gzip.decompress(copied_object["Body"].read()) == content
+    # Copies within a version keep the source's headers
+    assert client.head_object(Bucket=s3_bucket, Key=target_prefix + "1.1/copy.html")["CacheControl"] == "max-age=3600"
+
+
+def test_copy_missing_file_raises_file_not_found(s3_target: aws_s3.S3Target):
+    s3_target_session = s3_target.start_session()
+    s3_target_session.start_version("1.1", "1.1")
+    with pytest.raises(FileNotFoundError):
+        s3_target_session.copy_file("1.1", "404.html", "1.1", "copy.html")
+
+
+def test_target_from_url_transfer_config():
+    target = aws_s3.target_from_url("s3://bucket/prefix?multipart_threshold=64MB&multipart_chunksize=8mb&max_concurrency=3")
+    assert target._bucket == "bucket"
+    assert target._prefix_key == "prefix/"
+    assert target._transfer_config.multipart_threshold == 64 * 1024 * 1024
+    assert target._transfer_config.multipart_chunksize == 8 * 1024 * 1024
+    assert target._transfer_config.max_request_concurrency == 3
+
+    assert aws_s3.target_from_url("s3://bucket/prefix")._transfer_config is None
+    with pytest.raises(ValueError):
+        aws_s3.target_from_url("s3://bucket/prefix?not_an_option=1")
+
+
+def test_multipart_upload_records_whole_file_md5(s3_bucket: str, target_prefix: str):
+    target = aws_s3.S3Target(
+        bucket=s3_bucket,
+        prefix_key=target_prefix,
+        transfer_config=boto3.s3.transfer.TransferConfig(
+            multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024
+        ),
+    )
+    content = b"x" * (6 * 1024 * 1024)
+    session = target.start_session()
+    session.start_version("1.0", "1.0")
+    session.upload_file("1.0", "big.bin", io.BytesIO(content))
+    session.upload_file("1.0", "small.html", io.BytesIO(b"small"))
+    session.close(success=True)
+
+    client: S3Client = boto3.client("s3")
+    head = client.head_object(Bucket=s3_bucket, Key=f"{target_prefix}1.0/big.bin")
+    # Multipart ETags have the number of parts after a "-"
+    assert head["ETag"].endswith('-2"')
+    manifest = session.get_manifest("1.0")
+    assert manifest.files["big.bin"].md5 == hashlib.md5(content).hexdigest()
+    assert manifest.files["small.html"].md5 == hashlib.md5(b"small").hexdigest()
+
+
+def test_small_seekable_upload_is_single_put(s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str):
+    session = s3_target.start_session()
+    session.start_version("1.0", "1.0")
+    session._transfer_manager.upload = None  # Would fail if the transfer manager were used
+
+    session.upload_file("1.0", "index.html", io.BytesIO(b"<html></html>"))
+
+    client: S3Client = boto3.client("s3")
+    result = client.get_object(Bucket=s3_bucket, Key=f"{target_prefix}1.0/index.html")
+    assert result["Body"].read() == b"<html></html>"
+    assert result["ContentType"] == "text/html"
+    assert session.get_manifest("1.0").files["index.html"].md5 == hashlib.md5(b"<html></html>").hexdigest()
+
+
+def _enforce_conditional_puts(client: S3Client) -> None:
+    """moto ignores If-Match and If-None-Match on PutObject, so check them as S3 would."""
+    def check_condition(params: dict, **_) -> None:
+        if "IfMatch" not in params and "IfNoneMatch" not in params:
+            return
+        try:
+            etag = client.head_object(Bucket=params["Bucket"], Key=params["Key"])["ETag"]
+        except client.exceptions.ClientError:
+            etag = None
+        if ("IfMatch" in params and params["IfMatch"] != etag) or ("IfNoneMatch" in params and etag is not None):
+            raise client.exceptions.ClientError({"Error": {"Code": "PreconditionFailed"}}, "PutObject")
+
+    client.meta.events.register("provide-client-params.s3.PutObject", check_condition)
+
+
+def test_concurrent_sessions_merge_deployments(s3_bucket: str, target_prefix: str, s3_target: aws_s3.S3Target):
+    first = s3_target.start_session()
+    second = s3_target.start_session()
+    for session in (first, second):
+        _enforce_conditional_puts(session._client)
+    first.start_version("1.0", "Version 1")
+    second.start_version("2.0", "Version 2")
+    second.set_alias("latest", versions.DeploymentAlias(version_id="2.0", redirect_mechanisms={"html"}))
+
+    first.close(success=True)
+    second.close(success=True)
+
+    client = boto3.client("s3")
+    deployments = versions.DeploymentSpec.parse_raw(
+        client.get_object(Bucket=s3_bucket, Key=target_prefix + versions.DEPLOYMENTS_FILENAME)["Body"].read()
+    )
+    assert deployments.versions == {
+        "1.0": versions.DeploymentVersion(title="Version 1"),
+        "2.0": versions.DeploymentVersion(title="Version 2"),
+    }
+    assert list(deployments.aliases) == ["latest"]
+    mike_versions = versions.MikeVersions.parse_raw(
+        client.get_object(Bucket=s3_bucket, Key=target_prefix + versions.MIKE_VERSIONS_FILENAME)["Body"].read()
+    )
+    assert {version.version for version in mike_versions.__root__} == {"1.0", "2.0"}
+
+
+def test_deployments_written_with_conditional_headers(s3_target: aws_s3.S3Target):
+    """The real client validates and serializes the conditions: nothing here is faked"""
+    sent_conditions = []
+
+    def record_conditions(request, **_) -> None:
+        if request.url.endswith(versions.DEPLOYMENTS_FILENAME):
+            sent_conditions.append(tuple(
+                value.decode() if isinstance(value, bytes) else value
+                for value in (request.headers.get("If-None-Match"), request.headers.get("If-Match"))
+            ))
+
+    for version_id in ("1.0", "1.1"):
+        session = s3_target.start_session()
+        session._client.meta.events.register("before-send.s3.PutObject", record_conditions)
+        session.start_version(version_id, version_id)
+        session.close(success=True)
+
+    assert sent_conditions[0] == ("*", None)
+    assert sent_conditions[1][0] is None and sent_conditions[1][1] is not None
+
+
+def test_upload_file_stores_compressed(s3_bucket: str, target_prefix: str):
+    target = aws_s3.target_from_url(f"s3://{s3_bucket}/{target_prefix}?compress=*.html&multipart_threshold=5MB")
+    content = b"<html>" + b"hello " * 1000 + b"</html>"
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(content))
+        session.upload_file("1.0", "small.html", io.BytesIO(b"<html></html>"))
+
+    client: S3Client = boto3.client("s3")
+    result = client.get_object(Bucket=s3_bucket, Key=f"{target_prefix}1.0/index.html")
+    # moto keeps the aws-chunked encoding of the request which S3 itself removes
+    assert result["ContentEncoding"].split(",")[0] == "gzip"
+    assert gzip.decompress(result["Body"].read()) == content
+    result = client.get_object(Bucket=s3_bucket, Key=f"{target_prefix}1.0/small.html")
+    assert "gzip" not in result.get("ContentEncoding", "")
+    assert result["Body"].read() == b"<html></html>"
+    # The manifest describes the original so it still matches the source
+    entry = session.get_manifest("1.0").files["index.html"]
+    assert (entry.size, entry.md5) == (len(content), hashlib.md5(content).hexdigest())
+
+
+def test_upload_file_sets_cache_control(s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str):
+    with s3_target.start_session() as session:
+        session.set_cache_policy(
+            shared_implementations.CachePolicy({"*.css": "max-age=31536000, immutable"}, "no-cache")
+        )
+        session.start_version("1.0", "1.0")
+        session.set_alias("latest", versions.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"}))
+        session.upload_file("1.0", "style.css", io.BytesIO(b"body {}"))
+        session.upload_file("1.0", "index.html", io.BytesIO(b"<html></html>"))
+        session.upload_file("latest", "index.html", io.BytesIO(b"<html></html>"))
+
+    client: S3Client = boto3.client("s3")
+
+    def cache_control(key: str):
+        return client.head_object(Bucket=s3_bucket, Key=target_prefix + key).get("CacheControl")
+
+    assert cache_control("1.0/style.css") == "max-age=31536000, immutable"
+    assert cache_control("1.0/index.html") is None
+    assert cache_control("latest/index.html") == "no-cache"
+    assert cache_control(versions.MIKE_VERSIONS_FILENAME) == "no-cache"
+
+
+def test_changed_paths(s3_target: aws_s3.S3Target, s3_bucket: str, target_prefix: str):
+    with s3_target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"<html></html>"))
+        session.upload_file("1.0", "old.html", io.BytesIO(b"<html></html>"))
+        session.upload_file(abstract.DEFAULT_VERSION, "index.html", io.BytesIO(b"<html></html>"))
+
+    with s3_target.start_session() as session:
+        session.copy_file("1.0", "index.html", "1.0", "copy.html")
+        session.delete_files("1.0", ["old.html"])
+        assert session.changed_paths == {"1.0/copy.html", "1.0/old.html"}
+
+    assert session.changed_paths == {
+        "1.0/copy.html", "1.0/old.html", versions.DEPLOYMENTS_FILENAME, versions.MIKE_VERSIONS_FILENAME,
+    }
@@ -60,6 +60,20 @@ def test_create_alias(mock_session: MockTargetSession, mock_source_files: dict[s
         assert f'"{link_url}"'.encode("utf8") in content
 
 
+def test_create_alias_copies_404_page(mock_session: MockTargetSession):
+    mock_session.files[("1.1", "404.html")] = b"not found"
+    mock_session.set_alias("latest", abstract.DeploymentAlias(version_id="1.1", redirect_mechanisms=set()))
+
+    redirect = html_redirect.HtmlRedirect()
+    redirect.create_redirect(
+        session=mock_session,
+        alias="latest",
+        version_id="1.1",
+    )
+
+    assert mock_session.files[("latest", "404.html")] == b"not found"
+
+
 def test_creating_alias_deletes_files(mock_session: MockTargetSession, mock_source_files: dict[str, bytes]):
     mock_session.set_alias("latest", abstract.DeploymentAlias(version_id="1.1", redirect_mechanisms=set()))
     mock_session.files[("latest", "index.html")] = b'' # This should get overwritten
@@ -0,0 +1,561 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from mkdocs_deploy import abstract, actions, versions
+from mkdocs_deploy.plugins import html_redirect, local_filesystem, redirects_file
+
+
+@pytest.fixture()
+def source_dir(tmp_path: Path, mock_source_files: dict[str, bytes]) -> Path:
+    source_path = tmp_path / "source"
+    for filename, content in mock_source_files.items():
+        file_path = source_path / filename
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    return source_path
+
+
+@pytest.fixture()
+def mock_source_files() -> dict[str, bytes]:
+    return {
+        "index.html": str(uuid.uuid4()).encode(),
+        "subdir/foo.html": str(uuid.uuid4()).encode(),
+        "subdir/foo.txt": str(uuid.uuid4()).encode(),
+        "subdir/deeper/bar.css": str(uuid.uuid4()).encode(),
+    }
+
+
+@pytest.fixture()
+def target_dir(tmp_path: Path) -> Path:
+    return tmp_path / "target"
+
+
+def test_enable_plugin():
+    local_filesystem.enable_plugin()
+
+    assert isinstance(abstract.target_for_url("/tmp/foo"), local_filesystem.LocalFileTreeTarget)
+    assert isinstance(abstract.target_for_url("file:///tmp/foo"), local_filesystem.LocalFileTreeTarget)
+
+
+def test_source_iter_files(source_dir: Path, mock_source_files: dict[str, bytes]):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    assert set(source.iter_files()) == set(mock_source_files)
+
+
+def test_source_follows_symlinks_and_knows_sizes(source_dir: Path, mock_source_files: dict[str, bytes]):
+    (source_dir / "linked").symlink_to(source_dir / "subdir", target_is_directory=True)
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+
+    files = set(source.iter_files())
+
+    assert files == set(mock_source_files) | {"linked/foo.html", "linked/foo.txt", "linked/deeper/bar.css"}
+    assert source.get_file_size("linked/deeper/bar.css") == len(mock_source_files["subdir/deeper/bar.css"])
+
+
+def test_target_iter_files_skips_symlinks(source_dir: Path, target_dir: Path, mock_source_files: dict[str, bytes]):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+    (target_dir / "1.0" / "linked").symlink_to(target_dir / "1.0" / "subdir", target_is_directory=True)
+    (target_dir / "1.0" / "linked.html").symlink_to(target_dir / "1.0" / "index.html")
+
+    with target.start_session() as session:
+        assert set(session.iter_files("1.0")) == set(mock_source_files)
+
+
+@pytest.mark.parametrize("concurrency", [1, 4], ids=["serial", "concurrent"])
+def test_upload(source_dir: Path, target_dir: Path, mock_source_files: dict[str, bytes], concurrency: int):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+
+    with target.start_session() as session:
+        assert session.supports_concurrent_upload
+        actions.upload(source=source, target=session, version_id="1.0", title="Version 1", concurrency=concurrency)
+
+    for filename, content in mock_source_files.items():
+        assert (target_dir / "1.0" / filename).read_bytes() == content
+    deployments = versions.DeploymentSpec.parse_file(target_dir / versions.DEPLOYMENTS_FILENAME)
+    assert deployments.versions == {"1.0": versions.DeploymentVersion(title="Version 1")}
+
+
+def test_close_non_success_does_not_save_metadata(target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    session = target.start_session()
+    session.start_version("1.0", "Version 1")
+    session.close(success=False)
+
+    assert not (target_dir / versions.DEPLOYMENTS_FILENAME).exists()
+
+
+def test_delete_version(source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+        actions.upload(source=source, target=session, version_id="1.1", title=None)
+
+    with target.start_session() as session:
+        session.delete_version_or_alias("1.0")
+
+    assert not (target_dir / "1.0").exists()
+    assert (target_dir / "1.1" / "index.html").exists()
+    deployments = json.loads((target_dir / versions.DEPLOYMENTS_FILENAME).read_bytes())
+    assert set(deployments["versions"]) == {"1.1"}
+
+
+def test_changed_paths_only_empty_if_nothing_changed(source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+    # Not recorded path by path, so anything may have changed
+    assert session.changed_paths is None
+
+    with target.start_session() as session:
+        list(session.iter_files("1.0"))
+        session.get_manifest("1.0")
+    assert session.changed_paths == set()
+
+
+def test_deployment_spec_is_reused_until_changed(target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        spec = session.deployment_spec
+        assert session.deployment_spec is spec
+
+        session.set_alias("latest", versions.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"}))
+
+        assert session.deployment_spec is not spec
+        assert list(session.deployment_spec.aliases_for_version("1.0")) == ["latest"]
+        assert spec.aliases == {}
+
+
+def test_iter_files_for_default_only_lists_root(source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+        with source.open_file_for_read("index.html") as file_obj:
+            session.upload_file(abstract.DEFAULT_VERSION, "index.html", file_obj)
+
+        assert list(session.iter_files(abstract.DEFAULT_VERSION)) == ["index.html"]
+
+
+def test_redeploy_uses_manifest(source_dir: Path, target_dir: Path, mock_source_files: dict[str, bytes]):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+
+    manifest = versions.VersionManifest.parse_file(target_dir / versions.manifest_filename("1.0"))
+    assert set(manifest.files) == set(mock_source_files)
+
+    (source_dir / "subdir" / "foo.txt").write_bytes(b"changed")
+    (source_dir / "index.html").unlink()
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+
+    assert (target_dir / "1.0" / "subdir" / "foo.txt").read_bytes() == b"changed"
+    assert not (target_dir / "1.0" / "index.html").exists()
+    manifest = versions.VersionManifest.parse_file(target_dir / versions.manifest_filename("1.0"))
+    assert set(manifest.files) == set(mock_source_files) - {"index.html"}
+    assert manifest.files["subdir/foo.txt"].size == len(b"changed")
+
+
+def test_copy_file_links_without_sharing_later_changes(target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.start_version("1.1", "1.1")
+        session.upload_file("1.0", "404.html", io.BytesIO(b"not found"))
+        session.copy_file("1.0", "404.html", "1.1", "404.html")
+
+        assert session.download_file("1.1", "404.html").read() == b"not found"
+        assert session._path_for_file("1.0", "404.html").samefile(session._path_for_file("1.1", "404.html"))
+
+        session.upload_file("1.1", "404.html", io.BytesIO(b"changed"))
+
+    assert (target_dir / "1.0" / "404.html").read_bytes() == b"not found"
+    assert (target_dir / "1.1" / "404.html").read_bytes() == b"changed"
+    manifest = versions.VersionManifest.parse_file(target_dir / versions.manifest_filename("1.1"))
+    assert manifest.files["404.html"].size == len(b"changed")
+
+
+@pytest.mark.parametrize("link_files", [False, True], ids=["copy", "link"])
+def test_upload_local_file_without_reading_it(
+    source_dir: Path, target_dir: Path, mock_source_files: dict[str, bytes], link_files: bool
+):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(f"file://{target_dir}?link_files={link_files}")
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+
+    for filename, content in mock_source_files.items():
+        assert (target_dir / "1.0" / filename).read_bytes() == content
+        assert (target_dir / "1.0" / filename).samefile(source_dir / filename) == link_files
+    # Hashing is left until the manifest is read, and even then is not saved: reading must not write
+    manifest_path = target_dir / versions.manifest_filename("1.0")
+    manifest = versions.VersionManifest.parse_file(manifest_path)
+    assert manifest.files["index.html"].md5 is None
+    assert manifest.files["index.html"].size == len(mock_source_files["index.html"])
+    expected_md5 = hashlib.md5(mock_source_files["index.html"]).hexdigest()
+    deployments_path = target_dir / versions.DEPLOYMENTS_FILENAME
+    written = manifest_path.stat().st_mtime_ns, deployments_path.stat().st_mtime_ns
+    with target.start_session() as session:
+        assert session.get_manifest("1.0").files["index.html"].md5 == expected_md5
+        assert [file.md5 for file in session.iter_file_details("1.0") if file.filename == "index.html"] == [
+            expected_md5
+        ]
+    assert versions.VersionManifest.parse_file(manifest_path) == manifest
+    assert (manifest_path.stat().st_mtime_ns, deployments_path.stat().st_mtime_ns) == written
+
+
+def test_upload_records_md5_given_by_caller(source_dir: Path, target_dir: Path, mock_source_files: dict[str, bytes]):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    expected_md5 = hashlib.md5(mock_source_files["index.html"]).hexdigest()
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        with source.open_file_for_read("index.html") as file_obj:
+            session.upload_file("1.0", "index.html", file_obj, md5=expected_md5)
+
+    manifest = versions.VersionManifest.parse_file(target_dir / versions.manifest_filename("1.0"))
+    assert manifest.files["index.html"].md5 == expected_md5
+
+
+def test_deduplicate_links_identical_files_between_versions(source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+
+    (source_dir / "index.html").write_bytes(b"changed")
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.1", title=None, deduplicate=True)
+
+    assert (target_dir / "1.1" / "subdir" / "foo.txt").samefile(target_dir / "1.0" / "subdir" / "foo.txt")
+    assert not (target_dir / "1.1" / "index.html").samefile(target_dir / "1.0" / "index.html")
+    assert (target_dir / "1.1" / "index.html").read_bytes() == b"changed"
+
+
+def test_target_rejects_unknown_url_option(target_dir: Path):
+    with pytest.raises(ValueError):
+        local_filesystem.LocalFileTreeTarget(f"file://{target_dir}?hard_links=true")
+
+
+def test_compressed_variants_are_kept_with_their_file(target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(f"file://{target_dir}?compress=*.html&compress_encodings=gzip,br")
+    content = b"<html>" + b"hello " * 1000 + b"</html>"
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.start_version("1.1", "1.1")
+        session.upload_file("1.0", "index.html", io.BytesIO(content))
+        session.upload_file("1.0", "small.html", io.BytesIO(b"<html></html>"))
+        session.copy_file("1.0", "index.html", "1.1", "index.html")
+
+    assert gzip.decompress((target_dir / "1.0" / "index.html.gz").read_bytes()) == content
+    assert (target_dir / "1.0" / "index.html.br").exists()
+    assert not (target_dir / "1.0" / "small.html.gz").exists()
+    assert (target_dir / "1.1" / "index.html.gz").samefile(target_dir / "1.0" / "index.html.gz")
+
+    with target.start_session() as session:
+        assert sorted(session.iter_files("1.0")) == ["index.html", "small.html"]
+        session.delete_files("1.0", ["index.html"])
+
+    assert sorted(path.name for path in (target_dir / "1.0").iterdir()) == ["small.html"]
+
+
+def test_symlink_alias(source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+        actions.upload(source=source, target=session, version_id="1.1", title=None)
+        actions.create_alias(session, "latest", "1.0", ["symlink"])
+
+        assert (target_dir / "latest").is_symlink()
+        assert os.readlink(target_dir / "latest") == "1.0"
+        assert list(session.iter_files("latest")) == []
+
+        actions.create_alias(session, "latest", "1.1", ["symlink"])
+        assert os.readlink(target_dir / "latest") == "1.1"
+        assert not list(target_dir.glob(".latest.*"))
+
+        with pytest.raises(ValueError):
+            session.upload_file("latest", "index.html", io.BytesIO(b"would overwrite 1.1"))
+
+        actions.delete_alias(session, "latest")
+        assert not (target_dir / "latest").is_symlink()
+
+    assert (target_dir / "1.1" / "index.html").exists()
+
+
+def test_symlink_refuses_populated_alias(target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.set_alias("latest", abstract.DeploymentAlias(version_id="1.0", redirect_mechanisms={"html"}))
+        session.upload_file("latest", "index.html", io.BytesIO(b"redirect"))
+
+        with pytest.raises(ValueError):
+            local_filesystem.LocalSymlinkRedirect().create_redirect(session, "latest", "1.0")
+        with pytest.raises(ValueError):
+            local_filesystem.LocalSymlinkRedirect().create_redirect(session, abstract.DEFAULT_VERSION, "1.0")
+        assert (target_dir / "latest" / "index.html").read_bytes() == b"redirect"
+
+
+def test_create_alias_without_mechanisms_skips_opt_in(target_dir: Path, alias: abstract.Version):
+    html_redirect.enable_plugin()
+    redirects_file.enable_plugin()
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"page"))
+        actions.create_alias(session, alias, "1.0", mechanisms=None)
+
+        spec = session.deployment_spec
+        created = spec.default_version if alias is abstract.DEFAULT_VERSION else spec.aliases[alias]
+        assert created.redirect_mechanisms == {"html"}
+    assert not (target_dir / "latest").is_symlink()
+    assert not (target_dir / "_redirects").exists()
+
+
+@pytest.mark.parametrize("remove", ["delete_alias", "delete_version"])
+def test_removing_default_keeps_the_site(target_dir: Path, remove: str):
+    html_redirect.enable_plugin()
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        for version in ("1.0", "2.0"):
+            session.start_version(version, version)
+            session.upload_file(version, "index.html", io.BytesIO(version.encode()))
+        actions.create_alias(session, abstract.DEFAULT_VERSION, "1.0", ["html"])
+
+    with target.start_session() as session:
+        if remove == "delete_alias":
+            actions.delete_alias(session, abstract.DEFAULT_VERSION)
+        else:
+            actions.delete_version(session, "1.0")
+
+    with target.start_session() as session:
+        spec = session.deployment_spec
+        assert spec.default_version is None
+        assert "2.0" in spec.versions
+    assert not (target_dir / "index.html").exists()
+    assert (target_dir / "2.0" / "index.html").read_bytes() == b"2.0"
+
+
+def _join_cleanup(session: abstract.TargetSession) -> None:
+    for thread in session._cleanup_threads:
+        thread.join()
+
+
+def test_redeploy_is_published_on_close(tmp_path: Path, target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"old"))
+
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"new"))
+        # The live version is untouched until the session closes
+        assert (target_dir / "1.0" / "index.html").read_bytes() == b"old"
+    _join_cleanup(session)
+
+    assert (target_dir / "1.0" / "index.html").read_bytes() == b"new"
+    assert list((tmp_path / ".target.mkdocs-deploy" / "staging").iterdir()) == []
+    assert list((tmp_path / ".target.mkdocs-deploy" / "trash").iterdir()) == []
+
+
+def test_failed_deploy_leaves_live_version(tmp_path: Path, target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"old"))
+
+    session = target.start_session()
+    session.start_version("1.0", "1.0")
+    session.upload_file("1.0", "index.html", io.BytesIO(b"broken"))
+    session.close(success=False)
+    _join_cleanup(session)
+
+    assert (target_dir / "1.0" / "index.html").read_bytes() == b"old"
+    assert list((tmp_path / ".target.mkdocs-deploy" / "staging").iterdir()) == []
+
+
+def test_failed_publish_restores_live_version(monkeypatch: pytest.MonkeyPatch, target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"old"))
+
+    session = target.start_session()
+    session.start_version("1.0", "1.0")
+    session.upload_file("1.0", "index.html", io.BytesIO(b"new"))
+    rename = os.rename
+
+    def fail_to_publish(src, dst):
+        if Path(src).parent.name == "staging":
+            raise OSError("Simulated failure")
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", fail_to_publish)
+    with pytest.raises(OSError):
+        session.close(success=True)
+    monkeypatch.undo()
+    _join_cleanup(session)
+
+    assert (target_dir / "1.0" / "index.html").read_bytes() == b"old"
+
+
+def test_working_files_are_kept_outside_the_site(tmp_path: Path, target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"content"))
+    _join_cleanup(session)
+
+    assert (tmp_path / ".target.mkdocs-deploy").is_dir()
+    assert not (target_dir / local_filesystem._WORKING_DIR).exists()
+
+
+def test_reading_creates_no_working_files(tmp_path: Path, source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        actions.upload(source=source, target=session, version_id="1.0", title=None)
+    _join_cleanup(session)
+    shutil.rmtree(tmp_path / ".target.mkdocs-deploy")
+
+    with target.start_session() as session:
+        list(session.iter_file_details("1.0"))
+        session.get_manifest("1.0")
+
+    assert not (tmp_path / ".target.mkdocs-deploy").exists()
+
+
+def test_file_system_root_is_not_a_target():
+    with pytest.raises(ValueError, match="Cannot use / as a target"):
+        local_filesystem.LocalFileTreeTarget("/").start_session()
+
+
+def test_keep_existing_files_stages_links(tmp_path: Path, target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"index"))
+        session.upload_file("1.0", "sub/page.html", io.BytesIO(b"page"))
+
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0", keep_existing_files=True)
+        assert session._path_for_file("1.0", "sub/page.html").samefile(target_dir / "1.0" / "sub" / "page.html")
+        session.upload_file("1.0", "index.html", io.BytesIO(b"changed"))
+
+    assert (target_dir / "1.0" / "index.html").read_bytes() == b"changed"
+    assert (target_dir / "1.0" / "sub" / "page.html").read_bytes() == b"page"
+
+
+def test_archive_sources_give_sizes_and_memory_files(tmp_path: Path, mock_source_files: dict[str, bytes]):
+    tar_path = tmp_path / "site.tar"
+    with tarfile.open(tar_path, "w") as archive:
+        for filename, content in mock_source_files.items():
+            info = tarfile.TarInfo("site/" + filename)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    zip_path = tmp_path / "site.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for filename, content in mock_source_files.items():
+            archive.writestr("site/" + filename, content)
+
+    for path in (tar_path, zip_path):
+        with local_filesystem.open_source(str(path)) as source:
+            assert set(source.iter_files()) == set(mock_source_files)
+            for filename, content in mock_source_files.items():
+                assert source.get_file_size(filename) == len(content)
+                with source.open_file_for_read(filename) as file_obj:
+                    assert isinstance(file_obj, io.BytesIO)
+                    assert file_obj.read() == content
+
+
+def test_delete_version_moves_to_trash_without_following_symlinks(tmp_path: Path, target_dir: Path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "keep.txt").write_bytes(b"keep")
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        for i in range(20):
+            session.upload_file("1.0", f"dir_{i % 3}/sub_{i % 2}/file_{i}.html", io.BytesIO(b"content"))
+    (target_dir / "1.0" / "dir_0" / "outside").symlink_to(outside, target_is_directory=True)
+
+    with target.start_session() as session:
+        session.delete_version_or_alias("1.0")
+        assert not (target_dir / "1.0").exists()
+        _join_cleanup(session)
+
+    assert list((tmp_path / ".target.mkdocs-deploy" / "trash").iterdir()) == []
+    assert (outside / "keep.txt").read_bytes() == b"keep"
+
+
+def test_delete_files_prunes_empty_directories(target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    with target.start_session() as session:
+        session.start_version("1.0", "1.0")
+        for filename in ("a/b/c/1.html", "a/b/c/2.html", "a/b/3.html", "a/d/4.html", "5.html"):
+            session.upload_file("1.0", filename, io.BytesIO(b"content"))
+
+    with target.start_session() as session:
+        session.delete_files("1.0", ["a/b/c/1.html", "a/b/c/2.html", "a/d/4.html", "5.html"])
+
+    assert sorted(str(path.relative_to(target_dir / "1.0")) for path in (target_dir / "1.0").rglob("*")) == [
+        "a", "a/b", "a/b/3.html",
+    ]
+
+
+def test_concurrent_sessions_merge_deployments(source_dir: Path, target_dir: Path):
+    source = local_filesystem.LocalFileTreeSource(source_dir)
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+    first = target.start_session()
+    second = target.start_session()
+    actions.upload(source=source, target=first, version_id="1.0", title=None)
+    actions.upload(source=source, target=second, version_id="2.0", title=None)
+    second.set_alias("latest", versions.DeploymentAlias(version_id="2.0", redirect_mechanisms={"html"}))
+
+    second.close(success=True)
+    first.close(success=True)
+
+    deployments = versions.DeploymentSpec.parse_file(target_dir / versions.DEPLOYMENTS_FILENAME)
+    assert set(deployments.versions) == {"1.0", "2.0"}
+    assert deployments.aliases["latest"].version_id == "2.0"
+    assert (target_dir / "1.0" / "index.html").exists()
+    assert (target_dir / "2.0" / "index.html").exists()
+
+
+def test_parallel_deploys_keep_every_version(source_dir: Path, target_dir: Path):
+    target = local_filesystem.LocalFileTreeTarget(str(target_dir))
+
+    def deploy(version_id: str) -> None:
+        with target.start_session() as session:
+            actions.upload(
+                source=local_filesystem.LocalFileTreeSource(source_dir), target=session, version_id=version_id,
+                title=None,
+            )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(deploy, [f"1.{i}" for i in range(8)]))
+
+    deployments = versions.DeploymentSpec.parse_file(target_dir / versions.DEPLOYMENTS_FILENAME)
+    assert set(deployments.versions) == {f"1.{i}" for i in range(8)}
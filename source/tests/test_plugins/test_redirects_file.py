@@ -0,0 +1,70 @@
+import pytest
+
+from mkdocs_deploy import abstract, actions
+from mkdocs_deploy.plugins import redirects_file
+from ..mock_plugin import MockTargetSession
+
+
+@pytest.fixture()
+def mock_session(mock_session: MockTargetSession) -> MockTargetSession:
+    redirects_file.enable_plugin()
+    return mock_session
+
+
+def _redirects(session: MockTargetSession) -> list[str]:
+    content = session.files[(abstract.DEFAULT_VERSION, redirects_file.REDIRECTS_FILENAME)].decode("utf-8")
+    return [line for line in content.splitlines() if not line.startswith("#")]
+
+
+def test_enable_plugin():
+    redirects_file.enable_plugin()
+    assert isinstance(abstract._SHARED_REDIRECT_MECHANISMS["redirects_file"], redirects_file.RedirectsFile)
+
+
+def test_create_alias_writes_single_file(mock_session: MockTargetSession):
+    actions.create_alias(mock_session, "latest", "1.1", ["redirects_file"])
+    actions.create_alias(mock_session, abstract.DEFAULT_VERSION, "1.0", ["redirects_file"])
+
+    assert _redirects(mock_session) == [
+        "/  /1.0/  302",
+        "/latest  /1.1/  302",
+        "/latest/*  /1.1/:splat  302",
+    ]
+    # Nothing is written into the alias itself
+    assert list(mock_session.iter_files("latest")) == []
+
+
+def test_moving_alias_rewrites_file(mock_session: MockTargetSession):
+    actions.create_alias(mock_session, "latest", "1.0", ["redirects_file"])
+    actions.create_alias(mock_session, "stable", "1.0", ["redirects_file"])
+    actions.create_alias(mock_session, "latest", "2.0", ["redirects_file"])
+
+    assert _redirects(mock_session) == [
+        "/latest  /2.0/  302",
+        "/latest/*  /2.0/:splat  302",
+        "/stable  /1.0/  302",
+        "/stable/*  /1.0/:splat  302",
+    ]
+
+
+def test_other_mechanisms_are_not_written(mock_session: MockTargetSession):
+    actions.create_alias(mock_session, "latest", "1.0", ["mock"])
+    actions.create_alias(mock_session, "stable", "1.1", ["redirects_file"])
+
+    assert _redirects(mock_session) == ["/stable  /1.1/  302", "/stable/*  /1.1/:splat  302"]
+
+
+def test_delete_last_alias_removes_file(mock_session: MockTargetSession):
+    actions.create_alias(mock_session, "latest", "1.0", ["redirects_file"])
+    actions.create_alias(mock_session, "stable", "1.1", ["redirects_file"])
+
+    actions.delete_alias(mock_session, "latest")
+    assert _redirects(mock_session) == ["/stable  /1.1/  302", "/stable/*  /1.1/:splat  302"]
+
+    actions.delete_alias(mock_session, "stable")
+    assert (abstract.DEFAULT_VERSION, redirects_file.REDIRECTS_FILENAME) not in mock_session.files
+
+
+def test_render_quotes_paths():
+    content = redirects_file.render_redirects({"my alias": "1.0 beta"})
+    assert "/my%20alias/*  /1.0%20beta/:splat  302" in content.splitlines()